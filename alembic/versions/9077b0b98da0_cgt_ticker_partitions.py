@@ -0,0 +1,95 @@
+"""cgt ticker partitions
+
+Revision ID: 9077b0b98da0
+Revises: 06bc9f8dd9ab
+Create Date: 2026-10-17 19:21:10.235366
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9077b0b98da0'
+down_revision: Union[str, None] = '06bc9f8dd9ab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The cache tables are derived data, so they are rebuilt empty rather than altered in
+# place (SQLite cannot change a primary key); every user replays on their next report.
+
+
+def _drop_cache_tables() -> None:
+    op.drop_index(op.f('ix_cgt_checkpoint_lots_checkpoint_id'), table_name='cgt_checkpoint_lots')
+    op.drop_table('cgt_checkpoint_lots')
+    op.drop_table('cgt_checkpoints')
+    op.drop_table('cgt_year_summaries')
+    op.drop_table('cgt_states')
+    op.execute("DELETE FROM cgt_lot_matches")
+    op.execute("DELETE FROM cgt_open_lots")
+
+
+def _create_cache_tables(partitioned: bool) -> None:
+    def ticker() -> list[sa.Column]:
+        return [sa.Column('ticker', sa.String(length=20), nullable=False)] if partitioned else []
+
+    op.create_table('cgt_states',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    *([] if partitioned else [sa.Column('replayed_through', sa.Date(), nullable=True)]),
+    sa.Column('dirty_from', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('cgt_year_summaries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    *ticker(),
+    sa.Column('financial_year', sa.String(length=7), nullable=False),
+    sa.Column('total_gains', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('total_losses', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('discount_gains', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('non_discount_gains', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', *(['ticker'] if partitioned else []), 'financial_year')
+    )
+    op.create_table('cgt_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    *ticker(),
+    sa.Column('as_at', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', *(['ticker'] if partitioned else []), 'as_at')
+    )
+    op.create_table('cgt_checkpoint_lots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('checkpoint_id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('remaining', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['checkpoint_id'], ['cgt_checkpoints.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['transaction_id'], ['stock_transactions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cgt_checkpoint_lots_checkpoint_id'), 'cgt_checkpoint_lots', ['checkpoint_id'], unique=False)
+
+
+def upgrade() -> None:
+    _drop_cache_tables()
+    _create_cache_tables(partitioned=True)
+    op.create_table('cgt_ticker_states',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(length=20), nullable=False),
+    sa.Column('replayed_through', sa.Date(), nullable=True),
+    sa.Column('dirty_from', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'ticker')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cgt_ticker_states')
+    _drop_cache_tables()
+    _create_cache_tables(partitioned=False)
@@ -0,0 +1,23 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.database import AnySession, get_session
+from app.schemas.holding import Holding
+from app.services.aio import holding_service, user_service
+
+router = APIRouter(prefix="/users/{user_id}/holdings", tags=["holdings"])
+
+
+@router.get("", response_model=list[Holding])
+async def list_holdings(
+    user_id: int,
+    ticker: str | None = Query(None),
+    discount_as_of: date | None = Query(None),
+    db: AnySession = Depends(get_session),
+):
+    if not await user_service.get_user(db, user_id):
+        raise HTTPException(404, "User not found")
+    return await holding_service.list_holdings(
+        db, user_id, ticker=ticker, discount_as_of=discount_as_of
+    )
@@ -1,15 +1,17 @@
+from collections.abc import Callable
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse, JSONResponse
 from starlette.requests import Request
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import AnySession, get_session, get_session_factory
 from app.core.limiter import limiter
-from app.schemas.import_result import ImportResult
-from app.services import import_service, user_service
+from app.schemas.import_result import ImportJobRead, ImportResult
+from app.services import parse_pool
+from app.services.import_service import UploadTooLarge, pack
+from app.services.aio import import_job_service, import_service, user_service
 
 router = APIRouter(tags=["import"])
 
@@ -25,21 +27,78 @@ def download_template():
     )
 
 
-@router.post("/users/{user_id}/import", response_model=ImportResult)
+def _accepted(request: Request, job: ImportJobRead) -> JSONResponse:
+    return JSONResponse(
+        job.model_dump(mode="json"),
+        status_code=202,
+        headers={"Location": str(request.url_for("get_import_job", job_id=job.id))},
+    )
+
+
+@router.post(
+    "/users/{user_id}/import",
+    response_model=ImportResult,
+    responses={202: {"model": ImportJobRead, "description": "Queued with `async=true`"}},
+)
 @limiter.limit("10/minute")
 async def import_file(
-    request: Request, user_id: int, file: UploadFile, db: Session = Depends(get_db)
+    request: Request,
+    user_id: int,
+    file: list[UploadFile],
+    background_tasks: BackgroundTasks,
+    run_async: bool = Query(False, alias="async"),
+    db: AnySession = Depends(get_session),
+    sessions: Callable[[], AnySession] = Depends(get_session_factory),
 ):
-    if not user_service.get_user(db, user_id):
+    if not await user_service.get_user(db, user_id):
         raise HTTPException(404, "User not found")
 
-    content = await file.read()
-
     max_bytes = settings.max_upload_mb * 1024 * 1024
-    if len(content) > max_bytes:
+    try:
+        if len(file) == 1:
+            filename = file[0].filename or "upload.csv"
+            chunks = import_service.read_upload(file[0], max_bytes)
+        else:
+            # Several files are imported together, like the members of a zip
+            files = await import_service.read_uploads(file, max_bytes)
+            if not run_async:
+                return await import_service.import_files(db, user_id, files)
+            filename = "upload.zip"
+            chunks = import_service.iter_bytes(pack(files))
+        if run_async:
+            job = await import_job_service.create_job(db, user_id, filename, chunks)
+            background_tasks.add_task(import_job_service.run_job, sessions, job.id)
+            return _accepted(request, job)
+        return await import_service.parse_and_import(db, user_id, filename, chunks)
+    except UploadTooLarge:
         raise HTTPException(413, f"File exceeds {settings.max_upload_mb}MB limit")
+    except parse_pool.PoolBusy:
+        raise HTTPException(503, "Too many imports in progress", headers={"Retry-After": "5"})
+    except parse_pool.PoolBroken:
+        raise HTTPException(503, "Import worker failed", headers={"Retry-After": "5"})
 
-    imported, errors = import_service.parse_and_import(
-        db, user_id, file.filename or "upload.csv", content
-    )
-    return ImportResult(imported=imported, errors=errors)
+
+@router.get("/import/jobs/{job_id}", response_model=ImportJobRead)
+async def get_import_job(job_id: int, db: AnySession = Depends(get_session)):
+    job = await import_job_service.get_job(db, job_id)
+    if not job:
+        raise HTTPException(404, "Import job not found")
+    return job
+
+
+@router.post("/import/jobs/{job_id}/retry", response_model=ImportJobRead, status_code=202)
+async def retry_import_job(
+    request: Request,
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    db: AnySession = Depends(get_session),
+    sessions: Callable[[], AnySession] = Depends(get_session_factory),
+):
+    try:
+        job = await import_job_service.retry_job(db, job_id)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    if not job:
+        raise HTTPException(404, "Import job not found")
+    background_tasks.add_task(import_job_service.run_job, sessions, job.id)
+    return _accepted(request, job)
@@ -1,29 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Literal
 
-from app.core.database import get_db
-from app.schemas.report import CGTOverview
-from app.services import cgt_service, user_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.database import AnySession, get_session
+from app.schemas.report import (
+    CGTOverview,
+    CGTSimulation,
+    CGTSimulationRequest,
+    LotMatchPage,
+    LotStrategy,
+    MatchSortField,
+)
+from app.services.aio import cgt_service, user_service
 
 router = APIRouter(prefix="/users/{user_id}/reports", tags=["reports"])
 
 
 @router.get("/cgt", response_model=CGTOverview)
-def cgt_overview(user_id: int, db: Session = Depends(get_db)):
-    if not user_service.get_user(db, user_id):
+async def cgt_overview(
+    user_id: int,
+    as_of: date | None = Query(None),
+    strategy: LotStrategy = Query("fifo"),
+    db: AnySession = Depends(get_session),
+):
+    if not await user_service.get_user(db, user_id):
         raise HTTPException(404, "User not found")
-    result = cgt_service.compute_cgt(db, user_id)
-    # Strip lot matches for overview
-    for fy in result.financial_years:
-        fy.lot_matches = []
-    return result
+    return await cgt_service.compute_cgt_summary(db, user_id, as_of=as_of, strategy=strategy)
+
+
+@router.post("/cgt/simulate", response_model=CGTSimulation)
+async def cgt_simulate(
+    user_id: int, body: CGTSimulationRequest, db: AnySession = Depends(get_session)
+):
+    if not await user_service.get_user(db, user_id):
+        raise HTTPException(404, "User not found")
+    try:
+        return await cgt_service.simulate_sells(db, user_id, body.sells)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
 
 
 @router.get("/cgt/{fy}", response_model=CGTOverview)
-def cgt_detail(user_id: int, fy: str, db: Session = Depends(get_db)):
-    if not user_service.get_user(db, user_id):
+async def cgt_detail(
+    user_id: int,
+    fy: str,
+    strategy: LotStrategy = Query("fifo"),
+    db: AnySession = Depends(get_session),
+):
+    if not await user_service.get_user(db, user_id):
         raise HTTPException(404, "User not found")
-    result = cgt_service.compute_cgt(db, user_id, fy=fy)
+    result = await cgt_service.compute_cgt(db, user_id, fy=fy, strategy=strategy)
     if not result.financial_years:
         raise HTTPException(404, "No data for this financial year")
     return result
+
+
+@router.get("/cgt/{fy}/matches", response_model=LotMatchPage)
+async def cgt_matches(
+    user_id: int,
+    fy: str,
+    ticker: str | None = Query(None),
+    sort: MatchSortField = Query("sell_date"),
+    order: Literal["asc", "desc"] = Query("asc"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None),
+    db: AnySession = Depends(get_session),
+):
+    if not await user_service.get_user(db, user_id):
+        raise HTTPException(404, "User not found")
+    try:
+        return await cgt_service.list_lot_matches(
+            db, user_id, fy, ticker=ticker, sort=sort, descending=order == "desc",
+            limit=limit, cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
@@ -1,81 +1,56 @@
-import csv
-import io
-import json
+from collections.abc import Callable
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import AnySession, get_session, get_session_factory
 from app.schemas.user import UserCreate, UserRead
-from app.services import user_service, transaction_service
+from app.services.aio import export_service, user_service
+from app.services.export_service import FORMATS
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.post("", response_model=UserRead, status_code=201)
-def create_user(body: UserCreate, db: Session = Depends(get_db)):
-    return user_service.get_or_create_user(db, body.username)
+async def create_user(body: UserCreate, db: AnySession = Depends(get_session)):
+    return await user_service.get_or_create_user(db, body.username)
 
 
 @router.get("/{user_id}", response_model=UserRead)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = user_service.get_user(db, user_id)
+async def get_user(user_id: int, db: AnySession = Depends(get_session)):
+    user = await user_service.get_user(db, user_id)
     if not user:
         raise HTTPException(404, "User not found")
     return user
 
 
 @router.delete("/{user_id}", status_code=204)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    if not user_service.delete_user(db, user_id):
+async def delete_user(user_id: int, db: AnySession = Depends(get_session)):
+    if not await user_service.delete_user(db, user_id):
         raise HTTPException(404, "User not found")
 
 
 @router.get("/{user_id}/export")
-def export_user_data(
+async def export_user_data(
     user_id: int,
-    format: str = Query("json", pattern="^(json|csv)$"),
-    db: Session = Depends(get_db),
+    format: str = Query("json", pattern="^(json|csv|ndjson)$"),
+    gzip: bool = Query(False, description="Send the export as a gzip file"),
+    db: AnySession = Depends(get_session),
+    sessions: Callable[[], AnySession] = Depends(get_session_factory),
 ):
-    user = user_service.get_user(db, user_id)
+    user = await user_service.get_user(db, user_id)
     if not user:
         raise HTTPException(404, "User not found")
 
-    txns = transaction_service.list_transactions(db, user_id)
-
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            "date", "time", "action", "ticker", "quantity",
-            "price", "value", "fee", "contract_note",
-        ])
-        for t in txns:
-            writer.writerow([
-                t.date.isoformat(), t.time.isoformat(), t.action.value, t.ticker,
-                t.quantity, str(t.price), str(t.value), str(t.fee), t.contract_note or "",
-            ])
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={user.username}_export.csv"},
-        )
-
-    data = {
-        "user": {"id": user.id, "username": user.username, "created_at": user.created_at.isoformat()},
-        "transactions": [
-            {
-                "id": t.id, "date": t.date.isoformat(), "time": t.time.isoformat(),
-                "action": t.action.value, "ticker": t.ticker, "quantity": t.quantity,
-                "price": str(t.price), "value": str(t.value), "fee": str(t.fee),
-                "contract_note": t.contract_note,
-            }
-            for t in txns
-        ],
-    }
+    content = export_service.export(sessions, user, format)
+    media_type = FORMATS[format].media_type
+    filename = f"{user.username}_export.{format}"
+    if gzip:
+        content = export_service.gzipped(content)
+        media_type = "application/gzip"
+        filename += ".gz"
     return StreamingResponse(
-        iter([json.dumps(data, indent=2)]),
-        media_type="application/json",
-        headers={"Content-Disposition": f"attachment; filename={user.username}_export.json"},
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
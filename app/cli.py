@@ -0,0 +1,92 @@
+"""Maintenance commands: ``finagle <command>`` or ``python -m app.cli <command>``."""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.schemas.report import FinancialYearSummary
+
+SUMMARY_FIELDS = [
+    "user_id", *(f for f in FinancialYearSummary.model_fields if f != "lot_matches")
+]
+
+
+def _user_ids(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def cgt_batch(args: argparse.Namespace) -> int:
+    from app.services import cgt_batch as batch
+
+    with SessionLocal() as db:
+        summaries = batch.summarise_all(db, args.users, args.fy)
+
+    with open(args.output, "w", newline="") if args.output else nullcontext(sys.stdout) as out:
+        writer = csv.DictWriter(out, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for user_id, years in summaries.items():
+            for summary in years:
+                row = summary.model_dump(exclude={"lot_matches"})
+                writer.writerow({"user_id": user_id, **row})
+    return 0
+
+
+def recompute_cgt(args: argparse.Namespace) -> int:
+    from app.services import cgt_recompute
+
+    user_ids = args.users
+    if user_ids is None:
+        with SessionLocal() as db:
+            user_ids = cgt_recompute.list_user_ids(db)
+
+    started = time.perf_counter()
+    done = cgt_recompute.recompute(
+        settings.database_url, user_ids, workers=args.workers, shard_size=args.shard_size
+    )
+    print(
+        f"Recomputed CGT for {done} users in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="finagle")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser(
+        "cgt-batch", help="Write CGT financial year summaries for every user as CSV"
+    )
+    batch.add_argument("--users", type=_user_ids, help="Comma-separated user ids (default: all)")
+    batch.add_argument("--fy", help="Only this financial year, e.g. 2023-24")
+    batch.add_argument("-o", "--output", help="CSV file to write (default: stdout)")
+    batch.set_defaults(handler=cgt_batch)
+
+    recompute = commands.add_parser(
+        "recompute-cgt", help="Rebuild the cached CGT reports for every user"
+    )
+    recompute.add_argument(
+        "--users", type=_user_ids, help="Comma-separated user ids (default: all)"
+    )
+    recompute.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes; 1 runs in this process (default: CPU count)",
+    )
+    recompute.add_argument(
+        "--shard-size", type=int, default=50, help="User ids handed to a worker at a time"
+    )
+    recompute.set_defaults(handler=recompute_cgt)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -5,9 +7,24 @@ class Settings(BaseSettings):
     model_config = {"env_prefix": "FINAGLE_"}
 
     database_url: str = "sqlite:///finagle.db"
+    # Serve requests through an AsyncEngine (needs the `async` extra)
+    async_database: bool = False
     api_key: str = ""
     environment: str = "dev"
     max_upload_mb: int = 10
+    # Worker processes parsing uploads (0 = parse in the threadpool)
+    import_workers: int = 2
+    # Rows per executemany batch when storing an import
+    import_chunk_size: int = 5000
+    # Uploads allowed to wait for a free worker before new ones get a 503
+    import_queue: int = 8
+    # Data rows an import may hold; reading stops once a file passes it (0 = no limit)
+    import_max_rows: int = 100_000
+    # Errors after which an import stops reading and reports (0 = no limit)
+    import_max_errors: int = 100
+    # Minutes a job may stay pending or running before it counts as stuck and can be retried
+    import_job_stale_minutes: int = 30
+    cgt_engine: Literal["decimal", "fixed"] = "decimal"
 
 
 settings = Settings()
@@ -1,14 +1,46 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Callable, Generator
+from typing import Any, TypeVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 
-connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
-engine = create_engine(settings.database_url, connect_args=connect_args)
+T = TypeVar("T")
+
+# Either session; the async services accept both
+AnySession = Session | AsyncSession
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def create_db_engine(database_url: str) -> Engine:
+    connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+    return create_engine(database_url, connect_args=connect_args)
+
+
+def create_async_db_engine(database_url: str, **kwargs: Any) -> AsyncEngine:
+    """Async engine for ``database_url``, swapping a sync driver for its async one."""
+    url = make_url(database_url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    return create_async_engine(url, **kwargs)
+
+
+engine = create_db_engine(settings.database_url)
 SessionLocal = sessionmaker(bind=engine)
 
+async_engine = create_async_db_engine(settings.database_url) if settings.async_database else None
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, expire_on_commit=False) if async_engine else None
+)
+
 
 class Base(DeclarativeBase):
     pass
@@ -20,3 +52,73 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# The routers' session dependency
+get_session = get_async_db if settings.async_database else get_db
+
+
+def get_session_factory() -> Callable[[], AnySession]:
+    """Dependency for work that outlives the request, such as background imports."""
+    return AsyncSessionLocal if settings.async_database else SessionLocal
+
+
+async def run_sync(db: AnySession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await sync ORM code ``fn(session, *args)``.
+
+    An ``AsyncSession`` runs it on its async connection, with each query awaited but
+    everything else on the event-loop thread, so ``fn`` should do little beyond its
+    queries; see ``run_blocking`` for work that computes. A plain ``Session`` runs it
+    in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+_sync_engines: dict[str, Engine] = {settings.database_url: engine}
+
+
+def _sync_engine(async_engine: AsyncEngine) -> Engine:
+    """A sync-driver engine on the same database as ``async_engine``."""
+    url = async_engine.url
+    sync_drivers = {driver: name for name, driver in ASYNC_DRIVERS.items()}
+    url = url.set(drivername=sync_drivers.get(url.drivername, url.drivername))
+    key = url.render_as_string(hide_password=False)
+    if key not in _sync_engines:
+        _sync_engines[key] = create_db_engine(key)
+    return _sync_engines[key]
+
+
+async def run_blocking(
+    db: AnySession, fn: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """Await CPU-bound sync ORM code ``fn(session, *args)`` in the threadpool.
+
+    A plain ``Session`` runs it there as ``run_sync`` does. ``AsyncSession.run_sync``
+    would run it on the event-loop thread, so for an ``AsyncSession`` its transaction
+    is committed and ``fn`` runs on a sync session of its own on the same database,
+    which it must commit itself. Only for self-contained units of work, such as a CGT
+    replay.
+    """
+    if not isinstance(db, AsyncSession):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    await db.commit()
+
+    def run() -> T:
+        with Session(_sync_engine(db.bind)) as session:
+            return fn(session, *args, **kwargs)
+
+    return await run_in_threadpool(run)
+
+
+async def close_session(db: AnySession) -> None:
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
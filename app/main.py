@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -11,15 +12,25 @@ from app.api.v1.router import router as v1_router
 from app.core.config import settings
 from app.core.limiter import limiter
 from app.core.security import SecurityHeadersMiddleware
+from app.services import parse_pool
 
 docs_kwargs = {}
 if settings.environment == "production":
     docs_kwargs = {"docs_url": None, "redoc_url": None, "openapi_url": None}
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    parse_pool.start()
+    yield
+    parse_pool.shutdown()
+
+
 app = FastAPI(
     title="Finagle",
     version="0.1.0",
     description="Personal finance & CGT tracker",
+    lifespan=lifespan,
     **docs_kwargs,
 )
 
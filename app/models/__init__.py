@@ -1,4 +1,26 @@
 from app.models.user import User
 from app.models.transaction import StockTransaction
+from app.models.import_job import ImportJob, JobStatus
+from app.models.cgt import (
+    CGTCheckpoint,
+    CGTCheckpointLot,
+    CGTLotMatch,
+    CGTState,
+    CGTTickerState,
+    CGTYearSummary,
+    OpenLot,
+)
 
-__all__ = ["User", "StockTransaction"]
+__all__ = [
+    "User",
+    "StockTransaction",
+    "ImportJob",
+    "JobStatus",
+    "CGTState",
+    "CGTTickerState",
+    "OpenLot",
+    "CGTLotMatch",
+    "CGTCheckpoint",
+    "CGTCheckpointLot",
+    "CGTYearSummary",
+]
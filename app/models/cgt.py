@@ -0,0 +1,123 @@
+from datetime import date
+
+from sqlalchemy import Date, ForeignKey, Index, Numeric, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class CGTState(Base):
+    """Marks a user's CGT cache as built.
+
+    ``dirty_from`` is the earliest date touched by a write to any ticker since the last
+    refresh (``None`` = clean), so a clean cache is recognised from this row alone.
+    """
+
+    __tablename__ = "cgt_states"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    dirty_from: Mapped[date | None] = mapped_column(Date, nullable=True)
+
+
+class CGTTickerState(Base):
+    """Replay watermark for one ticker's partition of a user's cached CGT results.
+
+    ``replayed_through`` is the date of the last trade in the ticker folded into the
+    cache and ``dirty_from`` the earliest date touched by a write since then.
+    """
+
+    __tablename__ = "cgt_ticker_states"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    ticker: Mapped[str] = mapped_column(String(20), primary_key=True)
+    replayed_through: Mapped[date | None] = mapped_column(Date, nullable=True)
+    dirty_from: Mapped[date | None] = mapped_column(Date, nullable=True)
+
+
+class OpenLot(Base):
+    """A buy parcel still (partly) held after the last replay, in queue order by id."""
+
+    __tablename__ = "cgt_open_lots"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    transaction_id: Mapped[int] = mapped_column(
+        ForeignKey("stock_transactions.id", ondelete="CASCADE")
+    )
+    ticker: Mapped[str] = mapped_column(String(20))
+    remaining: Mapped[int]
+
+
+class CGTLotMatch(Base):
+    """A persisted sell-to-buy parcel match, mirroring ``schemas.report.LotMatch``."""
+
+    __tablename__ = "cgt_lot_matches"
+    __table_args__ = (
+        # Keyset pages of a year in sell-date order, and per-ticker replays and filters
+        Index(
+            "ix_cgt_lot_matches_user_fy_sell_date", "user_id", "financial_year", "sell_date", "id"
+        ),
+        Index("ix_cgt_lot_matches_user_ticker_sell_date", "user_id", "ticker", "sell_date"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    financial_year: Mapped[str] = mapped_column(String(7))
+    ticker: Mapped[str] = mapped_column(String(20))
+    sell_date: Mapped[date] = mapped_column(Date)
+    quantity: Mapped[int]
+    cost_base: Mapped[float] = mapped_column(Numeric(14, 2))
+    proceeds: Mapped[float] = mapped_column(Numeric(14, 2))
+    raw_gain: Mapped[float] = mapped_column(Numeric(14, 2))
+    held_over_12_months: Mapped[bool]
+    discount: Mapped[float] = mapped_column(Numeric(14, 2))
+    net_gain: Mapped[float] = mapped_column(Numeric(14, 2))
+
+
+class CGTCheckpoint(Base):
+    """Snapshot of one ticker's open lots at a 30 June financial-year boundary."""
+
+    __tablename__ = "cgt_checkpoints"
+    __table_args__ = (UniqueConstraint("user_id", "ticker", "as_at"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    ticker: Mapped[str] = mapped_column(String(20))
+    as_at: Mapped[date] = mapped_column(Date)
+
+
+class CGTCheckpointLot(Base):
+    __tablename__ = "cgt_checkpoint_lots"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    checkpoint_id: Mapped[int] = mapped_column(
+        ForeignKey("cgt_checkpoints.id", ondelete="CASCADE"), index=True
+    )
+    transaction_id: Mapped[int] = mapped_column(
+        ForeignKey("stock_transactions.id", ondelete="CASCADE")
+    )
+    ticker: Mapped[str] = mapped_column(String(20))
+    remaining: Mapped[int]
+
+
+class CGTYearSummary(Base):
+    """One ticker's running gain/loss totals for a financial year.
+
+    Kept in step with the match rows; a year's summary is the sum over its tickers.
+    """
+
+    __tablename__ = "cgt_year_summaries"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    ticker: Mapped[str] = mapped_column(String(20), primary_key=True)
+    financial_year: Mapped[str] = mapped_column(String(7), primary_key=True)
+    total_gains: Mapped[float] = mapped_column(Numeric(14, 2))
+    total_losses: Mapped[float] = mapped_column(Numeric(14, 2))
+    discount_gains: Mapped[float] = mapped_column(Numeric(14, 2))
+    non_discount_gains: Mapped[float] = mapped_column(Numeric(14, 2))
@@ -1,7 +1,7 @@
 import enum
 from datetime import date, time
 
-from sqlalchemy import Date, Enum, ForeignKey, Numeric, String, Time
+from sqlalchemy import Date, Enum, ForeignKey, Index, Numeric, String, Time
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -14,6 +14,9 @@ class Action(str, enum.Enum):
 
 class StockTransaction(Base):
     __tablename__ = "stock_transactions"
+    __table_args__ = (
+        Index("ix_stock_transactions_user_fingerprint", "user_id", "fingerprint", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
@@ -26,6 +29,8 @@ class StockTransaction(Base):
     value: Mapped[float] = mapped_column(Numeric(14, 2))
     fee: Mapped[float] = mapped_column(Numeric(10, 2))
     contract_note: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    # transaction_service.fingerprint; NULL for rows written outside the API and imports
+    fingerprint: Mapped[str | None] = mapped_column(String(32), nullable=True)
 
     user: Mapped["User"] = relationship(back_populates="transactions")
 
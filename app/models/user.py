@@ -16,7 +16,11 @@ class User(Base):
     transactions: Mapped[list["StockTransaction"]] = relationship(
         back_populates="user", cascade="all, delete-orphan"
     )
+    import_jobs: Mapped[list["ImportJob"]] = relationship(
+        back_populates="user", cascade="all, delete-orphan"
+    )
 
 
 # Avoid circular import at module level
+from app.models.import_job import ImportJob  # noqa: E402, F401
 from app.models.transaction import StockTransaction  # noqa: E402, F401
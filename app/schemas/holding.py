@@ -0,0 +1,21 @@
+from datetime import date
+from decimal import Decimal
+
+from pydantic import BaseModel
+
+
+class HoldingParcel(BaseModel):
+    transaction_id: int
+    acquired: date
+    quantity: int
+    price: Decimal
+    cost_base: Decimal
+    discount_eligible: bool
+    days_until_discount: int
+
+
+class Holding(BaseModel):
+    ticker: str
+    quantity: int
+    cost_base: Decimal
+    parcels: list[HoldingParcel]
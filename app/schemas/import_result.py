@@ -1,6 +1,52 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
+from app.models.import_job import JobStatus
+
+
+class ImportErrorGroup(BaseModel):
+    # The file the errors are in, for an upload of several files
+    file: str | None = None
+    code: str
+    column: str | None = None
+    count: int
+    # The first few rows with this error
+    rows: list[int]
+    example: str
+
 
 class ImportResult(BaseModel):
     imported: int
+    # Rows already present from an earlier import, by fingerprint
+    skipped: int = 0
+    # The first ``import_max_errors`` errors in full
     errors: list[str]
+    # Every error found before the import stopped, and those grouped by kind
+    error_count: int = 0
+    error_groups: list[ImportErrorGroup] = []
+    # Rows stored or skipped per second, up to and including the commit
+    rows_per_second: float | None = None
+
+
+class ImportJobRead(BaseModel):
+    id: int
+    user_id: int
+    filename: str
+    status: JobStatus
+    # Data rows parsed so far; live while the job runs in this process
+    rows_read: int
+    imported: int
+    skipped: int
+    errors: list[str]
+    error_count: int
+    error_groups: list[ImportErrorGroup]
+    rows_per_second: float | None
+    attempts: int
+    created_at: datetime
+    # When the job was last queued, and when its latest attempt started
+    queued_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+    model_config = {"from_attributes": True}
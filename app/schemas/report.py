@@ -1,7 +1,8 @@
 from datetime import date
 from decimal import Decimal
+from typing import Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class LotMatch(BaseModel):
@@ -29,3 +30,39 @@ class FinancialYearSummary(BaseModel):
 
 class CGTOverview(BaseModel):
     financial_years: list[FinancialYearSummary]
+
+
+LotStrategy = Literal["fifo", "lifo", "highest_cost", "min_tax"]
+
+MatchSortField = Literal["sell_date", "ticker", "quantity", "raw_gain", "net_gain"]
+
+
+class LotMatchPage(BaseModel):
+    financial_year: str
+    items: list[LotMatch]
+    # Pass back as ``cursor`` for the next page; None on the last page
+    next_cursor: str | None = None
+
+
+class SimulatedSell(BaseModel):
+    ticker: str
+    quantity: int = Field(gt=0)
+    price: Decimal = Field(ge=0)
+    date: date
+    fee: Decimal = Field(Decimal("0"), ge=0)
+
+
+class CGTSimulationRequest(BaseModel):
+    sells: list[SimulatedSell] = Field(min_length=1)
+
+
+class SimulatedYear(BaseModel):
+    financial_year: str
+    current: FinancialYearSummary
+    # Includes the hypothetical sells, whose parcels are its lot matches
+    simulated: FinancialYearSummary
+    net_capital_gain_change: Decimal
+
+
+class CGTSimulation(BaseModel):
+    financial_years: list[SimulatedYear]
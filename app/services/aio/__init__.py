@@ -0,0 +1,7 @@
+"""Async counterparts of the service modules, for ``async def`` routers.
+
+Each takes a ``Session`` or an ``AsyncSession`` (see ``app.core.database.run_sync``) and
+awaits the sync service on it, so the business logic lives in one place. Services that
+replay CGT or otherwise compute go through ``run_blocking`` instead, which keeps them
+off the event-loop thread for an ``AsyncSession`` too.
+"""
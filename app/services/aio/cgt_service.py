@@ -0,0 +1,54 @@
+from datetime import date
+
+from app.core.database import AnySession, run_blocking
+from app.schemas.report import (
+    CGTOverview,
+    CGTSimulation,
+    LotMatchPage,
+    LotStrategy,
+    MatchSortField,
+    SimulatedSell,
+)
+from app.services import cgt_service
+
+
+async def compute_cgt(
+    db: AnySession,
+    user_id: int,
+    fy: str | None = None,
+    as_of: date | None = None,
+    strategy: LotStrategy = "fifo",
+) -> CGTOverview:
+    return await run_blocking(
+        db, cgt_service.compute_cgt, user_id, fy=fy, as_of=as_of, strategy=strategy
+    )
+
+
+async def compute_cgt_summary(
+    db: AnySession, user_id: int, as_of: date | None = None, strategy: LotStrategy = "fifo"
+) -> CGTOverview:
+    return await run_blocking(
+        db, cgt_service.compute_cgt_summary, user_id, as_of=as_of, strategy=strategy
+    )
+
+
+async def list_lot_matches(
+    db: AnySession,
+    user_id: int,
+    fy: str,
+    ticker: str | None = None,
+    sort: MatchSortField = "sell_date",
+    descending: bool = False,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> LotMatchPage:
+    return await run_blocking(
+        db, cgt_service.list_lot_matches, user_id, fy, ticker=ticker, sort=sort,
+        descending=descending, limit=limit, cursor=cursor,
+    )
+
+
+async def simulate_sells(
+    db: AnySession, user_id: int, sells: list[SimulatedSell]
+) -> CGTSimulation:
+    return await run_blocking(db, cgt_service.simulate_sells, user_id, sells)
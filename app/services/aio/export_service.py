@@ -0,0 +1,42 @@
+import zlib
+from collections.abc import AsyncIterator, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import iterate_in_threadpool
+
+from app.core.database import AnySession, close_session
+from app.models.user import User
+from app.services import export_service
+
+
+async def gzipped(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """``chunks`` as a gzip file, compressed as they arrive."""
+    compressor = zlib.compressobj(wbits=31)
+    async for text in chunks:
+        if data := compressor.compress(text.encode()):
+            yield data
+    yield compressor.flush()
+
+
+async def export(
+    sessions: Callable[[], AnySession], user: User, format: str
+) -> AsyncIterator[str]:
+    """Stream ``user``'s export on a session of its own, open as long as the response.
+
+    An ``AsyncSession`` streams the rows on its connection; a plain ``Session`` runs the
+    sync export in the threadpool a batch at a time.
+    """
+    db = sessions()
+    try:
+        if isinstance(db, AsyncSession):
+            out = export_service.FORMATS[format](user)
+            yield out.head()
+            result = await db.stream(export_service.transactions_query(user.id))
+            async for rows in result.partitions():
+                yield out.rows(rows)
+            yield out.tail()
+        else:
+            async for text in iterate_in_threadpool(export_service.export(db, user, format)):
+                yield text
+    finally:
+        await close_session(db)
@@ -0,0 +1,16 @@
+from datetime import date
+
+from app.core.database import AnySession, run_blocking
+from app.schemas.holding import Holding
+from app.services import holding_service
+
+
+async def list_holdings(
+    db: AnySession,
+    user_id: int,
+    ticker: str | None = None,
+    discount_as_of: date | None = None,
+) -> list[Holding]:
+    return await run_blocking(
+        db, holding_service.list_holdings, user_id, ticker=ticker, discount_as_of=discount_as_of
+    )
@@ -0,0 +1,71 @@
+from collections.abc import AsyncIterator, Callable
+
+from app.core.database import AnySession, close_session, run_sync
+from app.models.import_job import ImportJob, JobStatus
+from app.schemas.import_result import ImportJobRead
+from app.services import import_job_service
+from app.services.aio import import_service
+
+# Rows parsed so far by the jobs running in this process
+_progress: dict[int, int] = {}
+
+
+def _read(job: ImportJob) -> ImportJobRead:
+    read = ImportJobRead.model_validate(job)
+    if job.status == JobStatus.RUNNING and job.id in _progress:
+        read.rows_read = _progress[job.id]
+    return read
+
+
+async def create_job(
+    db: AnySession, user_id: int, filename: str, chunks: AsyncIterator[bytes]
+) -> ImportJobRead:
+    content = b"".join([chunk async for chunk in chunks])
+    job = await run_sync(db, import_job_service.create_job, user_id, filename, content)
+    return _read(job)
+
+
+async def get_job(db: AnySession, job_id: int) -> ImportJobRead | None:
+    job = await run_sync(db, import_job_service.get_job, job_id)
+    return _read(job) if job else None
+
+
+async def retry_job(db: AnySession, job_id: int) -> ImportJobRead | None:
+    job = await run_sync(db, import_job_service.retry_job, job_id)
+    return _read(job) if job else None
+
+
+async def run_job(sessions: Callable[[], AnySession], job_id: int) -> None:
+    """Import a pending job's stored upload on a session of its own.
+
+    Meant to run after the response is sent. A full parse pool makes it wait rather
+    than fail, and any error marks the job failed so it can be retried.
+    """
+    db = sessions()
+    try:
+        started = await run_sync(db, import_job_service.start_job, job_id)
+        if started is None:
+            return
+        user_id, filename, content = started
+
+        def progress(rows: int) -> None:
+            _progress[job_id] = rows
+
+        try:
+            result = await import_service.parse_and_import(
+                db,
+                user_id,
+                filename,
+                import_service.iter_bytes(content),
+                reject=False,
+                on_progress=progress,
+            )
+        except Exception as e:
+            await run_sync(db, import_job_service.fail_job, job_id, f"Import failed: {e}")
+            return
+        await run_sync(
+            db, import_job_service.finish_job, job_id, result, _progress.get(job_id, 0)
+        )
+    finally:
+        _progress.pop(job_id, None)
+        await close_session(db)
@@ -0,0 +1,238 @@
+import asyncio
+import zlib
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterable
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import AnySession, run_sync
+from app.schemas.import_result import ImportResult
+from app.services import import_service, parse_pool
+from app.services.parsers import ParsedBatch, ParsedTransaction, RowError, too_many_rows
+from app.services.parsers.blocks import CsvBlocks, RecordTooLong
+
+# Bytes read from an upload at a time; also the most a CSV block holds beyond one record
+READ_BYTES = 1024 * 1024
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> AsyncIterator[bytes]:
+    """Yield ``file`` in chunks, raising ``UploadTooLarge`` once it passes ``max_bytes``."""
+    if file.size is not None and file.size > max_bytes:
+        raise import_service.UploadTooLarge
+    total = 0
+    while chunk := await file.read(READ_BYTES):
+        total += len(chunk)
+        if total > max_bytes:
+            raise import_service.UploadTooLarge
+        yield chunk
+
+
+async def read_uploads(
+    files: list[UploadFile], max_bytes: int
+) -> list[tuple[str, bytes]]:
+    """Read several uploads whole, ``max_bytes`` being the limit for them all."""
+    read = []
+    for i, file in enumerate(files, start=1):
+        chunks = read_upload(file, max_bytes - sum(len(content) for _, content in read))
+        content = b"".join([chunk async for chunk in chunks])
+        read.append((file.filename or f"upload{i}.csv", content))
+    return read
+
+
+async def gunzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Decompress a gzip upload chunk by chunk, under the upload limit once unpacked.
+
+    No call inflates more than ``READ_BYTES``, so a small file that unpacks to a huge
+    one is stopped before it is held in memory.
+    """
+    max_bytes = settings.max_upload_mb * 1024 * 1024
+    decompressor = zlib.decompressobj(wbits=31)
+    total = 0
+    async for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk, READ_BYTES)
+            total += len(data)
+            if total > max_bytes:
+                raise import_service.UploadTooLarge
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    if not decompressor.eof:
+        raise zlib.error("truncated gzip file")
+
+
+async def iter_bytes(content: bytes) -> AsyncIterator[bytes]:
+    """``content`` as upload-sized chunks, for imports of an already stored file."""
+    for start in range(0, len(content), READ_BYTES):
+        yield content[start:start + READ_BYTES]
+
+
+async def parse_and_import(
+    db: AnySession,
+    user_id: int,
+    filename: str,
+    chunks: AsyncIterator[bytes],
+    reject: bool = True,
+    on_progress: Callable[[int], None] | None = None,
+) -> ImportResult:
+    """Import an upload read chunk by chunk.
+
+    A CSV format with a streaming parser is cut into blocks of whole records. Up to
+    ``settings.import_workers`` blocks parse in the pool at once and their rows are
+    built in file order, so only a few blocks of the file are held besides them. Other
+    formats (xlsx) are read whole and parsed in one go, a zip archive goes to
+    ``import_files``, and a ``.gz`` file is decompressed as it is read.
+    Parsing needs no session, so it never holds a connection or the event loop, and
+    the rows are inserted and committed in one go once the upload is read, so the
+    write lock is held only for the inserts.
+
+    A file with more than ``settings.import_max_rows`` data rows is abandoned as soon
+    as a block passes the cap, and any file once ``settings.import_max_errors`` errors
+    are found. A record still open after ``blocks.MAX_RECORD`` bytes, as after an
+    unclosed quote, ends the import with an error for its row. ``reject=False`` waits
+    for a parse worker instead of raising ``PoolBusy``, and ``on_progress`` is told the
+    number of data rows parsed so far.
+    """
+    if import_service.is_gzip(filename):
+        try:
+            return await parse_and_import(
+                db, user_id, filename[:-3], gunzip(chunks), reject, on_progress
+            )
+        except zlib.error:
+            return import_service.failed([RowError("Not a valid gzip file", "bad_gzip")])
+
+    if import_service.is_archive(filename):
+        content = b"".join([chunk async for chunk in chunks])
+        files, errors = await run_in_threadpool(import_service.read_archive, content)
+        if errors:
+            return import_service.failed(errors)
+        return await import_files(db, user_id, files, reject, on_progress)
+
+    head = await anext(chunks, b"")
+    parser_cls = import_service.streaming_parser(filename, head)
+    if parser_cls is None:
+        content = head + b"".join([chunk async for chunk in chunks])
+        transactions, errors = await parse_pool.parse_file(filename, content, reject=reject)
+        if on_progress:
+            on_progress(len(transactions) + len(errors))
+        writer = import_service.ImportWriter(user_id)
+        rows = await _prepare(writer, transactions, errors)
+        return await run_sync(db, writer.store, rows)
+
+    max_rows = settings.import_max_rows
+    writer = import_service.ImportWriter(user_id)
+    blocks = getattr(parser_cls, "blocks", CsvBlocks)()
+    # Blocks are numbered as they are cut, so several can parse at once; each waits in
+    # ``pending`` until every block before it is taken
+    in_flight = max(settings.import_workers, 1)
+    pending: deque[asyncio.Task[ParsedBatch]] = deque()
+    rows: list[dict] = []
+    rows_read = 0
+    overflow: RowError | None = None
+
+    async def take_oldest() -> bool:
+        """Take the oldest block; False once the upload should not be read further."""
+        nonlocal rows_read
+        batch = await pending.popleft()
+        rows_read += batch.rows
+        if on_progress:
+            on_progress(rows_read)
+        if max_rows and rows_read > max_rows:
+            await _prepare(writer, [], [too_many_rows(max_rows)])
+            return False
+        rows.extend(await _prepare(writer, batch.transactions, batch.errors))
+        return not writer.report.full
+
+    async def submit(cut: tuple[bytes, int] | None) -> bool:
+        if cut is None:
+            return True
+        block, first_row = cut
+        # Only the first block may be turned away; after that the import sees it through
+        first = first_row == blocks.FIRST_ROW
+        pending.append(asyncio.ensure_future(parse_pool.parse_block(
+            parser_cls, blocks.header, block, first_row, reject=reject and first
+        )))
+        return len(pending) < in_flight or await take_oldest()
+
+    try:
+        try:
+            reading = await submit(blocks.feed(head))
+            if reading:
+                async for chunk in chunks:
+                    if not (reading := await submit(blocks.feed(chunk))):
+                        break
+            if reading:
+                reading = await submit(blocks.close())
+        except RecordTooLong as e:
+            # Reported after the blocks before it, so errors stay in file order
+            reading, overflow = True, e.error
+        while reading and pending:
+            reading = await take_oldest()
+        if reading and overflow:
+            await _prepare(writer, [], [overflow])
+    finally:
+        # Blocks past a cap, or all of them if the import failed
+        await _cancel(pending)
+    return await run_sync(db, writer.store, rows)
+
+
+async def import_files(
+    db: AnySession,
+    user_id: int,
+    files: list[tuple[str, bytes]],
+    reject: bool = True,
+    on_progress: Callable[[int], None] | None = None,
+) -> ImportResult:
+    """Import several files, e.g. the members of a zip, as one upload.
+
+    Each file is detected and parsed on its own, up to ``settings.import_workers`` at
+    once in the pool, and they are stored in order in one transaction with one
+    ``ImportResult``. Like the blocks of one file, only the first member may be turned
+    away by the pool; the rest wait their turn, however many the archive holds.
+    """
+    in_flight = asyncio.Semaphore(max(settings.import_workers, 1))
+
+    async def parse(
+        i: int, filename: str, content: bytes
+    ) -> tuple[list[ParsedTransaction], list[RowError]]:
+        async with in_flight:
+            return await parse_pool.parse_file(filename, content, reject=reject and i == 0)
+
+    # The first task reaches the pool's admission check before the others start, so a
+    # rejected upload has started no parse
+    tasks = [
+        asyncio.ensure_future(parse(i, filename, content))
+        for i, (filename, content) in enumerate(files)
+    ]
+    try:
+        parsed = await asyncio.gather(*tasks)
+    except BaseException:
+        await _cancel(tasks)
+        raise
+    if on_progress:
+        on_progress(sum(len(transactions) + len(errors) for transactions, errors in parsed))
+
+    writer = import_service.ImportWriter(user_id)
+    rows: list[dict] = []
+    for (filename, _), (transactions, errors) in zip(files, parsed):
+        writer.next_file()
+        errors = import_service.file_errors(filename, errors)
+        rows.extend(await _prepare(writer, transactions, errors))
+    return await run_sync(db, writer.store, rows)
+
+
+async def _prepare(
+    writer: import_service.ImportWriter,
+    transactions: list[ParsedTransaction],
+    errors: Iterable[RowError] = (),
+) -> list[dict]:
+    """A batch's insert rows, built in the threadpool off the event loop."""
+    return await run_in_threadpool(writer.prepare, transactions, errors)
+
+
+async def _cancel(tasks: Iterable[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
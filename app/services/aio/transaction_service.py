@@ -0,0 +1,28 @@
+from app.core.database import AnySession, run_sync
+from app.models.transaction import Action, StockTransaction
+from app.schemas.transaction import TransactionCreate
+from app.services import transaction_service
+
+
+async def list_transactions(
+    db: AnySession,
+    user_id: int,
+    ticker: str | None = None,
+    action: Action | None = None,
+    fy: str | None = None,
+) -> list[StockTransaction]:
+    return await run_sync(db, transaction_service.list_transactions, user_id, ticker, action, fy)
+
+
+async def create_transaction(
+    db: AnySession, user_id: int, data: TransactionCreate
+) -> StockTransaction:
+    return await run_sync(db, transaction_service.create_transaction, user_id, data)
+
+
+async def get_transaction(db: AnySession, user_id: int, txn_id: int) -> StockTransaction | None:
+    return await run_sync(db, transaction_service.get_transaction, user_id, txn_id)
+
+
+async def delete_transaction(db: AnySession, user_id: int, txn_id: int) -> bool:
+    return await run_sync(db, transaction_service.delete_transaction, user_id, txn_id)
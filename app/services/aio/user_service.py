@@ -0,0 +1,15 @@
+from app.core.database import AnySession, run_sync
+from app.models.user import User
+from app.services import user_service
+
+
+async def get_or_create_user(db: AnySession, username: str) -> User:
+    return await run_sync(db, user_service.get_or_create_user, username)
+
+
+async def get_user(db: AnySession, user_id: int) -> User | None:
+    return await run_sync(db, user_service.get_user, user_id)
+
+
+async def delete_user(db: AnySession, user_id: int) -> bool:
+    return await run_sync(db, user_service.delete_user, user_id)
@@ -0,0 +1,167 @@
+"""Integer fixed-point FIFO engine, a drop-in for ``cgt_service._match_lots``.
+
+Prices are held in ten-thousandths of a dollar (the scale of ``StockTransaction.price``)
+and fees in cents. A parcel's share of a fee is never divided out: each amount is kept
+as an exact integer fraction over the buy and sell quantities and rounded half-even to
+cents once, so results are exact where the Decimal engine carries a 28-digit
+``fee / quantity``. Values only become ``Decimal`` when a match row or year total is
+handed back.
+"""
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from fractions import Fraction
+
+from app.models.transaction import Action, StockTransaction
+from app.services.cgt_service import (
+    YearTotals,
+    _financial_year,
+    _held_over_12_months,
+    _year_start,
+)
+from app.services.cgt_lots import LotPool
+
+PRICE_SCALE = 10_000
+FEE_SCALE = 100
+# Fees are scaled up to price units before they are combined with prices
+FEE_TO_PRICE = PRICE_SCALE // FEE_SCALE
+# One cent in price units
+CENT = PRICE_SCALE // 100
+
+
+@dataclass
+class FixedBuyLot:
+    transaction_id: int
+    date: date
+    remaining: int
+    quantity: int
+    price: int  # 1/10000 dollar
+    fee: int  # cents, for the whole original parcel
+
+    @property
+    def unit_cost(self) -> Fraction:
+        """Cost base per unit in price units, for the lot pools to order by."""
+        return Fraction(self.price * self.quantity + self.fee * FEE_TO_PRICE, self.quantity)
+
+
+def to_units(value: Decimal | float, scale: int) -> int:
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return int(value * scale)
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def round_half_even(numerator: int, denominator: int) -> int:
+    """Round ``numerator / denominator`` (denominator > 0) to the nearest integer."""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def buy_lot(txn: StockTransaction, remaining: int) -> FixedBuyLot:
+    return FixedBuyLot(
+        transaction_id=txn.id,
+        date=txn.date,
+        remaining=remaining,
+        quantity=txn.quantity,
+        price=to_units(txn.price, PRICE_SCALE),
+        fee=to_units(txn.fee, FEE_SCALE),
+    )
+
+
+def match_lots(
+    transactions: Iterable[StockTransaction],
+    buy_queues: dict[str, LotPool],
+    totals: dict[str, YearTotals],
+    match_rows: list[dict] | None = None,
+    last_date: date | None = None,
+    on_year_end: Callable[[date], None] | None = None,
+) -> None:
+    """Same contract as ``cgt_service._match_lots`` over ``FixedBuyLot`` pools."""
+    current_fy = _financial_year(last_date) if last_date else None
+    # total_gains, total_losses, discount_gains, non_discount_gains in cents
+    year_cents: dict[str, list[int]] = {}
+
+    for txn in transactions:
+        txn_fy = _financial_year(txn.date)
+        if txn_fy != current_fy:
+            if current_fy is not None and on_year_end is not None:
+                on_year_end(_year_start(txn.date) - timedelta(days=1))
+            current_fy = txn_fy
+
+        ticker = txn.ticker.upper()
+        if txn.action == Action.BUY:
+            buy_queues[ticker].append(buy_lot(txn, txn.quantity))
+            continue
+
+        sell_qty = txn.quantity
+        sell_total = txn.quantity
+        sell_price = to_units(txn.price, PRICE_SCALE)
+        sell_fee = to_units(txn.fee, FEE_SCALE) * FEE_TO_PRICE
+
+        unit_proceeds = Fraction(sell_price * sell_total - sell_fee, sell_total)
+
+        queue = buy_queues[ticker]
+        if queue:
+            cents = year_cents.setdefault(txn_fy, [0, 0, 0, 0])
+        while sell_qty > 0 and queue:
+            lot = queue.peek(txn.date, unit_proceeds)
+            matched = min(lot.remaining, sell_qty)
+
+            # cost_base = cost_num / lot.quantity, proceeds = proceeds_num / sell_total
+            cost_num = matched * (lot.price * lot.quantity + lot.fee * FEE_TO_PRICE)
+            proceeds_num = matched * (sell_price * sell_total - sell_fee)
+            gain_den = lot.quantity * sell_total
+            gain_num = proceeds_num * lot.quantity - cost_num * sell_total
+
+            cost_base = round_half_even(cost_num, lot.quantity * CENT)
+            proceeds = round_half_even(proceeds_num, sell_total * CENT)
+            raw_gain = round_half_even(gain_num, gain_den * CENT)
+            held_long = _held_over_12_months(lot.date, txn.date)
+            if held_long and gain_num > 0:
+                discount = round_half_even(gain_num, 2 * gain_den * CENT)
+                net_gain = discount
+            else:
+                discount = 0
+                net_gain = raw_gain
+
+            if raw_gain > 0:
+                cents[0] += raw_gain
+                cents[2 if held_long else 3] += raw_gain
+            elif raw_gain < 0:
+                cents[1] += raw_gain
+
+            if match_rows is not None:
+                match_rows.append(
+                    {
+                        "financial_year": txn_fy,
+                        "ticker": ticker,
+                        "sell_date": txn.date,
+                        "quantity": matched,
+                        "cost_base": from_cents(cost_base),
+                        "proceeds": from_cents(proceeds),
+                        "raw_gain": from_cents(raw_gain),
+                        "held_over_12_months": held_long,
+                        "discount": from_cents(discount),
+                        "net_gain": from_cents(net_gain),
+                    }
+                )
+
+            lot.remaining -= matched
+            sell_qty -= matched
+            if lot.remaining == 0:
+                queue.pop()
+
+    for fy_key, (gains, losses, discount_gains, non_discount_gains) in year_cents.items():
+        year_totals = totals[fy_key]
+        year_totals.total_gains += from_cents(gains)
+        year_totals.total_losses += from_cents(losses)
+        year_totals.discount_gains += from_cents(discount_gains)
+        year_totals.non_discount_gains += from_cents(non_discount_gains)
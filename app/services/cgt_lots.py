@@ -0,0 +1,145 @@
+"""Parcel pools for each lot-identification strategy.
+
+A pool holds one ticker's open buy lots. The matching engines ask it which lot a sell
+draws on next with ``peek`` and drop that lot with ``pop`` once it is used up, so each
+strategy only changes the pool, never the engine. Every pool is O(log n) or better
+per operation. Lots need ``date``, ``remaining`` and ``unit_cost`` (cost base per unit,
+fee included, in the engine's own units).
+"""
+
+import heapq
+from collections import deque
+from collections.abc import Callable, Iterator
+from datetime import date, timedelta
+from itertools import count
+
+from app.schemas.report import LotStrategy
+
+# A parcel held for more than 365 days qualifies for the CGT discount
+DISCOUNT_AFTER = timedelta(days=366)
+
+
+class FifoPool:
+    """Oldest parcel first; the order ``cgt_open_lots`` persists."""
+
+    def __init__(self) -> None:
+        self._lots: deque = deque()
+
+    def append(self, lot) -> None:
+        self._lots.append(lot)
+
+    def peek(self, sell_date: date, unit_proceeds) -> object:
+        return self._lots[0]
+
+    def pop(self) -> None:
+        self._lots.popleft()
+
+    def __len__(self) -> int:
+        return len(self._lots)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._lots)
+
+
+class LifoPool(FifoPool):
+    """Newest parcel first."""
+
+    def peek(self, sell_date: date, unit_proceeds) -> object:
+        return self._lots[-1]
+
+    def pop(self) -> None:
+        self._lots.pop()
+
+
+class HighestCostPool:
+    """Highest cost base per unit first, oldest first among equal costs."""
+
+    def __init__(self) -> None:
+        self._heap: list[tuple] = []
+        self._seq = count()
+
+    def append(self, lot) -> None:
+        heapq.heappush(self._heap, (-lot.unit_cost, next(self._seq), lot))
+
+    def peek(self, sell_date: date, unit_proceeds) -> object:
+        return self._heap[0][2]
+
+    def pop(self) -> None:
+        heapq.heappop(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator:
+        return (lot for _, _, lot in sorted(self._heap, key=lambda entry: entry[1]))
+
+
+class MinTaxPool:
+    """The parcel adding the least taxable gain to this sell, chosen greedily per match.
+
+    Within discount-eligible parcels, and within the rest, the highest cost base is
+    always the cheapest to sell, so each group is a max-heap on cost. A sell compares
+    the two heap tops, halving a discountable gain. Parcels move to the eligible heap as
+    sells pass their 12-month mark; buys arrive in date order, so ``_waiting`` yields
+    them in the order they become eligible and each moves once.
+    """
+
+    def __init__(self) -> None:
+        self._recent: list[tuple] = []
+        self._eligible: list[tuple] = []
+        self._waiting: deque = deque()
+        self._moved: set[int] = set()
+        self._seq = count()
+        self._size = 0
+        self._chosen: list[tuple] | None = None
+
+    def append(self, lot) -> None:
+        entry = (-lot.unit_cost, next(self._seq), lot)
+        heapq.heappush(self._recent, entry)
+        self._waiting.append(entry)
+        self._size += 1
+
+    def peek(self, sell_date: date, unit_proceeds) -> object:
+        while self._waiting and self._waiting[0][2].date + DISCOUNT_AFTER <= sell_date:
+            entry = self._waiting.popleft()
+            if entry[2].remaining:
+                self._moved.add(entry[1])
+                heapq.heappush(self._eligible, entry)
+        while self._recent and (
+            self._recent[0][1] in self._moved or not self._recent[0][2].remaining
+        ):
+            heapq.heappop(self._recent)
+
+        self._chosen = self._eligible
+        if self._recent:
+            recent_gain = unit_proceeds - self._recent[0][2].unit_cost
+            if not self._eligible:
+                self._chosen = self._recent
+            else:
+                eligible_gain = unit_proceeds - self._eligible[0][2].unit_cost
+                if eligible_gain > 0:
+                    eligible_gain /= 2
+                if recent_gain < eligible_gain:
+                    self._chosen = self._recent
+        return self._chosen[0][2]
+
+    def pop(self) -> None:
+        heapq.heappop(self._chosen)
+        self._size -= 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator:
+        entries = [e for e in self._recent if e[1] not in self._moved] + self._eligible
+        return (lot for _, _, lot in sorted(entries, key=lambda e: e[1]) if lot.remaining)
+
+
+LotPool = FifoPool | HighestCostPool | MinTaxPool
+
+POOLS: dict[LotStrategy, Callable[[], LotPool]] = {
+    "fifo": FifoPool,
+    "lifo": LifoPool,
+    "highest_cost": HighestCostPool,
+    "min_tax": MinTaxPool,
+}
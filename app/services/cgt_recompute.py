@@ -0,0 +1,80 @@
+"""Rebuild cached CGT reports for many users across a process pool."""
+
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.database import create_db_engine
+from app.models.user import User
+from app.services import cgt_service
+
+# Set in each worker process by _init_worker
+_engine: Engine | None = None
+_session_factory: sessionmaker | None = None
+
+
+def _init_worker(database_url: str) -> None:
+    global _engine, _session_factory
+    _engine = create_db_engine(database_url)
+    _session_factory = sessionmaker(bind=_engine)
+
+
+def _close_worker() -> None:
+    """Dispose of the engine ``_init_worker`` opened, for a run in this process."""
+    global _engine, _session_factory
+    if _engine is not None:
+        _engine.dispose()
+    _engine = _session_factory = None
+
+
+def _recompute_shard(user_ids: list[int]) -> int:
+    with _session_factory() as db:
+        for user_id in user_ids:
+            cgt_service.rebuild(db, user_id)
+    return len(user_ids)
+
+
+def _shards(user_ids: list[int], size: int) -> Iterator[list[int]]:
+    for start in range(0, len(user_ids), size):
+        yield user_ids[start:start + size]
+
+
+def list_user_ids(db: Session) -> list[int]:
+    return list(db.scalars(select(User.id).order_by(User.id)))
+
+
+def recompute(
+    database_url: str,
+    user_ids: list[int],
+    workers: int = 1,
+    shard_size: int = 50,
+    on_progress: Callable[[int], None] | None = None,
+) -> int:
+    """Rebuild every user's CGT cache; ``workers <= 1`` stays in this process.
+
+    Each worker opens its own engine on ``database_url`` and commits per user, so a
+    failure leaves the users already processed rebuilt.
+    """
+    done = 0
+    if workers <= 1:
+        _init_worker(database_url)
+        try:
+            for shard in _shards(user_ids, shard_size):
+                done += _recompute_shard(shard)
+                if on_progress:
+                    on_progress(done)
+        finally:
+            _close_worker()
+        return done
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(database_url,)
+    ) as pool:
+        futures = [pool.submit(_recompute_shard, shard) for shard in _shards(user_ids, shard_size)]
+        for future in as_completed(futures):
+            done += future.result()
+            if on_progress:
+                on_progress(done)
+    return done
@@ -1,24 +1,80 @@
+import base64
+import json
 from collections import defaultdict
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass, field
-from datetime import date, timedelta
+from datetime import date, time, timedelta
 from decimal import Decimal
+from itertools import groupby
 
-from sqlalchemy import select
+from sqlalchemy import Select, and_, delete, false, func, insert, or_, select, tuple_, update
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.models.cgt import (
+    CGTCheckpoint,
+    CGTCheckpointLot,
+    CGTLotMatch,
+    CGTState,
+    CGTTickerState,
+    CGTYearSummary,
+    OpenLot,
+)
 from app.models.transaction import Action, StockTransaction
-from app.schemas.report import CGTOverview, FinancialYearSummary, LotMatch
+from app.schemas.report import (
+    CGTOverview,
+    CGTSimulation,
+    FinancialYearSummary,
+    LotMatch,
+    LotMatchPage,
+    LotStrategy,
+    MatchSortField,
+    SimulatedSell,
+    SimulatedYear,
+)
+from app.services.cgt_lots import POOLS, FifoPool, LotPool
 
 ZERO = Decimal("0")
 
 
 @dataclass
 class BuyLot:
+    transaction_id: int
     date: date
     remaining: int
     cost_per_unit: Decimal
     fee_per_unit: Decimal
 
+    @property
+    def unit_cost(self) -> Decimal:
+        return self.cost_per_unit + self.fee_per_unit
+
+
+@dataclass
+class YearTotals:
+    """Running raw gain/loss totals for one financial year."""
+
+    total_gains: Decimal = ZERO
+    total_losses: Decimal = ZERO
+    discount_gains: Decimal = ZERO
+    non_discount_gains: Decimal = ZERO
+
+    def add(self, raw_gain: Decimal, held_over_12_months: bool) -> None:
+        if raw_gain > ZERO:
+            self.total_gains += raw_gain
+            if held_over_12_months:
+                self.discount_gains += raw_gain
+            else:
+                self.non_discount_gains += raw_gain
+        elif raw_gain < ZERO:
+            self.total_losses += raw_gain
+
+    def merge(self, other: "YearTotals") -> None:
+        self.total_gains += other.total_gains
+        self.total_losses += other.total_losses
+        self.discount_gains += other.discount_gains
+        self.non_discount_gains += other.non_discount_gains
+
 
 def _financial_year(d: date) -> str:
     if d.month >= 7:
@@ -26,91 +82,685 @@ def _financial_year(d: date) -> str:
     return f"{d.year - 1}-{str(d.year)[2:]}"
 
 
+def _year_start(d: date) -> date:
+    return date(d.year if d.month >= 7 else d.year - 1, 7, 1)
+
+
 def _held_over_12_months(buy_date: date, sell_date: date) -> bool:
     return (sell_date - buy_date) > timedelta(days=365)
 
 
-def compute_cgt(db: Session, user_id: int, fy: str | None = None) -> CGTOverview:
+def compute_cgt(
+    db: Session,
+    user_id: int,
+    fy: str | None = None,
+    as_of: date | None = None,
+    strategy: LotStrategy = "fifo",
+) -> CGTOverview:
+    if strategy != "fifo":
+        return _compute_with_strategy(db, user_id, strategy, fy=fy, as_of=as_of)
+    refresh(db, user_id)
+
+    stmt = (
+        select(CGTLotMatch)
+        .where(CGTLotMatch.user_id == user_id)
+        .order_by(CGTLotMatch.sell_date, CGTLotMatch.ticker, CGTLotMatch.id)
+    )
+    if fy:
+        stmt = stmt.where(CGTLotMatch.financial_year == fy)
+    if as_of:
+        stmt = stmt.where(CGTLotMatch.sell_date <= as_of)
+
+    fy_matches: dict[str, list[LotMatch]] = defaultdict(list)
+    totals: dict[str, YearTotals] = defaultdict(YearTotals)
+    for row in db.scalars(stmt):
+        fy_matches[row.financial_year].append(LotMatch.model_validate(row, from_attributes=True))
+        totals[row.financial_year].add(row.raw_gain, row.held_over_12_months)
+
+    summaries = [
+        _build_summary(fy_key, totals[fy_key], fy_matches[fy_key]) for fy_key in sorted(fy_matches)
+    ]
+    return CGTOverview(financial_years=summaries)
+
+
+def compute_cgt_summary(
+    db: Session, user_id: int, as_of: date | None = None, strategy: LotStrategy = "fifo"
+) -> CGTOverview:
+    """Per-year summaries without lot matches, summed from the stored per-ticker totals."""
+    if strategy != "fifo":
+        return _compute_with_strategy(db, user_id, strategy, as_of=as_of, with_matches=False)
+    refresh(db, user_id)
+
+    stmt = select(CGTYearSummary).where(CGTYearSummary.user_id == user_id)
+    if as_of:
+        stmt = stmt.where(CGTYearSummary.financial_year < _financial_year(as_of))
+    totals = _sum_year_totals(db, stmt)
+
+    if as_of:
+        # The year containing as_of is only partly realised, so total its matches directly
+        fy_key = _financial_year(as_of)
+        partial_rows = db.execute(
+            select(CGTLotMatch.raw_gain, CGTLotMatch.held_over_12_months).where(
+                CGTLotMatch.user_id == user_id,
+                CGTLotMatch.financial_year == fy_key,
+                CGTLotMatch.sell_date <= as_of,
+            )
+        )
+        for raw_gain, held_long in partial_rows:
+            totals.setdefault(fy_key, YearTotals()).add(raw_gain, held_long)
+
+    summaries = [_build_summary(fy_key, totals[fy_key]) for fy_key in sorted(totals)]
+    return CGTOverview(financial_years=summaries)
+
+
+def _compute_with_strategy(
+    db: Session,
+    user_id: int,
+    strategy: LotStrategy,
+    fy: str | None = None,
+    as_of: date | None = None,
+    with_matches: bool = True,
+) -> CGTOverview:
+    """Match the full history with a non-FIFO strategy; the cache only holds FIFO results."""
+    _, match_lots = _engine()
+    ticker = func.upper(StockTransaction.ticker)
     stmt = (
         select(StockTransaction)
         .where(StockTransaction.user_id == user_id)
-        .order_by(StockTransaction.date, StockTransaction.time)
+        .order_by(ticker, StockTransaction.date, StockTransaction.time, StockTransaction.id)
     )
-    transactions = list(db.scalars(stmt).all())
+    if as_of:
+        stmt = stmt.where(StockTransaction.date <= as_of)
+
+    totals: dict[str, YearTotals] = defaultdict(YearTotals)
+    match_rows: list[dict] | None = [] if with_matches else None
+    for _, transactions in groupby(db.scalars(stmt), key=lambda txn: txn.ticker.upper()):
+        match_lots(transactions, defaultdict(POOLS[strategy]), totals, match_rows)
 
-    buy_queues: dict[str, list[BuyLot]] = defaultdict(list)
     fy_matches: dict[str, list[LotMatch]] = defaultdict(list)
+    for row in sorted(match_rows or [], key=lambda row: (row["sell_date"], row["ticker"])):
+        fy_matches[row["financial_year"]].append(LotMatch(**row))
+    summaries = [
+        _build_summary(fy_key, totals[fy_key], fy_matches.get(fy_key))
+        for fy_key in sorted(totals)
+        if not fy or fy_key == fy
+    ]
+    return CGTOverview(financial_years=summaries)
+
+
+MATCH_SORT_COLUMNS = {
+    "sell_date": CGTLotMatch.sell_date,
+    "ticker": CGTLotMatch.ticker,
+    "quantity": CGTLotMatch.quantity,
+    "raw_gain": CGTLotMatch.raw_gain,
+    "net_gain": CGTLotMatch.net_gain,
+}
+
+
+def list_lot_matches(
+    db: Session,
+    user_id: int,
+    fy: str,
+    ticker: str | None = None,
+    sort: MatchSortField = "sell_date",
+    descending: bool = False,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> LotMatchPage:
+    """One page of a financial year's stored lot matches, keyset-paginated on (sort, id).
+
+    Raises ``ValueError`` for a cursor that was not issued for this sort.
+    """
+    refresh(db, user_id)
+
+    column = MATCH_SORT_COLUMNS[sort]
+    key = tuple_(column, CGTLotMatch.id)
+    stmt = select(CGTLotMatch).where(
+        CGTLotMatch.user_id == user_id, CGTLotMatch.financial_year == fy
+    )
+    if ticker:
+        stmt = stmt.where(CGTLotMatch.ticker == ticker.upper())
+    if cursor:
+        after = tuple_(*_decode_cursor(cursor, sort))
+        stmt = stmt.where(key < after if descending else key > after)
+    if descending:
+        stmt = stmt.order_by(column.desc(), CGTLotMatch.id.desc())
+    else:
+        stmt = stmt.order_by(column, CGTLotMatch.id)
+
+    rows = list(db.scalars(stmt.limit(limit + 1)))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(sort, getattr(rows[-1], sort), rows[-1].id)
+    return LotMatchPage(
+        financial_year=fy,
+        items=[LotMatch.model_validate(row, from_attributes=True) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+def _encode_cursor(sort: str, value: object, row_id: int) -> str:
+    raw = json.dumps([sort, str(value), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple[object, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, row_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError
+        if sort == "sell_date":
+            value = date.fromisoformat(value)
+        elif sort == "quantity":
+            value = int(value)
+        elif sort != "ticker":
+            value = Decimal(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, ArithmeticError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def simulate_sells(db: Session, user_id: int, sells: list[SimulatedSell]) -> CGTSimulation:
+    """Marginal CGT effect of hypothetical sells, matched against the cached open lots.
+
+    Sells must fall on or after their ticker's last recorded trade, so the open lots are
+    the parcels they would draw on. Raises ``ValueError`` for an earlier sell or one
+    larger than the remaining holding.
+    """
+    refresh(db, user_id)
+    make_lot, match_lots = _engine()
+
+    buy_queues: dict[str, LotPool] = {}
+    for sell in sells:
+        ticker = sell.ticker.upper()
+        if ticker in buy_queues:
+            continue
+        ticker_state = db.get(CGTTickerState, (user_id, ticker))
+        if (
+            ticker_state is not None
+            and ticker_state.replayed_through is not None
+            and sell.date < ticker_state.replayed_through
+        ):
+            raise ValueError(
+                f"Simulated {ticker} sells must be dated on or after "
+                f"{ticker_state.replayed_through.isoformat()}"
+            )
+        buy_queues.update(_load_open_lots(db, user_id, ticker, make_lot))
+        buy_queues.setdefault(ticker, FifoPool())
+
+    totals: dict[str, YearTotals] = defaultdict(YearTotals)
+    match_rows: list[dict] = []
+    for sell in sorted(sells, key=lambda s: s.date):
+        ticker = sell.ticker.upper()
+        held = sum(lot.remaining for lot in buy_queues[ticker])
+        if sell.quantity > held:
+            raise ValueError(f"Cannot sell {sell.quantity} {ticker}: only {held} held")
+        txn = StockTransaction(
+            date=sell.date, time=time(), action=Action.SELL, ticker=ticker,
+            quantity=sell.quantity, price=sell.price, fee=sell.fee,
+        )
+        match_lots([txn], buy_queues, totals, match_rows)
+
+    current = _sum_year_totals(
+        db,
+        select(CGTYearSummary).where(
+            CGTYearSummary.user_id == user_id, CGTYearSummary.financial_year.in_(totals)
+        ),
+    )
+    years = []
+    for fy_key in sorted(totals):
+        before = _build_summary(fy_key, current.get(fy_key, YearTotals()))
+        combined = YearTotals()
+        combined.merge(current.get(fy_key, YearTotals()))
+        combined.merge(totals[fy_key])
+        after = _build_summary(
+            fy_key,
+            combined,
+            [LotMatch(**row) for row in match_rows if row["financial_year"] == fy_key],
+        )
+        years.append(
+            SimulatedYear(
+                financial_year=fy_key,
+                current=before,
+                simulated=after,
+                net_capital_gain_change=after.net_capital_gain - before.net_capital_gain,
+            )
+        )
+    return CGTSimulation(financial_years=years)
+
+
+def invalidate(db: Session, user_id: int, ticker: str, from_date: date) -> None:
+    """Mark ``ticker``'s cached results from ``from_date`` onwards as stale; the caller commits."""
+    state = db.get(CGTState, user_id)
+    if state is None:
+        return
+    ticker = ticker.upper()
+    ticker_state = db.get(CGTTickerState, (user_id, ticker))
+    if ticker_state is None:
+        ticker_state = CGTTickerState(user_id=user_id, ticker=ticker)
+        db.add(ticker_state)
+    if ticker_state.dirty_from is None or from_date < ticker_state.dirty_from:
+        ticker_state.dirty_from = from_date
+    if state.dirty_from is None or from_date < state.dirty_from:
+        state.dirty_from = from_date
+
+
+def clear_cache(db: Session, user_id: int) -> None:
+    """Drop every cached CGT row for a user; the caller commits."""
+    db.execute(delete(CGTLotMatch).where(CGTLotMatch.user_id == user_id))
+    db.execute(delete(CGTYearSummary).where(CGTYearSummary.user_id == user_id))
+    db.execute(delete(OpenLot).where(OpenLot.user_id == user_id))
+    _delete_checkpoints(db, user_id)
+    db.execute(delete(CGTTickerState).where(CGTTickerState.user_id == user_id))
+    db.execute(delete(CGTState).where(CGTState.user_id == user_id))
+
+
+def rebuild(db: Session, user_id: int) -> None:
+    """Discard a user's cached CGT rows and replay their full history."""
+    clear_cache(db, user_id)
+    refresh(db, user_id)
+
+
+@dataclass
+class TickerPartition:
+    """One ticker's replay: the lots and totals it resumes from and the rows it adds.
+
+    Partitions share no state, so each can be matched on its own once its starting
+    lots are loaded.
+    """
+
+    state: CGTTickerState
+    buy_queues: dict[str, LotPool]
+    totals: dict[str, YearTotals]
+    last_date: date | None = None
+    # Replay trades on or after this date; None replays the ticker's whole history
+    start: date | None = None
+    # Nothing is stored for the ticker yet, so there is nothing to overwrite
+    fresh: bool = False
+    match_rows: list[dict] = field(default_factory=list)
+    checkpoints: list[tuple[date, list[dict]]] = field(default_factory=list)
+
+    def replay(self, transactions: list[StockTransaction], match_lots: Callable) -> None:
+        def snapshot(as_at: date) -> None:
+            self.checkpoints.append((as_at, _lot_rows(self.buy_queues)))
+
+        match_lots(
+            transactions, self.buy_queues, self.totals, self.match_rows, self.last_date, snapshot
+        )
+        if transactions:
+            self.state.replayed_through = transactions[-1].date
+
+
+def refresh(db: Session, user_id: int) -> None:
+    """Bring the cached open lots, lot matches and year totals up to date.
+
+    Each ticker is matched as its own partition with its own watermark, so a write only
+    replays the tickers it touched. Within a ticker, writes after the watermark resume
+    from the stored open lots and earlier writes from the ticker's last 30 June
+    checkpoint before the affected date; without a usable checkpoint the ticker's full
+    history is replayed.
+    """
+    state = db.get(CGTState, user_id)
+    if state is not None:
+        if state.dirty_from is None:
+            return
+        # Take the write lock before reading the watermarks, so concurrent reads after
+        # one write replay it once; a refresh that waited on another finds it clean
+        claimed = db.execute(
+            update(CGTState)
+            .where(CGTState.user_id == user_id, CGTState.dirty_from.is_not(None))
+            .values(dirty_from=CGTState.dirty_from)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.commit()
+            return
+        db.refresh(state)
+
+    make_lot, match_lots = _engine()
+    ticker = func.upper(StockTransaction.ticker)
+    stmt = (
+        select(StockTransaction)
+        .where(StockTransaction.user_id == user_id)
+        .order_by(ticker, StockTransaction.date, StockTransaction.time, StockTransaction.id)
+    )
+    partitions: dict[str, TickerPartition] = {}
+    if state is None:
+        clear_cache(db, user_id)
+        db.add(CGTState(user_id=user_id))
+    else:
+        stale = db.scalars(
+            select(CGTTickerState).where(
+                CGTTickerState.user_id == user_id, CGTTickerState.dirty_from.is_not(None)
+            ).execution_options(populate_existing=True)
+        )
+        for ticker_state in stale:
+            partitions[ticker_state.ticker] = _open_partition(db, user_id, ticker_state, make_lot)
+        state.dirty_from = None
+        stmt = stmt.where(
+            or_(
+                false(),
+                *(
+                    and_(ticker == key, StockTransaction.date >= p.start)
+                    if p.start
+                    else ticker == key
+                    for key, p in partitions.items()
+                ),
+            )
+        )
+
+    for key, transactions in groupby(db.scalars(stmt), key=lambda txn: txn.ticker.upper()):
+        if state is None:
+            ticker_state = CGTTickerState(user_id=user_id, ticker=key)
+            db.add(ticker_state)
+            partitions[key] = TickerPartition(
+                ticker_state, defaultdict(FifoPool), defaultdict(YearTotals), fresh=True
+            )
+        partitions[key].replay(list(transactions), match_lots)
+
+    _store_partitions(db, user_id, partitions.values())
+    db.commit()
+
+
+def _open_partition(
+    db: Session, user_id: int, ticker_state: CGTTickerState, make_lot: Callable
+) -> TickerPartition:
+    """Load a stale ticker's starting lots and drop the cached rows it will replace."""
+    ticker = ticker_state.ticker
+    dirty_from = ticker_state.dirty_from
+    if ticker_state.replayed_through is not None and dirty_from > ticker_state.replayed_through:
+        last_date = ticker_state.replayed_through
+        # A replay from a checkpoint that found no later trades stops on its 30 June;
+        # resume in the next year so that boundary is not snapshotted twice
+        if db.scalar(
+            select(CGTCheckpoint.id).where(
+                CGTCheckpoint.user_id == user_id,
+                CGTCheckpoint.ticker == ticker,
+                CGTCheckpoint.as_at == last_date,
+            )
+        ):
+            last_date += timedelta(days=1)
+        totals = _load_year_totals(db, user_id, ticker, since=_financial_year(last_date))
+        return TickerPartition(
+            ticker_state,
+            _load_open_lots(db, user_id, ticker, make_lot),
+            defaultdict(YearTotals, totals),
+            last_date=last_date,
+            start=dirty_from,
+        )
+
+    checkpoint = db.scalars(
+        select(CGTCheckpoint)
+        .where(
+            CGTCheckpoint.user_id == user_id,
+            CGTCheckpoint.ticker == ticker,
+            CGTCheckpoint.as_at < dirty_from,
+        )
+        .order_by(CGTCheckpoint.as_at.desc())
+        .limit(1)
+    ).first()
+    if checkpoint is None:
+        _delete_ticker_rows(db, user_id, ticker)
+        ticker_state.replayed_through = None
+        return TickerPartition(ticker_state, defaultdict(FifoPool), defaultdict(YearTotals))
+
+    _delete_ticker_rows(db, user_id, ticker, after=checkpoint.as_at)
+    ticker_state.replayed_through = checkpoint.as_at
+    # Start in the year after the snapshot so its own boundary is not re-recorded
+    start = checkpoint.as_at + timedelta(days=1)
+    return TickerPartition(
+        ticker_state,
+        _load_checkpoint_lots(db, checkpoint.id, make_lot),
+        defaultdict(YearTotals),
+        last_date=start,
+        start=start,
+    )
+
+
+def _delete_ticker_rows(db: Session, user_id: int, ticker: str, after: date | None = None) -> None:
+    """Drop a ticker's matches, year totals and checkpoints after ``after`` (default: all)."""
+    matches = delete(CGTLotMatch).where(
+        CGTLotMatch.user_id == user_id, CGTLotMatch.ticker == ticker
+    )
+    summaries = delete(CGTYearSummary).where(
+        CGTYearSummary.user_id == user_id, CGTYearSummary.ticker == ticker
+    )
+    if after is not None:
+        matches = matches.where(CGTLotMatch.sell_date > after)
+        summaries = summaries.where(CGTYearSummary.financial_year > _financial_year(after))
+    db.execute(matches)
+    db.execute(summaries)
+    _delete_checkpoints(db, user_id, ticker, after=after)
+
+
+def _store_partitions(db: Session, user_id: int, partitions: Iterable[TickerPartition]) -> None:
+    match_rows: list[dict] = []
+    summary_rows: list[dict] = []
+    lot_rows: list[dict] = []
+    checkpoints: list[tuple[CGTCheckpoint, list[dict]]] = []
+    for partition in partitions:
+        ticker = partition.state.ticker
+        if not partition.fresh:
+            db.execute(
+                delete(OpenLot).where(OpenLot.user_id == user_id, OpenLot.ticker == ticker)
+            )
+            db.execute(
+                delete(CGTYearSummary).where(
+                    CGTYearSummary.user_id == user_id,
+                    CGTYearSummary.ticker == ticker,
+                    CGTYearSummary.financial_year.in_(partition.totals),
+                )
+            )
+        match_rows.extend(partition.match_rows)
+        summary_rows.extend(
+            {"ticker": ticker, "financial_year": fy_key, **vars(totals)}
+            for fy_key, totals in partition.totals.items()
+        )
+        lot_rows.extend(_lot_rows(partition.buy_queues))
+        for as_at, rows in partition.checkpoints:
+            checkpoint = CGTCheckpoint(user_id=user_id, ticker=ticker, as_at=as_at)
+            db.add(checkpoint)
+            checkpoints.append((checkpoint, rows))
+        partition.state.dirty_from = None
+
+    if match_rows:
+        db.execute(insert(CGTLotMatch).values(user_id=user_id), match_rows)
+    if summary_rows:
+        db.execute(insert(CGTYearSummary).values(user_id=user_id), summary_rows)
+    if lot_rows:
+        db.execute(insert(OpenLot).values(user_id=user_id), lot_rows)
+    if checkpoints:
+        db.flush()
+        checkpoint_lots = [
+            {"checkpoint_id": checkpoint.id, **row}
+            for checkpoint, rows in checkpoints
+            for row in rows
+        ]
+        if checkpoint_lots:
+            db.execute(insert(CGTCheckpointLot), checkpoint_lots)
+
+
+def _engine() -> tuple[Callable, Callable]:
+    """Lot factory and matcher for the configured ``cgt_engine``."""
+    if settings.cgt_engine == "fixed":
+        from app.services import cgt_fixed
+
+        return cgt_fixed.buy_lot, cgt_fixed.match_lots
+    return _buy_lot, _match_lots
+
+
+def _match_lots(
+    transactions: Iterable[StockTransaction],
+    buy_queues: dict[str, LotPool],
+    totals: dict[str, YearTotals],
+    match_rows: list[dict] | None = None,
+    last_date: date | None = None,
+    on_year_end: Callable[[date], None] | None = None,
+) -> None:
+    """Match sells against the lot pools in ``buy_queues`` in place, adding to ``totals``.
+
+    The pool (see ``cgt_lots``) picks the parcel each sell draws on next; the cache only
+    ever holds ``FifoPool``s. Matched parcels are appended to ``match_rows`` as plain
+    column dicts when given; summary-only callers pass ``None`` and nothing per parcel
+    is kept. ``on_year_end`` is called with the closing 30 June before the first trade
+    of each new financial year, while ``buy_queues`` still holds that year's closing
+    lots.
+    """
+    current_fy = _financial_year(last_date) if last_date else None
+    cents = Decimal("0.01")
 
     for txn in transactions:
+        txn_fy = _financial_year(txn.date)
+        if txn_fy != current_fy:
+            if current_fy is not None and on_year_end is not None:
+                on_year_end(_year_start(txn.date) - timedelta(days=1))
+            current_fy = txn_fy
+
         ticker = txn.ticker.upper()
         if txn.action == Action.BUY:
-            fee_per_unit = Decimal(str(txn.fee)) / txn.quantity
-            cost_per_unit = Decimal(str(txn.price))
-            buy_queues[ticker].append(
-                BuyLot(
-                    date=txn.date,
-                    remaining=txn.quantity,
-                    cost_per_unit=cost_per_unit,
-                    fee_per_unit=fee_per_unit,
-                )
-            )
+            buy_queues[ticker].append(_buy_lot(txn, txn.quantity))
         else:
             sell_qty = txn.quantity
             sell_fee_per_unit = Decimal(str(txn.fee)) / txn.quantity
             sell_price = Decimal(str(txn.price))
-            sell_fy = _financial_year(txn.date)
+
+            unit_proceeds = sell_price - sell_fee_per_unit
 
             queue = buy_queues[ticker]
+            if queue:
+                year_totals = totals[txn_fy]
             while sell_qty > 0 and queue:
-                lot = queue[0]
+                lot = queue.peek(txn.date, unit_proceeds)
                 matched = min(lot.remaining, sell_qty)
 
-                cost_base = matched * (lot.cost_per_unit + lot.fee_per_unit)
-                proceeds = matched * (sell_price - sell_fee_per_unit)
+                cost_base = matched * lot.unit_cost
+                proceeds = matched * unit_proceeds
                 raw_gain = proceeds - cost_base
                 held_long = _held_over_12_months(lot.date, txn.date)
                 discount = (raw_gain * Decimal("0.5")) if (held_long and raw_gain > ZERO) else ZERO
                 net_gain = raw_gain - discount
 
-                fy_matches[sell_fy].append(
-                    LotMatch(
-                        ticker=ticker,
-                        sell_date=txn.date,
-                        quantity=matched,
-                        cost_base=cost_base.quantize(Decimal("0.01")),
-                        proceeds=proceeds.quantize(Decimal("0.01")),
-                        raw_gain=raw_gain.quantize(Decimal("0.01")),
-                        held_over_12_months=held_long,
-                        discount=discount.quantize(Decimal("0.01")),
-                        net_gain=net_gain.quantize(Decimal("0.01")),
+                rounded_gain = raw_gain.quantize(cents)
+                year_totals.add(rounded_gain, held_long)
+                if match_rows is not None:
+                    match_rows.append(
+                        {
+                            "financial_year": txn_fy,
+                            "ticker": ticker,
+                            "sell_date": txn.date,
+                            "quantity": matched,
+                            "cost_base": cost_base.quantize(cents),
+                            "proceeds": proceeds.quantize(cents),
+                            "raw_gain": rounded_gain,
+                            "held_over_12_months": held_long,
+                            "discount": discount.quantize(cents),
+                            "net_gain": net_gain.quantize(cents),
+                        }
                     )
-                )
 
                 lot.remaining -= matched
                 sell_qty -= matched
                 if lot.remaining == 0:
-                    queue.pop(0)
+                    queue.pop()
 
-    summaries = []
-    for fy_key in sorted(fy_matches.keys()):
-        if fy and fy_key != fy:
-            continue
-        matches = fy_matches[fy_key]
-        summaries.append(_build_summary(fy_key, matches))
 
-    return CGTOverview(financial_years=summaries)
+def _buy_lot(txn: StockTransaction, remaining: int) -> BuyLot:
+    return BuyLot(
+        transaction_id=txn.id,
+        date=txn.date,
+        remaining=remaining,
+        cost_per_unit=Decimal(str(txn.price)),
+        fee_per_unit=Decimal(str(txn.fee)) / txn.quantity,
+    )
 
 
-def _build_summary(fy_key: str, matches: list[LotMatch]) -> FinancialYearSummary:
-    total_gains = sum((m.raw_gain for m in matches if m.raw_gain > ZERO), ZERO)
-    total_losses = sum((m.raw_gain for m in matches if m.raw_gain < ZERO), ZERO)
+def _load_open_lots(
+    db: Session, user_id: int, ticker: str, make_lot: Callable = _buy_lot
+) -> dict[str, list]:
+    stmt = (
+        select(OpenLot.ticker, OpenLot.remaining, StockTransaction)
+        .join(StockTransaction, StockTransaction.id == OpenLot.transaction_id)
+        .where(OpenLot.user_id == user_id, OpenLot.ticker == ticker)
+        .order_by(OpenLot.id)
+    )
+    return _queues_from_rows(db.execute(stmt), make_lot)
 
-    discount_raw = sum(
-        (m.raw_gain for m in matches if m.held_over_12_months and m.raw_gain > ZERO), ZERO
+
+def _load_checkpoint_lots(
+    db: Session, checkpoint_id: int, make_lot: Callable = _buy_lot
+) -> dict[str, list]:
+    stmt = (
+        select(CGTCheckpointLot.ticker, CGTCheckpointLot.remaining, StockTransaction)
+        .join(StockTransaction, StockTransaction.id == CGTCheckpointLot.transaction_id)
+        .where(CGTCheckpointLot.checkpoint_id == checkpoint_id)
+        .order_by(CGTCheckpointLot.id)
     )
-    non_discount_raw = sum(
-        (m.raw_gain for m in matches if not m.held_over_12_months and m.raw_gain > ZERO), ZERO
+    return _queues_from_rows(db.execute(stmt), make_lot)
+
+
+def _queues_from_rows(
+    rows: Iterable[tuple[str, int, StockTransaction]], make_lot: Callable
+) -> dict[str, LotPool]:
+    buy_queues: dict[str, LotPool] = defaultdict(FifoPool)
+    for ticker, remaining, txn in rows:
+        buy_queues[ticker].append(make_lot(txn, remaining))
+    return buy_queues
+
+
+def _lot_rows(buy_queues: dict[str, LotPool]) -> list[dict]:
+    return [
+        {"transaction_id": lot.transaction_id, "ticker": ticker, "remaining": lot.remaining}
+        for ticker, queue in buy_queues.items()
+        for lot in queue
+    ]
+
+
+def _delete_checkpoints(
+    db: Session, user_id: int, ticker: str | None = None, after: date | None = None
+) -> None:
+    stale = select(CGTCheckpoint.id).where(CGTCheckpoint.user_id == user_id)
+    if ticker is not None:
+        stale = stale.where(CGTCheckpoint.ticker == ticker)
+    if after is not None:
+        stale = stale.where(CGTCheckpoint.as_at > after)
+    db.execute(delete(CGTCheckpointLot).where(CGTCheckpointLot.checkpoint_id.in_(stale)))
+    db.execute(delete(CGTCheckpoint).where(CGTCheckpoint.id.in_(stale)))
+
+
+def _load_year_totals(db: Session, user_id: int, ticker: str, since: str) -> dict[str, YearTotals]:
+    stmt = select(CGTYearSummary).where(
+        CGTYearSummary.user_id == user_id,
+        CGTYearSummary.ticker == ticker,
+        CGTYearSummary.financial_year >= since,
     )
+    return {row.financial_year: _year_totals(row) for row in db.scalars(stmt)}
+
+
+def _sum_year_totals(db: Session, stmt: Select) -> dict[str, YearTotals]:
+    """Per-year totals summed over the ticker rows ``stmt`` selects."""
+    totals: dict[str, YearTotals] = {}
+    for row in db.scalars(stmt):
+        totals.setdefault(row.financial_year, YearTotals()).merge(_year_totals(row))
+    return totals
+
+
+def _year_totals(row: CGTYearSummary) -> YearTotals:
+    return YearTotals(
+        total_gains=row.total_gains,
+        total_losses=row.total_losses,
+        discount_gains=row.discount_gains,
+        non_discount_gains=row.non_discount_gains,
+    )
+
+
+def _build_summary(
+    fy_key: str, totals: YearTotals, matches: list[LotMatch] | None = None
+) -> FinancialYearSummary:
+    total_losses = totals.total_losses
+    discount_raw = totals.discount_gains
+    non_discount_raw = totals.non_discount_gains
 
     # ATO 18A: apply losses against non-discount first, then discount
     remaining_losses = abs(total_losses)
@@ -125,11 +775,11 @@ def _build_summary(fy_key: str, matches: list[LotMatch]) -> FinancialYearSummary
 
     return FinancialYearSummary(
         financial_year=fy_key,
-        total_gains=total_gains.quantize(Decimal("0.01")),
+        total_gains=totals.total_gains.quantize(Decimal("0.01")),
         total_losses=total_losses.quantize(Decimal("0.01")),
         discount_gains=discount_raw.quantize(Decimal("0.01")),
         non_discount_gains=non_discount_raw.quantize(Decimal("0.01")),
         discount_amount=discount_amount.quantize(Decimal("0.01")),
         net_capital_gain=net_capital_gain.quantize(Decimal("0.01")),
-        lot_matches=matches,
+        lot_matches=matches or [],
     )
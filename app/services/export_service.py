@@ -0,0 +1,152 @@
+"""Render a user's export a batch of rows at a time.
+
+Transactions are read as column tuples with ``yield_per``, so the driver streams them
+from a server-side cursor and no ORM objects are built. Each format turns a batch into
+a text fragment as it arrives, and the fragments join up to the same document the
+whole-history export produced: a CSV file, or the ``indent=2`` JSON of the user and
+their transactions. NDJSON is a line per transaction, with no user record.
+"""
+
+import csv
+import io
+import json
+import textwrap
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+from sqlalchemy import Row, Select, select
+from sqlalchemy.orm import Session
+
+from app.models.transaction import StockTransaction
+from app.models.user import User
+
+# Rows fetched from the cursor, and rendered, at a time
+EXPORT_BATCH = 1000
+
+COLUMNS = (
+    StockTransaction.id,
+    StockTransaction.date,
+    StockTransaction.time,
+    StockTransaction.action,
+    StockTransaction.ticker,
+    StockTransaction.quantity,
+    StockTransaction.price,
+    StockTransaction.value,
+    StockTransaction.fee,
+    StockTransaction.contract_note,
+)
+
+CSV_HEADER = [
+    "date", "time", "action", "ticker", "quantity", "price", "value", "fee", "contract_note",
+]
+
+
+def transactions_query(user_id: int) -> Select:
+    return (
+        select(*COLUMNS)
+        .where(StockTransaction.user_id == user_id)
+        .order_by(StockTransaction.date, StockTransaction.time, StockTransaction.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+
+
+class CsvExport:
+    media_type = "text/csv"
+
+    def __init__(self, user: User) -> None:
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf)
+
+    def _flush(self) -> str:
+        text = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate()
+        return text
+
+    def head(self) -> str:
+        self._writer.writerow(CSV_HEADER)
+        return self._flush()
+
+    def rows(self, rows: Sequence[Row]) -> str:
+        self._writer.writerows(
+            (
+                date.isoformat(), time.isoformat(), action.value, ticker, quantity,
+                str(price), str(value), str(fee), contract_note or "",
+            )
+            for _, date, time, action, ticker, quantity, price, value, fee, contract_note
+            in rows
+        )
+        return self._flush()
+
+    def tail(self) -> str:
+        return ""
+
+
+class JsonExport:
+    media_type = "application/json"
+
+    def __init__(self, user: User) -> None:
+        self.user = user
+        self._empty = True
+
+    def head(self) -> str:
+        user = {
+            "id": self.user.id,
+            "username": self.user.username,
+            "created_at": self.user.created_at.isoformat(),
+        }
+        user_json = textwrap.indent(json.dumps(user, indent=2), "  ").lstrip()
+        return f'{{\n  "user": {user_json},\n  "transactions": ['
+
+    def rows(self, rows: Sequence[Row]) -> str:
+        if not rows:
+            return ""
+        items = ",".join(
+            "\n" + textwrap.indent(json.dumps(_txn_dict(row), indent=2), "    ") for row in rows
+        )
+        text = items if self._empty else "," + items
+        self._empty = False
+        return text
+
+    def tail(self) -> str:
+        return "]\n}" if self._empty else "\n  ]\n}"
+
+
+def _txn_dict(row: Row) -> dict[str, Any]:
+    txn_id, date, time, action, ticker, quantity, price, value, fee, contract_note = row
+    return {
+        "id": txn_id, "date": date.isoformat(), "time": time.isoformat(),
+        "action": action.value, "ticker": ticker, "quantity": quantity,
+        "price": str(price), "value": str(value), "fee": str(fee),
+        "contract_note": contract_note,
+    }
+
+
+class NdjsonExport:
+    """One compact JSON object per transaction and line, as ``NdjsonParser`` reads."""
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, user: User) -> None:
+        pass
+
+    def head(self) -> str:
+        return ""
+
+    def rows(self, rows: Sequence[Row]) -> str:
+        return "".join(json.dumps(_txn_dict(row), separators=(",", ":")) + "\n" for row in rows)
+
+    def tail(self) -> str:
+        return ""
+
+
+FORMATS = {"csv": CsvExport, "json": JsonExport, "ndjson": NdjsonExport}
+
+
+def export(db: Session, user: User, format: str) -> Iterator[str]:
+    """``user``'s export in ``format``, one fragment per batch of transactions."""
+    out = FORMATS[format](user)
+    yield out.head()
+    for rows in db.execute(transactions_query(user.id)).partitions():
+        yield out.rows(rows)
+    yield out.tail()
@@ -0,0 +1,61 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.cgt import OpenLot
+from app.models.transaction import StockTransaction
+from app.schemas.holding import Holding, HoldingParcel
+from app.services import cgt_service
+from app.services.cgt_lots import DISCOUNT_AFTER
+
+
+def list_holdings(
+    db: Session, user_id: int, ticker: str | None = None, discount_as_of: date | None = None
+) -> list[Holding]:
+    """Current open parcels per ticker, in FIFO order, read from the cached open lots.
+
+    Writes only mark the cache stale, so the first read after them replays the tickers
+    they touched. ``discount_as_of`` (default today) is the date the days until the CGT
+    discount are counted from; the parcels are those held now whatever the date.
+    """
+    cgt_service.refresh(db, user_id)
+    discount_as_of = discount_as_of or date.today()
+
+    stmt = (
+        select(OpenLot.ticker, OpenLot.remaining, StockTransaction)
+        .join(StockTransaction, StockTransaction.id == OpenLot.transaction_id)
+        .where(OpenLot.user_id == user_id)
+        .order_by(OpenLot.ticker, OpenLot.id)
+    )
+    if ticker:
+        stmt = stmt.where(OpenLot.ticker == ticker.upper())
+
+    holdings: dict[str, Holding] = {}
+    for lot_ticker, remaining, txn in db.execute(stmt):
+        parcel = _parcel(txn, remaining, discount_as_of)
+        holding = holdings.setdefault(
+            lot_ticker, Holding(ticker=lot_ticker, quantity=0, cost_base=Decimal("0"), parcels=[])
+        )
+        holding.quantity += parcel.quantity
+        holding.cost_base += parcel.cost_base
+        holding.parcels.append(parcel)
+    return list(holdings.values())
+
+
+def _parcel(txn: StockTransaction, remaining: int, as_of: date) -> HoldingParcel:
+    price = Decimal(str(txn.price))
+    fee = Decimal(str(txn.fee))
+    # The parcel carries its share of the buy fee
+    cost_base = remaining * (price * txn.quantity + fee) / txn.quantity
+    days_left = (txn.date + DISCOUNT_AFTER - as_of).days
+    return HoldingParcel(
+        transaction_id=txn.id,
+        acquired=txn.date,
+        quantity=remaining,
+        price=price,
+        cost_base=cost_base.quantize(Decimal("0.01")),
+        discount_eligible=days_left <= 0,
+        days_until_discount=max(days_left, 0),
+    )
@@ -0,0 +1,93 @@
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy.orm import Session, undefer
+
+from app.core.config import settings
+from app.models.import_job import ImportJob, JobStatus
+from app.schemas.import_result import ImportResult
+from app.services import import_service
+from app.services.parsers import RowError
+
+
+def create_job(db: Session, user_id: int, filename: str, content: bytes) -> ImportJob:
+    job = ImportJob(user_id=user_id, filename=filename, content=content, errors=[])
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: int) -> ImportJob | None:
+    return db.get(ImportJob, job_id)
+
+
+def start_job(db: Session, job_id: int) -> tuple[int, str, bytes] | None:
+    """Mark a pending job running; its user id, filename and upload, or None."""
+    job = db.get(ImportJob, job_id, options=[undefer(ImportJob.content)])
+    if job is None or job.status != JobStatus.PENDING or job.content is None:
+        return None
+    job.status = JobStatus.RUNNING
+    job.attempts += 1
+    job.started_at = datetime.now(UTC)
+    db.commit()
+    return job.user_id, job.filename, job.content
+
+
+def finish_job(db: Session, job_id: int, result: ImportResult, rows_read: int) -> None:
+    """Record the outcome; a successful job's upload is no longer needed."""
+    job = db.get(ImportJob, job_id)
+    job.status = JobStatus.FAILED if result.errors else JobStatus.SUCCEEDED
+    job.rows_read = rows_read
+    job.imported = result.imported
+    job.skipped = result.skipped
+    job.errors = result.errors
+    job.error_count = result.error_count
+    job.error_groups = [group.model_dump() for group in result.error_groups]
+    job.rows_per_second = result.rows_per_second
+    job.finished_at = datetime.now(UTC)
+    if not result.errors:
+        job.content = None
+    db.commit()
+
+
+def fail_job(db: Session, job_id: int, error: str) -> None:
+    db.rollback()
+    result = import_service.failed([RowError(error, "import_failed")])
+    finish_job(db, job_id, result, rows_read=0)
+
+
+def is_stuck(job: ImportJob) -> bool:
+    """Pending or running for longer than ``settings.import_job_stale_minutes``.
+
+    A job whose process crashed or restarted is never finished, so this is how it is
+    told from one still under way.
+    """
+    if job.status not in (JobStatus.PENDING, JobStatus.RUNNING):
+        return False
+    since = job.queued_at if job.status == JobStatus.PENDING else job.started_at
+    if since.tzinfo is None:
+        # SQLite hands back naive UTC
+        since = since.replace(tzinfo=UTC)
+    return datetime.now(UTC) - since > timedelta(minutes=settings.import_job_stale_minutes)
+
+
+def retry_job(db: Session, job_id: int) -> ImportJob | None:
+    """Queue a failed or stuck job again from its stored upload; raises ValueError otherwise."""
+    job = db.get(ImportJob, job_id)
+    if job is None:
+        return None
+    if job.status != JobStatus.FAILED and not is_stuck(job):
+        raise ValueError(
+            f"Only failed or stuck jobs can be retried; this one is {job.status.value}"
+        )
+    job.status = JobStatus.PENDING
+    job.rows_read = 0
+    job.errors = []
+    job.error_count = 0
+    job.error_groups = []
+    job.queued_at = datetime.now(UTC)
+    job.started_at = None
+    job.finished_at = None
+    db.commit()
+    db.refresh(job)
+    return job
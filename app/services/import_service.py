@@ -1,41 +1,345 @@
+import io
+import time
+import zipfile
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import replace
+from datetime import date
+from pathlib import PurePosixPath
+
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.models.transaction import Action, StockTransaction
+from app.schemas.import_result import ImportErrorGroup, ImportResult
+from app.services import cgt_service
+from app.services.transaction_service import fingerprint
 
 # Import parsers to trigger registration
-from app.services.parsers import PARSERS  # noqa: F401
+from app.services.parsers import (
+    PARSERS,
+    ParsedBatch,
+    ParsedTransaction,
+    Payload,
+    RowError,
+    StreamingParser,
+    capped,
+    is_streaming,
+    merge,
+)
 import app.services.parsers.native  # noqa: F401
 import app.services.parsers.sharesight  # noqa: F401
 import app.services.parsers.pearler  # noqa: F401
+import app.services.parsers.ndjson  # noqa: F401
+
+
+# Rows listed per error group
+SAMPLE_ROWS = 5
+
+
+class UploadTooLarge(Exception):
+    """The upload passed ``settings.max_upload_mb`` while it was being read."""
+
+
+class ErrorReport:
+    """The errors of one import, bounded however many rows are bad.
+
+    The first ``limit`` errors are kept in full; every error is also counted in a group
+    per file, code and column holding a few sample rows. ``full`` tells the caller to stop
+    reading, as the import cannot succeed and the report can hold no more.
+    """
 
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.count = 0
+        self.messages: list[str] = []
+        self._groups: dict[tuple[str | None, str, str | None], ImportErrorGroup] = {}
 
-def parse_and_import(
-    db: Session, user_id: int, filename: str, content: bytes
-) -> tuple[int, list[str]]:
+    @property
+    def full(self) -> bool:
+        return bool(self.limit) and self.count >= self.limit
+
+    def extend(self, errors: Iterable[RowError]) -> None:
+        for error in errors:
+            if self.full:
+                return
+            self.count += 1
+            self.messages.append(str(error))
+            key = (error.file, error.code, error.column)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = ImportErrorGroup(
+                    file=error.file, code=error.code, column=error.column, count=0, rows=[],
+                    example=str(error),
+                )
+            group.count += 1
+            if error.row is not None and len(group.rows) < SAMPLE_ROWS:
+                group.rows.append(error.row)
+
+    def result(self) -> ImportResult:
+        messages = self.messages
+        if self.full:
+            messages = [*messages, f"Import stopped after {self.limit} errors"]
+        return ImportResult(
+            imported=0,
+            errors=messages,
+            error_count=self.count,
+            error_groups=sorted(self._groups.values(), key=lambda g: -g.count),
+        )
+
+
+def parse_file(
+    filename: str, content: bytes, max_rows: int = 0, max_errors: int = 0
+) -> tuple[list[ParsedTransaction], list[RowError]]:
+    # One payload for detection and parsing, so the file is decoded or opened once
+    payload = Payload(filename, content, max_rows, max_errors)
     for parser_cls in PARSERS:
-        if parser_cls.can_handle(filename, content):
-            transactions, errors = parser_cls.parse(filename, content)
-            if errors:
-                return 0, errors
-
-            for txn in transactions:
-                db.add(
-                    StockTransaction(
-                        user_id=user_id,
-                        date=txn.date,
-                        time=txn.time,
-                        action=Action(txn.action),
-                        ticker=txn.ticker,
-                        quantity=txn.quantity,
-                        price=txn.price,
-                        value=txn.value,
-                        fee=txn.fee,
-                        contract_note=txn.contract_note,
+        if parser_cls.can_handle(payload):
+            return parser_cls.parse(payload)
+    return [], [RowError("Unrecognised file format", "unrecognised_format")]
+
+
+def is_gzip(filename: str) -> bool:
+    return filename.lower().endswith(".gz")
+
+
+def is_archive(filename: str) -> bool:
+    # By name, as an xlsx workbook is a zip archive too
+    return filename.lower().endswith(".zip")
+
+
+def _is_member(info: zipfile.ZipInfo) -> bool:
+    path = PurePosixPath(info.filename)
+    return not info.is_dir() and path.parts[0] != "__MACOSX" and not path.name.startswith(".")
+
+
+def unzip(content: bytes, max_bytes: int) -> list[tuple[str, bytes]]:
+    """The files in a zip archive, as ``(name, content)`` in archive order.
+
+    Raises ``UploadTooLarge`` if they unpack to more than ``max_bytes`` in total,
+    before any is read, and ``zipfile.BadZipFile`` if ``content`` is not an archive.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        members = [info for info in archive.infolist() if _is_member(info)]
+        if sum(info.file_size for info in members) > max_bytes:
+            raise UploadTooLarge
+        return [(info.filename, archive.read(info)) for info in members]
+
+
+def pack(files: list[tuple[str, bytes]]) -> bytes:
+    """Several uploaded files as one zip archive, to be stored as a single upload."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+    return buf.getvalue()
+
+
+def read_archive(content: bytes) -> tuple[list[tuple[str, bytes]], list[RowError]]:
+    """``unzip`` under the upload limit, with an unreadable or empty archive as errors."""
+    try:
+        files = unzip(content, settings.max_upload_mb * 1024 * 1024)
+    except zipfile.BadZipFile:
+        return [], [RowError("Not a valid zip archive", "bad_archive")]
+    if not files:
+        return [], [RowError("Archive holds no files", "empty")]
+    return files, []
+
+
+def file_errors(filename: str, errors: list[RowError]) -> list[RowError]:
+    """``errors`` marked with the file they came from, in an upload of several files."""
+    return [replace(error, file=filename) for error in errors]
+
+
+def streaming_parser(filename: str, head: bytes) -> type[StreamingParser] | None:
+    """The streaming parser for a file opening with ``head``, if one recognises it."""
+    payload = Payload(filename, head)
+    for parser_cls in PARSERS:
+        if is_streaming(parser_cls) and parser_cls.can_handle(payload):
+            return parser_cls
+    return None
+
+
+def parse_block(
+    parser_cls: type[StreamingParser],
+    header: bytes,
+    block: bytes,
+    first_row: int,
+    max_errors: int = 0,
+) -> ParsedBatch:
+    batches = parser_cls.parse_stream(io.BytesIO(header + block), first_row)
+    return merge(capped(batches, 0, max_errors))
+
+
+def _chunks(rows: list[dict], size: int) -> Iterator[list[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class ImportWriter:
+    """Store an import batch by batch inside one transaction.
+
+    Each clean batch is inserted with Core executemany in ``import_chunk_size`` chunks,
+    so no ORM objects are built. Rows whose fingerprint the user already has are
+    skipped, found with one ``IN`` lookup per chunk. Once any batch has errors nothing
+    more is inserted and ``commit`` rolls the lot back, so an import stores every row
+    or none. Errors go to an ``ErrorReport``; the caller stops reading once it is full.
+    """
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        self.imported = 0
+        self.skipped = 0
+        self.report = ErrorReport(settings.import_max_errors)
+        self._first_dates: dict[str, date] = {}
+        self._occurrences: Counter[str] = Counter()
+        self._elapsed = 0.0
+
+    def next_file(self) -> None:
+        """Start the next file of a multi-file upload.
+
+        Identical rows are told apart only within a file, so a row repeated in another
+        file of the upload is skipped just as if that file were imported on its own.
+        """
+        self._occurrences.clear()
+
+    def _fingerprint(self, txn: ParsedTransaction) -> str:
+        first = fingerprint(txn)
+        occurrence = self._occurrences[first]
+        self._occurrences[first] += 1
+        return fingerprint(txn, occurrence) if occurrence else first
+
+    def write(
+        self,
+        db: Session,
+        transactions: list[ParsedTransaction],
+        errors: Iterable[RowError] = (),
+    ) -> None:
+        if rows := self.prepare(transactions, errors):
+            self.insert(db, rows)
+
+    def prepare(
+        self, transactions: list[ParsedTransaction], errors: Iterable[RowError] = ()
+    ) -> list[dict]:
+        """Record ``errors`` and build the insert rows; none once there are errors.
+
+        Needs no session, so the async import builds rows off the event loop.
+        """
+        self.report.extend(errors)
+        if self.report.count or not transactions:
+            return []
+
+        started = time.perf_counter()
+        rows = [
+            {
+                "date": txn.date,
+                "time": txn.time,
+                "action": Action(txn.action),
+                "ticker": txn.ticker,
+                "quantity": txn.quantity,
+                "price": txn.price,
+                "value": txn.value,
+                "fee": txn.fee,
+                "contract_note": txn.contract_note,
+                "fingerprint": self._fingerprint(txn),
+            }
+            for txn in transactions
+        ]
+        self._elapsed += time.perf_counter() - started
+        return rows
+
+    def insert(self, db: Session, rows: list[dict]) -> None:
+        started = time.perf_counter()
+        stmt = insert(StockTransaction).values(user_id=self.user_id)
+        try:
+            for chunk in _chunks(rows, settings.import_chunk_size):
+                present = set(
+                    db.scalars(
+                        select(StockTransaction.fingerprint).where(
+                            StockTransaction.user_id == self.user_id,
+                            StockTransaction.fingerprint.in_([r["fingerprint"] for r in chunk]),
+                        )
                     )
                 )
+                new = []
+                # A row repeated in another file of the upload can share a chunk with
+                # its first occurrence
+                for r in chunk:
+                    if r["fingerprint"] not in present:
+                        present.add(r["fingerprint"])
+                        new.append(r)
+                if new:
+                    db.execute(stmt, new)
+                self.skipped += len(chunk) - len(new)
+                self.imported += len(new)
+                for row in new:
+                    ticker = row["ticker"].upper()
+                    self._first_dates[ticker] = min(
+                        self._first_dates.get(ticker, row["date"]), row["date"]
+                    )
+        except Exception:
+            db.rollback()
+            raise
+        self._elapsed += time.perf_counter() - started
+
+    def store(self, db: Session, rows: list[dict]) -> ImportResult:
+        """Insert rows built up front by ``prepare`` and commit them in one transaction."""
+        if rows and not self.report.count:
+            self.insert(db, rows)
+        return self.commit(db)
+
+    def commit(self, db: Session) -> ImportResult:
+        """Commit the import, or roll it back if there were errors.
+
+        The CGT cache is only marked stale, like any other write; the next read
+        replays it.
+        """
+        if self.report.count:
+            db.rollback()
+            return self.report.result()
+        if not self.imported:
+            return ImportResult(imported=0, skipped=self.skipped, errors=[])
+
+        started = time.perf_counter()
+        try:
+            for ticker, first_date in self._first_dates.items():
+                cgt_service.invalidate(db, self.user_id, ticker, first_date)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        elapsed = self._elapsed + time.perf_counter() - started
+        return ImportResult(
+            imported=self.imported,
+            skipped=self.skipped,
+            errors=[],
+            rows_per_second=round((self.imported + self.skipped) / elapsed, 1)
+            if elapsed
+            else None,
+        )
+
+
+def store_transactions(
+    db: Session, user_id: int, transactions: list[ParsedTransaction]
+) -> ImportResult:
+    writer = ImportWriter(user_id)
+    writer.write(db, transactions)
+    return writer.commit(db)
+
+
+def failed(errors: list[RowError]) -> ImportResult:
+    """The result of an import that fails before any file is parsed."""
+    report = ErrorReport(settings.import_max_errors)
+    report.extend(errors)
+    return report.result()
+
 
-            if transactions:
-                db.commit()
-            return len(transactions), errors
+def parse_and_import(db: Session, user_id: int, filename: str, content: bytes) -> ImportResult:
+    transactions, errors = parse_file(
+        filename, content, settings.import_max_rows, settings.import_max_errors
+    )
+    writer = ImportWriter(user_id)
+    writer.write(db, transactions, errors)
+    return writer.commit(db)
 
-    return 0, ["Unrecognised file format"]
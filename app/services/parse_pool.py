@@ -0,0 +1,134 @@
+"""Parse uploads in a bounded worker process pool, off the event loop.
+
+Calamine and the Decimal conversions are CPU-bound and hold the GIL, so a thread only
+moves the stall; a process does not. At most ``settings.import_workers`` files parse at
+once and up to ``settings.import_queue`` more wait for a slot. Beyond that ``PoolBusy``
+is raised so the caller can shed load. Only a file, or a block of CSV records, goes to
+a worker and only the parsed transactions and errors come back. A worker that dies
+breaks the whole pool: the parses it was running raise ``PoolBroken`` and the next one
+starts a new pool. ``import_workers = 0`` parses in the threadpool instead.
+"""
+
+import asyncio
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services import import_service
+from app.services.parsers import ParsedBatch, ParsedTransaction, RowError, StreamingParser
+
+T = TypeVar("T")
+
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_waiting = 0
+
+
+class PoolBusy(Exception):
+    """Every worker is busy and the wait queue is full."""
+
+
+class PoolBroken(Exception):
+    """A worker process died, taking the parse with it."""
+
+
+def start() -> None:
+    """Reset the slots for a new event loop; workers are spawned on first use."""
+    global _slots, _waiting
+    _slots = asyncio.Semaphore(max(settings.import_workers, 1))
+    _waiting = 0
+
+
+def shutdown() -> None:
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+    _slots = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Forking a process that runs threads (the threadpool, the DB pool) is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.import_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _discard(executor: ProcessPoolExecutor) -> None:
+    """Drop a broken executor so the next parse spawns a new one."""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run(fn: Callable[..., T], *args: Any, reject: bool = True) -> T:
+    global _waiting
+    if settings.import_workers <= 0:
+        return await run_in_threadpool(fn, *args)
+    if _slots is None:
+        start()
+
+    if reject and _slots.locked() and _waiting >= settings.import_queue:
+        raise PoolBusy
+    _waiting += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _waiting -= 1
+
+    executor = _get_executor()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        _discard(executor)
+        raise PoolBroken from None
+    finally:
+        _slots.release()
+
+
+async def parse_file(
+    filename: str, content: bytes, reject: bool = True
+) -> tuple[list[ParsedTransaction], list[RowError]]:
+    # The caps are read here, as spawned workers do not see settings changed at runtime
+    return await _run(
+        import_service.parse_file,
+        filename,
+        content,
+        settings.import_max_rows,
+        settings.import_max_errors,
+        reject=reject,
+    )
+
+
+async def parse_block(
+    parser_cls: type[StreamingParser],
+    header: bytes,
+    block: bytes,
+    first_row: int,
+    reject: bool = True,
+) -> ParsedBatch:
+    """Parse one ``CsvBlocks`` block; ``reject=False`` waits however long the queue.
+
+    An import already under way passes ``reject=False`` for its later blocks, so it is
+    never abandoned half read.
+    """
+    return await _run(
+        import_service.parse_block,
+        parser_cls,
+        header,
+        block,
+        first_row,
+        settings.import_max_errors,
+        reject=reject,
+    )
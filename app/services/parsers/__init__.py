@@ -1,7 +1,16 @@
-from dataclasses import dataclass
+import csv
+import io
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
 from datetime import date, time
 from decimal import Decimal
-from typing import Protocol
+from functools import cached_property
+from typing import BinaryIO, Protocol
+
+from python_calamine import CalamineSheet, CalamineWorkbook
+
+# Rows a streaming parser hands back at a time
+BATCH_ROWS = 1000
 
 
 @dataclass
@@ -17,12 +26,106 @@ class ParsedTransaction:
     contract_note: str | None = None
 
 
+@dataclass(frozen=True)
+class RowError:
+    """A problem with one cell or row, or with the whole file when ``row`` is None.
+
+    ``code`` names the kind of problem (``invalid``, ``missing_columns``, ...) so
+    errors can be grouped; ``str()`` gives the message shown to the user, prefixed
+    with ``file`` for an upload of several files.
+    """
+
+    message: str
+    code: str
+    row: int | None = None
+    column: str | None = None
+    # Set when the upload held several files
+    file: str | None = None
+
+    def __str__(self) -> str:
+        text = self.message if self.row is None else f"Row {self.row}: {self.message}"
+        return text if self.file is None else f"{self.file}: {text}"
+
+
+@dataclass
+class ParsedBatch:
+    transactions: list[ParsedTransaction] = field(default_factory=list)
+    errors: list[RowError] = field(default_factory=list)
+    rows: int = 0  # data rows read, valid or not
+
+
+class Payload:
+    """An upload as the parsers see it, decoded or opened at most once.
+
+    Each view is built on first use and cached, so detection across every parser reads
+    only a header line or the first few sheet rows, and the parser that claims the file
+    carries on from the same view rather than opening it again.
+    """
+
+    def __init__(
+        self, filename: str, content: bytes, max_rows: int = 0, max_errors: int = 0
+    ) -> None:
+        self.filename = filename
+        self.content = content
+        # Data rows to read, and errors to find, before giving up on the file (0 = no limit)
+        self.max_rows = max_rows
+        self.max_errors = max_errors
+        self._sheet_head: list[list] = []
+
+    @cached_property
+    def first_line(self) -> str | None:
+        """The first line, decoded; None if not UTF-8."""
+        end = self.content.find(b"\n")
+        # Sliced, not split, so a large upload is not copied to read its header
+        line = self.content if end < 0 else self.content[:end]
+        try:
+            return line.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            return None
+
+    @cached_property
+    def csv_header(self) -> list[str] | None:
+        """The first line as a CSV record; None if empty or not UTF-8."""
+        if self.first_line is None:
+            return None
+        return next(csv.reader([self.first_line]), None)
+
+    @cached_property
+    def sheet(self) -> CalamineSheet | None:
+        """The first worksheet, or None if this is not a spreadsheet."""
+        try:
+            workbook = CalamineWorkbook.from_filelike(io.BytesIO(self.content))
+            return workbook.get_sheet_by_index(0)
+        except Exception:
+            return None
+
+    def sheet_head(self, nrows: int) -> list[list]:
+        """The first ``nrows`` rows of ``sheet``, converted without reading the rest."""
+        if len(self._sheet_head) < nrows and self.sheet is not None:
+            self._sheet_head = self.sheet.to_python(nrows=nrows)
+        return self._sheet_head[:nrows]
+
+
 class Parser(Protocol):
     @staticmethod
-    def can_handle(filename: str, content: bytes) -> bool: ...
+    def can_handle(payload: Payload) -> bool: ...
+
+    @staticmethod
+    def parse(payload: Payload) -> tuple[list[ParsedTransaction], list[RowError]]: ...
+
+
+class StreamingParser(Parser, Protocol):
+    """A CSV parser that can read a file incrementally.
+
+    ``can_handle`` only needs a payload of the file's opening bytes, and
+    ``parse_stream`` decodes the stream as it goes, yielding a batch every
+    ``BATCH_ROWS`` rows. ``first_row`` is the file row number of the record after
+    the header, for error messages; blank records keep a number but are not parsed.
+    A format that is not cut like CSV names its ``CsvBlocks`` subclass as ``blocks``.
+    """
 
     @staticmethod
-    def parse(filename: str, content: bytes) -> tuple[list[ParsedTransaction], list[str]]: ...
+    def parse_stream(stream: BinaryIO, first_row: int = 2) -> Iterator[ParsedBatch]: ...
 
 
 PARSERS: list[type[Parser]] = []
@@ -31,3 +134,42 @@ PARSERS: list[type[Parser]] = []
 def register(cls: type[Parser]) -> type[Parser]:
     PARSERS.append(cls)
     return cls
+
+
+def is_streaming(parser_cls: type[Parser]) -> bool:
+    return hasattr(parser_cls, "parse_stream")
+
+
+def merge(batches: Iterable[ParsedBatch]) -> ParsedBatch:
+    merged = ParsedBatch()
+    for batch in batches:
+        merged.transactions.extend(batch.transactions)
+        merged.errors.extend(batch.errors)
+        merged.rows += batch.rows
+    return merged
+
+
+def capped(
+    batches: Iterable[ParsedBatch], max_rows: int, max_errors: int = 0
+) -> Iterator[ParsedBatch]:
+    """``batches`` until more than ``max_rows`` data rows are read or ``max_errors``
+    errors found (0 = no limit).
+
+    The batch that passes the row cap is replaced by an error. In either case
+    ``batches`` is not read any further, so a file is abandoned as soon as it is known
+    to fail rather than parsed whole.
+    """
+    seen = errors = 0
+    for batch in batches:
+        seen += batch.rows
+        if max_rows and seen > max_rows:
+            yield ParsedBatch(errors=[too_many_rows(max_rows)])
+            return
+        yield batch
+        errors += len(batch.errors)
+        if max_errors and errors >= max_errors:
+            return
+
+
+def too_many_rows(max_rows: int) -> RowError:
+    return RowError(f"File has more than {max_rows} data rows", "too_many_rows")
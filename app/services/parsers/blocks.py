@@ -0,0 +1,141 @@
+"""Cut a CSV byte stream into blocks of whole records.
+
+A newline ends a record only outside quotes. As in the ``csv`` module, a quote opens a
+quoted field only at the start of a field; anywhere else it is a literal character.
+Inside a quoted field a doubled quote is an escaped one, and a single quote closes the
+field. The stream is scanned once: the scan state is kept across ``feed`` calls so
+only new bytes are looked at, and each block comes with the file row number of its
+first record, so blocks can be parsed in any order. The header record is kept apart so
+every block can be parsed on its own as ``header + block``.
+
+A record that is still open after ``MAX_RECORD`` bytes, such as one after an unclosed
+quote, stops the cut with ``RecordTooLong`` rather than holding the rest of the upload.
+
+``LineBlocks`` cuts a headerless stream with one record per line, such as NDJSON.
+"""
+
+from app.services.parsers import RowError
+
+# Longest record held while waiting for its end; a few upload reads
+MAX_RECORD = 4 * 1024 * 1024
+
+# (records ended, offset past the last record end or 0, offset scanned to, in quotes)
+Scan = tuple[int, int, int, bool]
+
+
+class RecordTooLong(Exception):
+    def __init__(self, row: int) -> None:
+        self.error = RowError(
+            f"record is longer than {MAX_RECORD // (1024 * 1024)} MB; "
+            "check for an unclosed quote",
+            "record_too_long",
+            row,
+        )
+        super().__init__(str(self.error))
+
+
+def scan_records(
+    data: bytes, pos: int = 0, quoted: bool = False, final: bool = True, first: bool = False
+) -> Scan:
+    """Scan ``data``, which starts at a record, from ``pos`` for record-ending newlines.
+
+    ``quoted`` is the state at ``pos``. A quote at the very end of an unfinished stream
+    (not ``final``) may be the first of an escaped pair, so the scan stops before it.
+    With ``first`` the scan stops at the first record end.
+    """
+    records = end = 0
+    size = len(data)
+    while pos < size:
+        if quoted:
+            q = data.find(b'"', pos)
+            if q < 0:
+                return records, end, size, True
+            if q + 1 == size and not final:
+                return records, end, q, True
+            if data[q + 1:q + 2] == b'"':
+                pos = q + 2
+            else:
+                quoted, pos = False, q + 1
+            continue
+        # The next quote that opens a field; others are literal
+        q = data.find(b'"', pos)
+        while q > 0 and data[q - 1] not in b",\n":
+            q = data.find(b'"', q + 1)
+        stop = size if q < 0 else q
+        if first:
+            newline = data.find(b"\n", pos, stop)
+            if newline >= 0:
+                return 1, newline + 1, newline + 1, False
+        elif ended := data.count(b"\n", pos, stop):
+            records += ended
+            end = data.rfind(b"\n", pos, stop) + 1
+        if q < 0:
+            return records, end, size, False
+        quoted, pos = True, q + 1
+    return records, end, pos, quoted
+
+
+class CsvBlocks:
+    # File row number of the first record after the header
+    FIRST_ROW = 2
+
+    def __init__(self) -> None:
+        self.header: bytes | None = None
+        self._tail = b""
+        self._scanned = 0
+        self._quoted = False
+        self._row = self.FIRST_ROW
+
+    @staticmethod
+    def _scan(data: bytes, pos: int, quoted: bool, first: bool = False) -> Scan:
+        return scan_records(data, pos, quoted, final=False, first=first)
+
+    def feed(self, chunk: bytes) -> tuple[bytes, int] | None:
+        """Add ``chunk``; return the records it completes, if any, with their first row."""
+        self._tail += chunk
+        if self.header is None:
+            _, end, self._scanned, self._quoted = self._scan(
+                self._tail, self._scanned, self._quoted, first=True
+            )
+            if not end:
+                self._check(1)
+                return None
+            self.header, self._tail = self._tail[:end], self._tail[end:]
+            self._scanned -= end
+        records, end, self._scanned, self._quoted = self._scan(
+            self._tail, self._scanned, self._quoted
+        )
+        if not end:
+            self._check(self._row)
+            return None
+        block, self._tail = self._tail[:end], self._tail[end:]
+        self._scanned -= end
+        row, self._row = self._row, self._row + records
+        return block, row
+
+    def _check(self, row: int) -> None:
+        if len(self._tail) > MAX_RECORD:
+            raise RecordTooLong(row)
+
+    def close(self) -> tuple[bytes, int] | None:
+        """The final record when the stream does not end in a newline."""
+        data, self._tail = self._tail, b""
+        if self.header is None:
+            self.header, data = data, b""
+        return (data, self._row) if data else None
+
+
+class LineBlocks(CsvBlocks):
+    """Blocks of a stream with no header and no newlines inside a record."""
+
+    FIRST_ROW = 1
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.header = b""
+
+    @staticmethod
+    def _scan(data: bytes, pos: int, quoted: bool, first: bool = False) -> Scan:
+        records = data.count(b"\n", pos)
+        end = data.rfind(b"\n", pos) + 1 if records else 0
+        return records, end, len(data), False
@@ -0,0 +1,189 @@
+"""Declarative column specs, compiled once per header into a single-pass row converter.
+
+A parser describes each ``ParsedTransaction`` field as a ``Column``: the header it is
+read from and a converter that both validates and converts the cell. ``RowSpec.compile``
+resolves the headers to positions once per header layout, and the resulting
+``RowConverter`` turns each row into a transaction, or into its errors, in one pass.
+
+A converter signals a bad cell by raising. ``CellError`` carries its own wording
+("quantity must be positive") and error code; anything else reads as
+"invalid <column> '<cell>'" with code ``invalid``.
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from app.services.parsers import ParsedTransaction, RowError
+
+# Header layouts a ``RowSpec`` keeps compiled; uploads can bring any number of them
+MAX_COMPILED = 16
+
+
+class CellError(ValueError):
+    """A cell that fails validation; the message follows the column name."""
+
+    def __init__(self, message: str, code: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+def to_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def to_time(value: Any) -> time:
+    if isinstance(value, time):
+        return value
+    return time.fromisoformat(value)
+
+
+def to_date_time(value: Any) -> tuple[date, time]:
+    """``YYYY-MM-DD`` or ``YYYY-MM-DDTHH:MM:SS``, midnight when no time is given."""
+    if isinstance(value, datetime):
+        return value.date(), value.time()
+    date_str, _, time_str = str(value).partition("T")
+    return date.fromisoformat(date_str), time.fromisoformat(time_str or "00:00:00")
+
+
+def to_action(value: Any) -> str:
+    action = str(value).lower()
+    if action not in ("buy", "sell"):
+        raise CellError(f"must be 'buy' or 'sell', got '{value}'", "unknown_action")
+    return action
+
+
+def to_ticker(value: Any) -> str:
+    if not value:
+        raise CellError("is required", "required")
+    return str(value).upper()
+
+
+def to_positive_int(value: Any) -> int:
+    quantity = int(value)
+    if quantity <= 0:
+        raise CellError("must be positive", "not_positive")
+    return quantity
+
+
+def to_abs_int(value: Any) -> int:
+    """Whole units ignoring sign, as brokers report sells as negative quantities."""
+    return abs(int(float(value)))
+
+
+def to_decimal(value: Any) -> Decimal:
+    # str() first so spreadsheet floats convert as displayed
+    return Decimal(str(value))
+
+
+def to_abs_decimal(value: Any) -> Decimal:
+    return abs(to_decimal(value))
+
+
+def to_text(value: Any) -> str:
+    return str(value)
+
+
+@dataclass(frozen=True)
+class Column:
+    """``fields`` of ``ParsedTransaction`` read from header ``source``.
+
+    A converter returning a tuple fills several fields. An optional column that is
+    absent, or a blank cell in one, leaves its fields None.
+    """
+
+    fields: str | tuple[str, ...]
+    source: str
+    convert: Callable[[Any], Any] = to_text
+    required: bool = True
+
+
+class RowConverter:
+    """A ``RowSpec`` bound to one header layout."""
+
+    def __init__(self, spec: "RowSpec", header: Sequence[Any]) -> None:
+        index: dict[str, int] = {}
+        for i, name in enumerate(header):
+            index.setdefault(spec.normalise(str(name)), i)
+        self.index = index
+        self.missing = [c.source for c in spec.columns if c.required and c.source not in index]
+        self._plan = [
+            (index.get(c.source), c.source, c.convert, c.required,
+             c.fields if isinstance(c.fields, tuple) else None,
+             c.fields if isinstance(c.fields, str) else None)
+            for c in spec.columns
+        ]
+        self._constants = spec.constants
+        self._derive = spec.derive
+
+    def __call__(
+        self, row: Sequence[Any], row_num: int
+    ) -> tuple[ParsedTransaction | None, list[RowError]]:
+        values = dict(self._constants)
+        errors: list[RowError] = []
+        width = len(row)
+        for idx, source, convert, required, many, one in self._plan:
+            raw = row[idx] if idx is not None and idx < width else None
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw is None or raw == "":
+                if not required:
+                    for name in many or (one,):
+                        values[name] = None
+                    continue
+                raw = ""
+            try:
+                converted = convert(raw)
+            except CellError as e:
+                errors.append(RowError(f"{source} {e}", e.code, row_num, source))
+                continue
+            except (ValueError, ArithmeticError, TypeError):
+                errors.append(RowError(f"invalid {source} '{raw}'", "invalid", row_num, source))
+                continue
+            if many:
+                values.update(zip(many, converted))
+            else:
+                values[one] = converted
+        if errors:
+            return None, errors
+        if self._derive:
+            self._derive(values)
+        return ParsedTransaction(**values), []
+
+
+class RowSpec:
+    """The columns of one import format.
+
+    ``normalise`` is applied to header cells before they are matched against each
+    ``Column.source``. ``constants`` fill fields no column provides, and ``derive``
+    completes the field dict from the converted values (e.g. value = price * qty).
+    """
+
+    def __init__(
+        self,
+        columns: list[Column],
+        normalise: Callable[[str], str] = str.strip,
+        constants: dict[str, Any] | None = None,
+        derive: Callable[[dict[str, Any]], None] | None = None,
+    ) -> None:
+        self.columns = columns
+        self.normalise = normalise
+        self.constants = constants or {}
+        self.derive = derive
+        self._compiled: dict[tuple, RowConverter] = {}
+
+    def compile(self, header: Sequence[Any]) -> RowConverter:
+        key = tuple(header)
+        converter = self._compiled.get(key)
+        if converter is None:
+            if len(self._compiled) >= MAX_COMPILED:
+                # Dicts keep insertion order, so this drops the oldest layout
+                del self._compiled[next(iter(self._compiled))]
+            converter = self._compiled[key] = RowConverter(self, header)
+        return converter
@@ -1,101 +1,95 @@
 import csv
 import io
-from datetime import date, time
-from decimal import Decimal, InvalidOperation
-
-from app.services.parsers import ParsedTransaction, register
-
-EXPECTED_HEADERS = [
-    "date", "time", "action", "ticker", "quantity", "price", "value", "fee", "contract_note"
-]
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from app.services.parsers import (
+    BATCH_ROWS,
+    ParsedBatch,
+    ParsedTransaction,
+    Payload,
+    RowError,
+    capped,
+    merge,
+    register,
+)
+from app.services.parsers.columns import (
+    Column,
+    RowSpec,
+    to_action,
+    to_date,
+    to_decimal,
+    to_positive_int,
+    to_ticker,
+    to_time,
+)
+
+COLUMNS = RowSpec(
+    [
+        Column("date", "date", to_date),
+        Column("time", "time", to_time),
+        Column("action", "action", to_action),
+        Column("ticker", "ticker", to_ticker),
+        Column("quantity", "quantity", to_positive_int),
+        Column("price", "price", to_decimal),
+        Column("value", "value", to_decimal),
+        Column("fee", "fee", to_decimal),
+        Column("contract_note", "contract_note", required=False),
+    ],
+    normalise=lambda h: h.strip().lower(),
+)
 
 
 @register
 class NativeParser:
     @staticmethod
-    def can_handle(filename: str, content: bytes) -> bool:
-        try:
-            text = content.decode("utf-8-sig")
-        except UnicodeDecodeError:
-            return False
-        reader = csv.reader(io.StringIO(text))
-        try:
-            header = next(reader)
-        except StopIteration:
-            return False
-        normalised = [h.strip().lower() for h in header]
-        required = {"date", "time", "action", "ticker", "quantity", "price", "value", "fee"}
-        return required <= set(normalised)
+    def can_handle(payload: Payload) -> bool:
+        header = payload.csv_header
+        return header is not None and not COLUMNS.compile(header).missing
 
     @staticmethod
-    def parse(filename: str, content: bytes) -> tuple[list[ParsedTransaction], list[str]]:
-        text = content.decode("utf-8-sig")
-        reader = csv.DictReader(io.StringIO(text))
-        if reader.fieldnames is None:
-            return [], ["Empty or invalid CSV file"]
-
-        normalised = [h.strip().lower() for h in reader.fieldnames]
-        missing = set(EXPECTED_HEADERS) - {"contract_note"} - set(normalised)
-        if missing:
-            return [], [f"Missing required columns: {', '.join(sorted(missing))}"]
-
-        transactions: list[ParsedTransaction] = []
-        errors: list[str] = []
-        for row_num, row in enumerate(reader, start=2):
-            row = {k.strip().lower(): v.strip() for k, v in row.items()}
-            row_errors = _validate_row(row, row_num)
-            if row_errors:
-                errors.extend(row_errors)
-                continue
-
-            txn = ParsedTransaction(
-                date=date.fromisoformat(row["date"]),
-                time=time.fromisoformat(row["time"]),
-                action=row["action"].lower(),
-                ticker=row["ticker"].upper(),
-                quantity=int(row["quantity"]),
-                price=Decimal(row["price"]),
-                value=Decimal(row["value"]),
-                fee=Decimal(row["fee"]),
-                contract_note=row.get("contract_note") or None,
-            )
-            transactions.append(txn)
-
-        return transactions, errors
-
-
-def _validate_row(row: dict, row_num: int) -> list[str]:
-    errors: list[str] = []
-    prefix = f"Row {row_num}"
+    def parse(payload: Payload) -> tuple[list[ParsedTransaction], list[RowError]]:
+        batches = NativeParser.parse_stream(io.BytesIO(payload.content))
+        batch = merge(capped(batches, payload.max_rows, payload.max_errors))
+        return batch.transactions, batch.errors
 
-    try:
-        date.fromisoformat(row.get("date", ""))
-    except ValueError:
-        errors.append(f"{prefix}: invalid date '{row.get('date', '')}'")
-
-    try:
-        time.fromisoformat(row.get("time", ""))
-    except ValueError:
-        errors.append(f"{prefix}: invalid time '{row.get('time', '')}'")
-
-    action_val = row.get("action", "").lower()
-    if action_val not in ("buy", "sell"):
-        errors.append(f"{prefix}: action must be 'buy' or 'sell', got '{row.get('action', '')}'")
-
-    if not row.get("ticker", "").strip():
-        errors.append(f"{prefix}: ticker is required")
-
-    try:
-        q = int(row.get("quantity", ""))
-        if q <= 0:
-            errors.append(f"{prefix}: quantity must be positive")
-    except ValueError:
-        errors.append(f"{prefix}: invalid quantity '{row.get('quantity', '')}'")
-
-    for field in ("price", "value", "fee"):
+    @staticmethod
+    def parse_stream(stream: BinaryIO, first_row: int = 2) -> Iterator[ParsedBatch]:
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
         try:
-            Decimal(row.get(field, ""))
-        except InvalidOperation:
-            errors.append(f"{prefix}: invalid {field} '{row.get(field, '')}'")
-
-    return errors
+            header = next(reader, None)
+        except UnicodeDecodeError:
+            yield ParsedBatch(errors=[RowError("File is not valid UTF-8", "not_utf8")])
+            return
+        if header is None:
+            yield ParsedBatch(errors=[RowError("Empty or invalid CSV file", "empty")])
+            return
+
+        convert = COLUMNS.compile(header)
+        if convert.missing:
+            missing = ", ".join(sorted(convert.missing))
+            error = RowError(f"Missing required columns: {missing}", "missing_columns")
+            yield ParsedBatch(errors=[error])
+            return
+
+        batch = ParsedBatch()
+        row_num = first_row - 1
+        try:
+            for row in reader:
+                # Blank lines hold no data but keep their row number
+                row_num += 1
+                if not row:
+                    continue
+                batch.rows += 1
+                txn, row_errors = convert(row, row_num)
+                if row_errors:
+                    batch.errors.extend(row_errors)
+                else:
+                    batch.transactions.append(txn)
+                if batch.rows == BATCH_ROWS:
+                    yield batch
+                    batch = ParsedBatch()
+        except UnicodeDecodeError:
+            # Decoding runs ahead of the rows read, so there is no row to point at
+            batch.errors.append(RowError("File is not valid UTF-8", "not_utf8"))
+        yield batch
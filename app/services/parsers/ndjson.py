@@ -0,0 +1,72 @@
+"""Finagle's NDJSON export: one transaction object per line.
+
+The objects hold the native CSV columns, so rows go through the native column spec
+and an export imports back exactly as it was written.
+"""
+
+import io
+import json
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from app.services.parsers import (
+    BATCH_ROWS,
+    ParsedBatch,
+    ParsedTransaction,
+    Payload,
+    RowError,
+    capped,
+    merge,
+    register,
+)
+from app.services.parsers.blocks import LineBlocks
+from app.services.parsers.native import COLUMNS
+
+FIELDS = [column.source for column in COLUMNS.columns]
+
+
+@register
+class NdjsonParser:
+    blocks = LineBlocks
+
+    @staticmethod
+    def can_handle(payload: Payload) -> bool:
+        if not payload.filename.lower().endswith((".ndjson", ".jsonl")):
+            return False
+        return payload.first_line is not None and payload.first_line.lstrip().startswith("{")
+
+    @staticmethod
+    def parse(payload: Payload) -> tuple[list[ParsedTransaction], list[RowError]]:
+        batches = NdjsonParser.parse_stream(io.BytesIO(payload.content))
+        batch = merge(capped(batches, payload.max_rows, payload.max_errors))
+        return batch.transactions, batch.errors
+
+    @staticmethod
+    def parse_stream(stream: BinaryIO, first_row: int = 1) -> Iterator[ParsedBatch]:
+        convert = COLUMNS.compile(FIELDS)
+        batch = ParsedBatch()
+        lines = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        try:
+            for row_num, line in enumerate(lines, start=first_row):
+                if not line.strip():
+                    continue
+                batch.rows += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict):
+                    batch.errors.append(RowError("not a JSON object", "invalid_json", row_num))
+                else:
+                    txn, row_errors = convert([record.get(f) for f in FIELDS], row_num)
+                    if row_errors:
+                        batch.errors.extend(row_errors)
+                    else:
+                        batch.transactions.append(txn)
+                if batch.rows == BATCH_ROWS:
+                    yield batch
+                    batch = ParsedBatch()
+        except UnicodeDecodeError:
+            # Decoding runs ahead of the rows read, so there is no row to point at
+            batch.errors.append(RowError("File is not valid UTF-8", "not_utf8"))
+        yield batch
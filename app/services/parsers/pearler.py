@@ -1,70 +1,94 @@
 import csv
 import io
-from datetime import date, time
-from decimal import Decimal
+from collections.abc import Iterator
+from typing import Any, BinaryIO
 
-from app.services.parsers import ParsedTransaction, register
+from app.services.parsers import (
+    BATCH_ROWS,
+    ParsedBatch,
+    ParsedTransaction,
+    Payload,
+    RowError,
+    capped,
+    merge,
+    register,
+)
+from app.services.parsers.columns import (
+    Column,
+    RowSpec,
+    to_abs_int,
+    to_action,
+    to_date_time,
+    to_decimal,
+    to_ticker,
+)
 
 EXPECTED_HEADERS = ["Symbol", "Exchange", "Trade Date", "Trade Type", "Quantity", "Price",
                     "Brokerage Fee"]
 
 
+def _value(fields: dict[str, Any]) -> None:
+    fields["value"] = fields["price"] * fields["quantity"]
+
+
+COLUMNS = RowSpec(
+    [
+        Column(("date", "time"), "Trade Date", to_date_time),
+        Column("action", "Trade Type", to_action),
+        Column("ticker", "Symbol", to_ticker),
+        Column("quantity", "Quantity", to_abs_int),
+        Column("price", "Price", to_decimal),
+        Column("fee", "Brokerage Fee", to_decimal),
+        Column("contract_note", "Reference", required=False),
+    ],
+    derive=_value,
+)
+
+
 @register
 class PearlerParser:
     @staticmethod
-    def can_handle(filename: str, content: bytes) -> bool:
-        if not filename.lower().endswith(".csv"):
+    def can_handle(payload: Payload) -> bool:
+        if not payload.filename.lower().endswith(".csv"):
             return False
-        try:
-            text = content.decode("utf-8-sig")
-        except UnicodeDecodeError:
-            return False
-        reader = csv.reader(io.StringIO(text))
-        try:
-            header = next(reader)
-        except StopIteration:
+        header = payload.csv_header
+        if header is None:
             return False
         normalised = [h.strip() for h in header[:7]]
         return normalised == EXPECTED_HEADERS
 
     @staticmethod
-    def parse(filename: str, content: bytes) -> tuple[list[ParsedTransaction], list[str]]:
-        text = content.decode("utf-8-sig")
-        reader = csv.DictReader(io.StringIO(text))
+    def parse(payload: Payload) -> tuple[list[ParsedTransaction], list[RowError]]:
+        batches = PearlerParser.parse_stream(io.BytesIO(payload.content))
+        batch = merge(capped(batches, payload.max_rows, payload.max_errors))
+        return batch.transactions, batch.errors
 
-        transactions: list[ParsedTransaction] = []
-        errors: list[str] = []
-
-        for row_num, row in enumerate(reader, start=2):
-            try:
-                trade_date_raw = row["Trade Date"].strip()
-                if "T" in trade_date_raw:
-                    date_str, time_str = trade_date_raw.split("T", 1)
+    @staticmethod
+    def parse_stream(stream: BinaryIO, first_row: int = 2) -> Iterator[ParsedBatch]:
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+        batch = ParsedBatch()
+        try:
+            header = next(reader, None)
+            if header is None:
+                yield batch
+                return
+            convert = COLUMNS.compile(header)
+            row_num = first_row - 1
+            for row in reader:
+                # Blank lines hold no data but keep their row number
+                row_num += 1
+                if not row:
+                    continue
+                batch.rows += 1
+                txn, row_errors = convert(row, row_num)
+                if row_errors:
+                    batch.errors.extend(row_errors)
                 else:
-                    date_str = trade_date_raw
-                    time_str = "00:00:00"
-
-                txn_date = date.fromisoformat(date_str)
-                txn_time = time.fromisoformat(time_str)
-                qty = abs(int(float(row["Quantity"].strip())))
-                price = Decimal(row["Price"].strip())
-                value = price * qty
-                fee = Decimal(row["Brokerage Fee"].strip())
-                reference = row.get("Reference", "").strip() or None
-
-                txn = ParsedTransaction(
-                    date=txn_date,
-                    time=txn_time,
-                    action=row["Trade Type"].strip().lower(),
-                    ticker=row["Symbol"].strip().upper(),
-                    quantity=qty,
-                    price=price,
-                    value=value,
-                    fee=fee,
-                    contract_note=reference,
-                )
-                transactions.append(txn)
-            except Exception as e:
-                errors.append(f"Row {row_num}: {e}")
-
-        return transactions, errors
+                    batch.transactions.append(txn)
+                if batch.rows == BATCH_ROWS:
+                    yield batch
+                    batch = ParsedBatch()
+        except UnicodeDecodeError:
+            # Decoding runs ahead of the rows read, so there is no row to point at
+            batch.errors.append(RowError("File is not valid UTF-8", "not_utf8"))
+        yield batch
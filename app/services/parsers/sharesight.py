@@ -1,83 +1,102 @@
-import io
-from datetime import date, time
-from decimal import Decimal
+from collections.abc import Iterator
+from datetime import time
+from itertools import islice
 
-from python_calamine import CalamineWorkbook
-
-from app.services.parsers import ParsedTransaction, register
+from app.services.parsers import (
+    BATCH_ROWS,
+    ParsedBatch,
+    ParsedTransaction,
+    Payload,
+    RowError,
+    capped,
+    merge,
+    register,
+)
+from app.services.parsers.columns import (
+    Column,
+    RowSpec,
+    to_abs_decimal,
+    to_abs_int,
+    to_action,
+    to_date,
+    to_decimal,
+    to_ticker,
+)
 
 EXPECTED_HEADERS = ["Code", "Market Code", "Name", "Date", "Type", "Qty"]
 
+COLUMNS = RowSpec(
+    [
+        Column("date", "Date", to_date),
+        Column("action", "Type", to_action),
+        Column("ticker", "Code", to_ticker),
+        Column("quantity", "Qty", to_abs_int),
+        Column("price", "Price", to_decimal),
+        Column("value", "Value", to_abs_decimal),
+        Column("fee", "Brokerage", to_decimal),
+    ],
+    constants={"time": time(0, 0, 0)},
+)
+
 
 @register
 class SharesightParser:
     @staticmethod
-    def can_handle(filename: str, content: bytes) -> bool:
-        if not filename.lower().endswith(".xlsx"):
+    def can_handle(payload: Payload) -> bool:
+        if not payload.filename.lower().endswith(".xlsx"):
             return False
-        try:
-            wb = CalamineWorkbook.from_filelike(io.BytesIO(content))
-            sheet = wb.get_sheet_by_index(0)
-            rows = sheet.to_python()
-            if not rows:
-                return False
-            # Check title row or header row
-            if "All Trades Report" in str(rows[0][0]):
-                return True
-            if len(rows) > 2:
-                header = [str(c).strip() for c in rows[2][:6]]
-                return header == EXPECTED_HEADERS
-        except Exception:
+        # Only the title and header rows are converted
+        rows = payload.sheet_head(3)
+        if not rows or not rows[0]:
             return False
+        # Check title row or header row
+        if "All Trades Report" in str(rows[0][0]):
+            return True
+        if len(rows) > 2:
+            header = [str(c).strip() for c in rows[2][:6]]
+            return header == EXPECTED_HEADERS
         return False
 
     @staticmethod
-    def parse(filename: str, content: bytes) -> tuple[list[ParsedTransaction], list[str]]:
-        wb = CalamineWorkbook.from_filelike(io.BytesIO(content))
-        sheet = wb.get_sheet_by_index(0)
-        rows = sheet.to_python()
+    def parse(payload: Payload) -> tuple[list[ParsedTransaction], list[RowError]]:
+        batch = merge(capped(
+            SharesightParser.iter_batches(payload), payload.max_rows, payload.max_errors
+        ))
+        return batch.transactions, batch.errors
 
-        # Row 0 = title, row 1 = blank, row 2 = headers, data starts at row 3
-        if len(rows) < 4:
-            return [], ["Sharesight file has no data rows"]
+    @staticmethod
+    def iter_batches(payload: Payload) -> Iterator[ParsedBatch]:
+        """Parse the sheet a row at a time, yielding a batch every ``BATCH_ROWS`` rows.
 
-        header = [str(c).strip() for c in rows[2]]
-        col = {name: i for i, name in enumerate(header)}
+        Rows are read lazily from calamine, so only the batch in hand is ever held as
+        Python objects however many years the report covers.
+        """
+        sheet = payload.sheet
+        # Row 0 = title, row 1 = blank, row 2 = headers, data starts at row 3
+        if sheet is None or sheet.height < 4:
+            yield ParsedBatch(errors=[RowError("Sharesight file has no data rows", "empty")])
+            return
 
-        transactions: list[ParsedTransaction] = []
-        errors: list[str] = []
+        convert = COLUMNS.compile(payload.sheet_head(3)[2])
+        if convert.missing:
+            missing = ", ".join(sorted(convert.missing))
+            error = RowError(f"Missing required columns: {missing}", "missing_columns")
+            yield ParsedBatch(errors=[error])
+            return
 
-        for row_idx, row in enumerate(rows[3:], start=4):
+        batch = ParsedBatch()
+        for row_idx, row in enumerate(islice(sheet.iter_rows(), 3, None), start=4):
             # Skip the "Total" row at the end
             if str(row[0]).strip().lower() == "total":
                 continue
 
-            try:
-                code = str(row[col["Code"]]).strip()
-                type_val = str(row[col["Type"]]).strip().lower()
-                qty = abs(int(float(row[col["Qty"]])))
-                price = Decimal(str(row[col["Price"]]))
-                value = abs(Decimal(str(row[col["Value"]])))
-                brokerage = Decimal(str(row[col["Brokerage"]]))
-
-                date_val = row[col["Date"]]
-                if isinstance(date_val, str):
-                    txn_date = date.fromisoformat(date_val)
-                else:
-                    txn_date = date_val  # calamine returns date objects
-
-                txn = ParsedTransaction(
-                    date=txn_date,
-                    time=time(0, 0, 0),
-                    action=type_val,
-                    ticker=code.upper(),
-                    quantity=qty,
-                    price=price,
-                    value=value,
-                    fee=brokerage,
-                )
-                transactions.append(txn)
-            except Exception as e:
-                errors.append(f"Row {row_idx}: {e}")
-
-        return transactions, errors
+            batch.rows += 1
+            txn, row_errors = convert(row, row_idx)
+            if row_errors:
+                batch.errors.extend(row_errors)
+            else:
+                batch.transactions.append(txn)
+            if batch.rows == BATCH_ROWS:
+                yield batch
+                batch = ParsedBatch()
+        yield batch
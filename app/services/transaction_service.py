@@ -1,8 +1,32 @@
+import hashlib
+from decimal import Decimal
+
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.models.transaction import Action, StockTransaction
 from app.schemas.transaction import TransactionCreate
+from app.services import cgt_service
+from app.services.parsers import ParsedTransaction
+
+
+def fingerprint(txn: StockTransaction | ParsedTransaction, occurrence: int = 0) -> str:
+    """Content hash identifying a trade across re-imports.
+
+    ``occurrence`` numbers otherwise identical trades (0 for the first), so genuine
+    repeats of a trade in one export are kept apart.
+    """
+    key = "|".join([
+        txn.date.isoformat(),
+        txn.time.isoformat(),
+        Action(txn.action).value,
+        txn.ticker.upper(),
+        str(txn.quantity),
+        f"{Decimal(txn.price):.4f}",
+        txn.contract_note or "",
+        str(occurrence),
+    ])
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
 
 
 def list_transactions(
@@ -32,7 +56,20 @@ def create_transaction(
     db: Session, user_id: int, data: TransactionCreate
 ) -> StockTransaction:
     txn = StockTransaction(user_id=user_id, **data.model_dump())
+    # A trade entered by hand is always kept, as the next occurrence of its fingerprint
+    taken = set(
+        db.scalars(
+            select(StockTransaction.fingerprint).where(
+                StockTransaction.user_id == user_id, StockTransaction.date == txn.date
+            )
+        )
+    )
+    occurrence = 0
+    while fingerprint(txn, occurrence) in taken:
+        occurrence += 1
+    txn.fingerprint = fingerprint(txn, occurrence)
     db.add(txn)
+    cgt_service.invalidate(db, user_id, txn.ticker, txn.date)
     db.commit()
     db.refresh(txn)
     return txn
@@ -49,6 +86,7 @@ def delete_transaction(db: Session, user_id: int, txn_id: int) -> bool:
     txn = get_transaction(db, user_id, txn_id)
     if not txn:
         return False
+    cgt_service.invalidate(db, user_id, txn.ticker, txn.date)
     db.delete(txn)
     db.commit()
     return True
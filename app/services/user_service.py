@@ -2,6 +2,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.models.user import User
+from app.services import cgt_service
 
 
 def get_or_create_user(db: Session, username: str) -> User:
@@ -24,6 +25,7 @@ def delete_user(db: Session, user_id: int) -> bool:
     user = db.get(User, user_id)
     if not user:
         return False
+    cgt_service.clear_cache(db, user_id)
     db.delete(user)
     db.commit()
     return True
@@ -55,9 +55,41 @@ export interface Transaction extends TransactionCreate {
   user_id: number;
 }
 
+export interface ImportErrorGroup {
+  file: string | null;
+  code: string;
+  column: string | null;
+  count: number;
+  rows: number[];
+  example: string;
+}
+
 export interface ImportResult {
   imported: number;
+  skipped: number;
+  errors: string[];
+  error_count: number;
+  error_groups: ImportErrorGroup[];
+  rows_per_second?: number | null;
+}
+
+export interface ImportJob {
+  id: number;
+  user_id: number;
+  filename: string;
+  status: "pending" | "running" | "succeeded" | "failed";
+  rows_read: number;
+  imported: number;
+  skipped: number;
   errors: string[];
+  error_count: number;
+  error_groups: ImportErrorGroup[];
+  rows_per_second: number | null;
+  attempts: number;
+  created_at: string;
+  queued_at: string;
+  started_at: string | null;
+  finished_at: string | null;
 }
 
 export interface LotMatch {
@@ -87,6 +119,48 @@ export interface CGTOverview {
   financial_years: FinancialYearSummary[];
 }
 
+export interface SimulatedSell {
+  ticker: string;
+  quantity: number;
+  price: string;
+  date: string;
+  fee?: string;
+}
+
+export interface SimulatedYear {
+  financial_year: string;
+  current: FinancialYearSummary;
+  simulated: FinancialYearSummary;
+  net_capital_gain_change: string;
+}
+
+export interface CGTSimulation {
+  financial_years: SimulatedYear[];
+}
+
+export interface HoldingParcel {
+  transaction_id: number;
+  acquired: string;
+  quantity: number;
+  price: string;
+  cost_base: string;
+  discount_eligible: boolean;
+  days_until_discount: number;
+}
+
+export interface Holding {
+  ticker: string;
+  quantity: number;
+  cost_base: string;
+  parcels: HoldingParcel[];
+}
+
+export interface LotMatchPage {
+  financial_year: string;
+  items: LotMatch[];
+  next_cursor: string | null;
+}
+
 // --- API Functions ---
 
 export function createUser(username: string) {
@@ -132,33 +206,94 @@ export function deleteTransaction(userId: number, txnId: number) {
   });
 }
 
-export function importCSV(userId: number, file: File) {
+export function importCSV(userId: number, files: File | File[]) {
   const form = new FormData();
-  form.append("file", file);
+  for (const file of Array.isArray(files) ? files : [files]) {
+    form.append("file", file);
+  }
   return request<ImportResult>(`/users/${userId}/import`, {
     method: "POST",
     body: form,
   });
 }
 
-export function getCGTOverview(userId: number) {
-  return request<CGTOverview>(`/users/${userId}/reports/cgt`);
+export function startImportJob(userId: number, files: File | File[]) {
+  const form = new FormData();
+  for (const file of Array.isArray(files) ? files : [files]) {
+    form.append("file", file);
+  }
+  return request<ImportJob>(`/users/${userId}/import?async=true`, {
+    method: "POST",
+    body: form,
+  });
+}
+
+export function getImportJob(jobId: number) {
+  return request<ImportJob>(`/import/jobs/${jobId}`);
+}
+
+export function retryImportJob(jobId: number) {
+  return request<ImportJob>(`/import/jobs/${jobId}/retry`, { method: "POST" });
+}
+
+export type LotStrategy = "fifo" | "lifo" | "highest_cost" | "min_tax";
+
+export function getCGTOverview(userId: number, strategy: LotStrategy = "fifo") {
+  return request<CGTOverview>(`/users/${userId}/reports/cgt?strategy=${strategy}`);
+}
+
+export function getCGTReport(userId: number, fy: string, strategy: LotStrategy = "fifo") {
+  return request<CGTOverview>(`/users/${userId}/reports/cgt/${fy}?strategy=${strategy}`);
+}
+
+export function simulateCGT(userId: number, sells: SimulatedSell[]) {
+  return request<CGTSimulation>(`/users/${userId}/reports/cgt/simulate`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ sells }),
+  });
+}
+
+export interface LotMatchQuery {
+  ticker?: string;
+  sort?: "sell_date" | "ticker" | "quantity" | "raw_gain" | "net_gain";
+  order?: "asc" | "desc";
+  limit?: number;
+  cursor?: string;
+}
+
+export function getCGTMatches(userId: number, fy: string, query?: LotMatchQuery) {
+  const params = new URLSearchParams();
+  if (query?.ticker) params.set("ticker", query.ticker);
+  if (query?.sort) params.set("sort", query.sort);
+  if (query?.order) params.set("order", query.order);
+  if (query?.limit) params.set("limit", String(query.limit));
+  if (query?.cursor) params.set("cursor", query.cursor);
+  const qs = params.toString();
+  return request<LotMatchPage>(
+    `/users/${userId}/reports/cgt/${fy}/matches${qs ? `?${qs}` : ""}`
+  );
 }
 
-export function getCGTReport(userId: number, fy: string) {
-  return request<CGTOverview>(`/users/${userId}/reports/cgt/${fy}`);
+export function getHoldings(userId: number, ticker?: string) {
+  const qs = ticker ? `?ticker=${encodeURIComponent(ticker)}` : "";
+  return request<Holding[]>(`/users/${userId}/holdings${qs}`);
 }
 
 export function deleteUser(userId: number) {
   return request<void>(`/users/${userId}`, { method: "DELETE" });
 }
 
-export async function downloadExport(userId: number, format: "json" | "csv" = "json") {
-  const blob = await requestBlob(`/users/${userId}/export?format=${format}`);
+export async function downloadExport(
+  userId: number,
+  format: "json" | "csv" | "ndjson" = "json",
+  gzip = false,
+) {
+  const blob = await requestBlob(`/users/${userId}/export?format=${format}&gzip=${gzip}`);
   const url = URL.createObjectURL(blob);
   const a = document.createElement("a");
   a.href = url;
-  a.download = `transactions.${format}`;
+  a.download = `transactions.${format}${gzip ? ".gz" : ""}`;
   a.click();
   URL.revokeObjectURL(url);
 }
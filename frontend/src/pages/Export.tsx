@@ -9,8 +9,8 @@ export default function Export({ userId }: Props) {
     <div>
       <h2 className="text-xl font-bold text-gray-900 mb-4">Export Transactions</h2>
       <p className="text-sm text-gray-600 mb-6">
-        Download all your transactions as a CSV file in Finagle's native format.
-        This file can be re-imported later.
+        Download all your transactions as a CSV file in Finagle's native format, or as
+        compressed NDJSON for large histories. Either file can be re-imported later.
       </p>
       <button
         onClick={() => downloadExport(userId, "csv")}
@@ -18,6 +18,12 @@ export default function Export({ userId }: Props) {
       >
         Download CSV
       </button>
+      <button
+        onClick={() => downloadExport(userId, "ndjson", true)}
+        className="inline-block ml-2 px-4 py-2 bg-white text-blue-600 text-sm font-medium rounded border border-blue-600 hover:bg-blue-50"
+      >
+        Download compressed NDJSON
+      </button>
     </div>
   );
 }
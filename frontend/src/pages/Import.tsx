@@ -12,12 +12,12 @@ export default function Import({ userId }: Props) {
   const [dragOver, setDragOver] = useState(false);
   const inputRef = useRef<HTMLInputElement>(null);
 
-  async function handleFile(file: File) {
+  async function handleFiles(files: File[]) {
     setError("");
     setResult(null);
     setLoading(true);
     try {
-      const res = await importCSV(userId, file);
+      const res = await importCSV(userId, files);
       setResult(res);
     } catch (err) {
       setError(err instanceof Error ? err.message : "Import failed");
@@ -29,13 +29,13 @@ export default function Import({ userId }: Props) {
   function onDrop(e: React.DragEvent) {
     e.preventDefault();
     setDragOver(false);
-    const file = e.dataTransfer.files[0];
-    if (file) handleFile(file);
+    const files = Array.from(e.dataTransfer.files);
+    if (files.length) handleFiles(files);
   }
 
   function onChange(e: React.ChangeEvent<HTMLInputElement>) {
-    const file = e.target.files?.[0];
-    if (file) handleFile(file);
+    const files = Array.from(e.target.files ?? []);
+    if (files.length) handleFiles(files);
   }
 
   return (
@@ -74,7 +74,8 @@ export default function Import({ userId }: Props) {
         <input
           ref={inputRef}
           type="file"
-          accept=".csv,.xlsx"
+          accept=".csv,.xlsx,.zip,.ndjson,.gz"
+          multiple
           onChange={onChange}
           className="hidden"
         />
@@ -83,10 +84,11 @@ export default function Import({ userId }: Props) {
         ) : (
           <>
             <p className="text-gray-600 font-medium">
-              Drop a file here or click to browse
+              Drop files here or click to browse
             </p>
             <p className="text-gray-400 text-sm mt-1">
-              Accepts .csv or .xlsx files (Finagle, Sharesight, Pearler)
+              Accepts .csv or .xlsx files (Finagle, Sharesight, Pearler), several at once
+              or in a .zip
             </p>
           </>
         )}
@@ -102,8 +104,19 @@ export default function Import({ userId }: Props) {
           {result.errors.length > 0 && (
             <div className="mt-2">
               <p className="text-sm text-red-700 font-medium">
-                {result.errors.length} error{result.errors.length !== 1 ? "s" : ""}:
+                {result.error_count} error{result.error_count !== 1 ? "s" : ""}:
               </p>
+              {result.error_groups.length > 1 && (
+                <ul className="mt-1 text-sm text-red-700">
+                  {result.error_groups.map((group) => (
+                    <li key={`${group.file ?? ""}:${group.code}:${group.column ?? ""}`}>
+                      {group.file && `${group.file}: `}
+                      {group.count} × {group.column ?? "file"} ({group.code})
+                      {group.rows.length > 0 && `, rows ${group.rows.join(", ")}`}
+                    </li>
+                  ))}
+                </ul>
+              )}
               <ul className="mt-1 text-sm text-red-600 list-disc list-inside">
                 {result.errors.map((err, i) => (
                   <li key={i}>{err}</li>
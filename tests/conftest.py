@@ -3,7 +3,7 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_session_factory
 from app.models import StockTransaction, User  # noqa: F401 — register models
 from app.main import app
 
@@ -42,6 +42,10 @@ def client(db):
         yield db
 
     app.dependency_overrides[get_db] = _override
+    # Background work gets its own session, inside the same test transaction
+    app.dependency_overrides[get_session_factory] = lambda: lambda: TestSession(
+        bind=db.connection()
+    )
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
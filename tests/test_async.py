@@ -0,0 +1,113 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.core.database import (
+    Base,
+    create_async_db_engine,
+    create_db_engine,
+    get_session,
+    get_session_factory,
+)
+from app.main import app
+from app.services import cgt_service, import_service
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture()
+def async_client(tmp_path):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_db_engine(url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    sessions = async_sessionmaker(
+        create_async_db_engine(url, poolclass=NullPool), expire_on_commit=False
+    )
+
+    async def _override():
+        async with sessions() as db:
+            assert isinstance(db, AsyncSession)
+            yield db
+
+    app.dependency_overrides[get_session] = _override
+    app.dependency_overrides[get_session_factory] = lambda: sessions
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+
+def test_async_session_serves_the_api(async_client):
+    uid = async_client.post("/api/v1/users", json={"username": "async"}).json()["id"]
+    base = f"/api/v1/users/{uid}"
+
+    for d, action, qty, price in [
+        ("2022-08-01", "buy", 100, "40.00"),
+        ("2023-09-01", "sell", 60, "50.00"),
+    ]:
+        r = async_client.post(f"{base}/transactions", json={
+            "date": d, "time": "10:00:00", "action": action, "ticker": "BHP", "quantity": qty,
+            "price": price, "value": str(Decimal(price) * qty), "fee": "0.00",
+        })
+        assert r.status_code == 201
+    csv = (
+        b"date,time,action,ticker,quantity,price,value,fee\n"
+        b"2023-10-01,10:00:00,buy,CBA,10,100.00,1000.00,0\n"
+    )
+    r = async_client.post(f"{base}/import", files={"file": ("t.csv", csv, "text/csv")})
+    assert r.json()["imported"] == 1
+
+    assert len(async_client.get(f"{base}/transactions").json()) == 3
+    fy = async_client.get(f"{base}/reports/cgt/2023-24").json()["financial_years"][0]
+    assert Decimal(fy["net_capital_gain"]) == Decimal("300.00")
+    holdings = async_client.get(f"{base}/holdings").json()
+    assert [(h["ticker"], h["quantity"]) for h in holdings] == [("BHP", 40), ("CBA", 10)]
+    export = async_client.get(f"{base}/export").json()
+    assert [t["ticker"] for t in export["transactions"]] == ["BHP", "BHP", "CBA"]
+    assert async_client.get(f"{base}/export?format=csv").text.count("\n") == 4
+
+    assert async_client.delete(base).status_code == 204
+    assert async_client.get(base).status_code == 404
+
+
+def test_async_driver_swap():
+    engine = create_async_db_engine("sqlite:///finagle.db")
+    assert engine.url.drivername == "sqlite+aiosqlite"
+
+
+def test_async_session_replays_cgt_off_the_event_loop(async_client, monkeypatch):
+    on_loop = []
+
+    def running_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    def watch(fn):
+        def wrapper(*args, **kwargs):
+            on_loop.append(running_loop())
+            return fn(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(cgt_service, "refresh", watch(cgt_service.refresh))
+    monkeypatch.setattr(
+        import_service.ImportWriter, "prepare", watch(import_service.ImportWriter.prepare)
+    )
+    uid = async_client.post("/api/v1/users", json={"username": "async"}).json()["id"]
+    base = f"/api/v1/users/{uid}"
+    csv = (
+        b"date,time,action,ticker,quantity,price,value,fee\n"
+        b"2023-10-01,10:00:00,buy,CBA,10,100.00,1000.00,0\n"
+    )
+    r = async_client.post(f"{base}/import", files={"file": ("t.csv", csv, "text/csv")})
+    assert r.json()["imported"] == 1
+    assert async_client.get(f"{base}/reports/cgt").status_code == 200
+    assert async_client.get(f"{base}/holdings").json()[0]["quantity"] == 10
+    assert len(on_loop) >= 3 and not any(on_loop)
@@ -1,6 +1,7 @@
 from decimal import Decimal
 
 import pytest
+from sqlalchemy import select
 
 
 @pytest.fixture()
@@ -106,3 +107,377 @@ def test_overview_has_no_lot_matches(client, user_id):
 def test_cgt_no_data(client, user_id):
     r = client.get(f"/api/v1/users/{user_id}/reports/cgt/2099-00")
     assert r.status_code == 404
+
+
+def _net_gain(client, uid, fy):
+    r = client.get(f"/api/v1/users/{uid}/reports/cgt/{fy}")
+    if r.status_code == 404:
+        return None
+    return Decimal(r.json()["financial_years"][0]["net_capital_gain"])
+
+
+def test_cached_report_picks_up_appended_trade(client, user_id):
+    """A trade after the cached watermark resumes from the stored open lots."""
+    _buy(client, user_id, "2024-01-10", "BHP", 100, "40.00", "0.00")
+    _sell(client, user_id, "2024-03-10", "BHP", 40, "50.00", "0.00")
+    assert _net_gain(client, user_id, "2023-24") == Decimal("400.00")
+
+    _sell(client, user_id, "2024-04-10", "BHP", 60, "45.00", "0.00")
+    r = client.get(f"/api/v1/users/{user_id}/reports/cgt/2023-24")
+    fy = r.json()["financial_years"][0]
+    assert [m["quantity"] for m in fy["lot_matches"]] == [40, 60]
+    assert Decimal(fy["net_capital_gain"]) == Decimal("700.00")
+
+
+def test_cached_report_replays_backdated_trade(client, user_id):
+    """A trade dated before the watermark changes the FIFO order of earlier lots."""
+    _buy(client, user_id, "2024-02-10", "BHP", 100, "50.00", "0.00")
+    _sell(client, user_id, "2024-03-10", "BHP", 100, "55.00", "0.00")
+    assert _net_gain(client, user_id, "2023-24") == Decimal("500.00")
+
+    _buy(client, user_id, "2024-01-10", "BHP", 100, "40.00", "0.00")
+    assert _net_gain(client, user_id, "2023-24") == Decimal("1500.00")
+
+
+def test_cached_report_after_delete(client, user_id):
+    _buy(client, user_id, "2024-01-10", "BHP", 100, "40.00", "0.00")
+    _sell(client, user_id, "2024-03-10", "BHP", 100, "50.00", "0.00")
+    assert _net_gain(client, user_id, "2023-24") == Decimal("1000.00")
+
+    txns = client.get(f"/api/v1/users/{user_id}/transactions?action=sell").json()
+    client.delete(f"/api/v1/users/{user_id}/transactions/{txns[0]['id']}")
+    assert _net_gain(client, user_id, "2023-24") is None
+
+
+def test_cached_report_after_import(client, user_id):
+    _buy(client, user_id, "2024-01-10", "BHP", 100, "40.00", "0.00")
+    assert client.get(f"/api/v1/users/{user_id}/reports/cgt").json()["financial_years"] == []
+
+    csv = (
+        "date,time,action,ticker,quantity,price,value,fee,contract_note\n"
+        "2024-03-10,10:00:00,sell,BHP,100,45.00,4500.00,0.00,\n"
+    )
+    client.post(
+        f"/api/v1/users/{user_id}/import", files={"file": ("txns.csv", csv, "text/csv")}
+    )
+    assert _net_gain(client, user_id, "2023-24") == Decimal("500.00")
+
+
+def test_cached_report_matches_full_replay(client, db, user_id):
+    from app.services import cgt_service
+
+    _buy(client, user_id, "2022-08-01", "BHP", 100, "40.00", "9.95")
+    _sell(client, user_id, "2023-03-01", "BHP", 30, "45.00", "9.95")
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    _buy(client, user_id, "2023-09-01", "BHP", 50, "38.00", "9.95")
+    _sell(client, user_id, "2024-02-01", "BHP", 100, "47.00", "9.95")
+    cached = cgt_service.compute_cgt(db, user_id)
+
+    cgt_service.clear_cache(db, user_id)
+    assert cgt_service.compute_cgt(db, user_id) == cached
+
+
+def test_backdated_trade_replays_from_checkpoint(client, db, user_id, monkeypatch):
+    """A write in a later year resumes from the preceding 30 June snapshot."""
+    from app.models import CGTCheckpoint
+    from app.services import cgt_service
+
+    _buy(client, user_id, "2021-08-01", "BHP", 100, "40.00", "9.95")
+    _sell(client, user_id, "2022-03-01", "BHP", 40, "45.00", "9.95")
+    _buy(client, user_id, "2022-09-01", "BHP", 50, "38.00", "9.95")
+    _sell(client, user_id, "2023-02-01", "BHP", 80, "47.00", "9.95")
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    assert {c.as_at.isoformat() for c in db.query(CGTCheckpoint)} == {"2022-06-30"}
+
+    loaded = []
+    load_checkpoint_lots = cgt_service._load_checkpoint_lots
+    monkeypatch.setattr(
+        cgt_service,
+        "_load_checkpoint_lots",
+        lambda db, checkpoint_id, *args: loaded.append(checkpoint_id)
+        or load_checkpoint_lots(db, checkpoint_id, *args),
+    )
+    _buy(client, user_id, "2022-10-01", "CBA", 10, "100.00", "9.95")
+    _sell(client, user_id, "2022-11-01", "BHP", 10, "41.00", "9.95")
+    cached = cgt_service.compute_cgt(db, user_id)
+    assert len(loaded) == 1
+
+    cgt_service.clear_cache(db, user_id)
+    assert cgt_service.compute_cgt(db, user_id) == cached
+
+
+def test_write_after_checkpoint_replay_with_no_later_trades(client, db, user_id):
+    """A replay from a checkpoint that finds no later trades resumes in the next year."""
+    from app.services import cgt_service
+
+    _buy(client, user_id, "2021-01-01", "BHP", 100, "40.00", "0.00")
+    _buy(client, user_id, "2022-08-01", "BHP", 50, "42.00", "0.00")
+    assert client.get(f"/api/v1/users/{user_id}/reports/cgt").status_code == 200
+
+    txns = client.get(f"/api/v1/users/{user_id}/transactions").json()
+    later = next(t for t in txns if t["date"] == "2022-08-01")
+    client.delete(f"/api/v1/users/{user_id}/transactions/{later['id']}")
+    assert client.get(f"/api/v1/users/{user_id}/reports/cgt").status_code == 200
+
+    _sell(client, user_id, "2022-09-01", "BHP", 30, "45.00", "0.00")
+    assert _net_gain(client, user_id, "2022-23") == Decimal("75.00")
+    cached = cgt_service.compute_cgt(db, user_id)
+    cgt_service.clear_cache(db, user_id)
+    assert cgt_service.compute_cgt(db, user_id) == cached
+
+
+def test_concurrent_refreshes_replay_a_write_once(tmp_path, monkeypatch):
+    """Reads racing to refresh after one write add its lot matches once."""
+    import threading
+
+    from sqlalchemy import func
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.database import Base, create_db_engine
+    from app.models import User
+    from app.models.cgt import CGTLotMatch
+    from app.models.transaction import Action
+    from app.schemas.transaction import TransactionCreate
+    from app.services import cgt_service, transaction_service
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+
+    def trade(db, uid, d, action, qty):
+        transaction_service.create_transaction(db, uid, TransactionCreate(
+            date=d, time="10:00:00", action=Action(action), ticker="BHP", quantity=qty,
+            price=Decimal("40.00"), value=Decimal("40.00") * qty, fee=Decimal("0.00"),
+        ))
+
+    with sessions() as db:
+        user = User(username="racer")
+        db.add(user)
+        db.commit()
+        uid = user.id
+        trade(db, uid, "2022-08-01", "buy", 100)
+        cgt_service.refresh(db, uid)
+        trade(db, uid, "2022-09-01", "sell", 10)
+
+    # Hold each refresh once it has read the watermarks until the other has too; a
+    # refresh that is locked out never gets there, so the barrier times out instead
+    arrived = threading.Barrier(2, timeout=1)
+    open_partition = cgt_service._open_partition
+
+    def _open_partition(*args):
+        try:
+            arrived.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return open_partition(*args)
+
+    monkeypatch.setattr(cgt_service, "_open_partition", _open_partition)
+
+    def read():
+        with sessions() as db:
+            cgt_service.refresh(db, uid)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    with sessions() as db:
+        count = select(func.count()).select_from(CGTLotMatch).where(CGTLotMatch.user_id == uid)
+        assert db.scalar(count) == 1
+    engine.dispose()
+
+
+def test_overview_as_of(client, user_id):
+    _buy(client, user_id, "2023-01-10", "BHP", 100, "40.00", "0.00")
+    _sell(client, user_id, "2023-03-10", "BHP", 50, "50.00", "0.00")
+    _sell(client, user_id, "2023-09-10", "BHP", 50, "60.00", "0.00")
+
+    r = client.get(f"/api/v1/users/{user_id}/reports/cgt?as_of=2023-08-31")
+    years = r.json()["financial_years"]
+    assert [fy["financial_year"] for fy in years] == ["2022-23"]
+    assert Decimal(years[0]["net_capital_gain"]) == Decimal("500.00")
+
+    r = client.get(f"/api/v1/users/{user_id}/reports/cgt?as_of=2023-12-31")
+    assert [fy["financial_year"] for fy in r.json()["financial_years"]] == ["2022-23", "2023-24"]
+
+
+def test_summary_totals_match_lot_matches(client, db, user_id):
+    """Stored running totals agree with summaries rebuilt from every lot match."""
+    from app.services import cgt_service
+
+    _buy(client, user_id, "2021-08-01", "AAA", 100, "40.00", "9.95")
+    _buy(client, user_id, "2022-01-01", "BBB", 100, "20.00", "9.95")
+    _sell(client, user_id, "2022-03-01", "AAA", 40, "30.00", "9.95")
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    _sell(client, user_id, "2022-05-01", "BBB", 50, "25.00", "9.95")
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    _sell(client, user_id, "2023-02-01", "AAA", 60, "55.00", "9.95")
+    _sell(client, user_id, "2023-03-01", "BBB", 50, "15.00", "9.95")
+
+    summary = cgt_service.compute_cgt_summary(db, user_id)
+    detail = cgt_service.compute_cgt(db, user_id)
+    for fy in detail.financial_years:
+        fy.lot_matches = []
+    assert summary == detail
+    assert [fy.financial_year for fy in summary.financial_years] == ["2021-22", "2022-23"]
+
+
+def test_write_only_replays_its_ticker(client, db, user_id):
+    from app.models import CGTLotMatch
+    from app.services import cgt_service
+
+    _buy(client, user_id, "2021-08-01", "AAA", 100, "40.00")
+    _sell(client, user_id, "2022-03-01", "AAA", 40, "45.00")
+    _buy(client, user_id, "2021-09-01", "bbb", 100, "20.00")
+    _sell(client, user_id, "2023-03-01", "BBB", 60, "25.00")
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    aaa_ids = set(db.scalars(select(CGTLotMatch.id).where(CGTLotMatch.ticker == "AAA")))
+
+    _buy(client, user_id, "2021-07-15", "BBB", 10, "18.00")
+    cached = cgt_service.compute_cgt(db, user_id)
+    assert set(db.scalars(select(CGTLotMatch.id).where(CGTLotMatch.ticker == "AAA"))) == aaa_ids
+
+    cgt_service.clear_cache(db, user_id)
+    assert cgt_service.compute_cgt(db, user_id) == cached
+
+
+def test_interleaved_writes_match_full_replay(db, user_id):
+    import random
+
+    from app.models.transaction import Action
+    from app.schemas.transaction import TransactionCreate
+    from app.services import cgt_service, transaction_service
+    from tests.test_cgt_fixed import _random_history
+
+    history = _random_history(17, n=120)
+    # Writing the history out of date order exercises resumed, checkpointed and full
+    # per-ticker replays
+    random.Random(17).shuffle(history)
+    for n, txn in enumerate(history):
+        transaction_service.create_transaction(db, user_id, TransactionCreate(
+            date=txn.date, time=txn.time, action=Action(txn.action), ticker=txn.ticker,
+            quantity=txn.quantity, price=txn.price, value=txn.price * txn.quantity, fee=txn.fee,
+        ))
+        if n % 15 == 0:
+            cgt_service.compute_cgt(db, user_id)
+    cached = cgt_service.compute_cgt(db, user_id)
+    summary = cgt_service.compute_cgt_summary(db, user_id)
+
+    cgt_service.rebuild(db, user_id)
+    assert cgt_service.compute_cgt(db, user_id) == cached
+    assert cgt_service.compute_cgt_summary(db, user_id) == summary
+
+
+def test_matches_pages_follow_cursor(client, user_id):
+    _buy(client, user_id, "2023-07-03", "BHP", 100, "40.00", "0.00")
+    _buy(client, user_id, "2023-07-03", "CBA", 100, "90.00", "0.00")
+    for day in range(10, 15):
+        _sell(client, user_id, f"2023-08-{day}", "BHP", 10, f"4{day - 10}.00", "0.00")
+        _sell(client, user_id, f"2023-09-{day}", "CBA", 10, "95.00", "0.00")
+
+    url = f"/api/v1/users/{user_id}/reports/cgt/2023-24/matches"
+    seen, cursor = [], None
+    while True:
+        r = client.get(url, params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        page = r.json()
+        assert len(page["items"]) <= 3
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    detail = client.get(f"/api/v1/users/{user_id}/reports/cgt/2023-24").json()
+    assert seen == detail["financial_years"][0]["lot_matches"]
+
+
+def test_matches_filter_and_sort(client, user_id):
+    _buy(client, user_id, "2023-07-03", "BHP", 100, "40.00", "0.00")
+    _buy(client, user_id, "2023-07-03", "CBA", 100, "90.00", "0.00")
+    for n, price in enumerate(["45.00", "35.00", "50.00", "41.00"]):
+        _sell(client, user_id, f"2023-08-1{n}", "BHP", 10, price, "0.00")
+    _sell(client, user_id, "2023-08-20", "CBA", 10, "95.00", "0.00")
+
+    url = f"/api/v1/users/{user_id}/reports/cgt/2023-24/matches"
+    r = client.get(url, params={"ticker": "bhp", "sort": "net_gain", "order": "desc", "limit": 2})
+    page = r.json()
+    assert [m["net_gain"] for m in page["items"]] == ["100.00", "50.00"]
+    assert {m["ticker"] for m in page["items"]} == {"BHP"}
+
+    r = client.get(url, params={
+        "ticker": "bhp", "sort": "net_gain", "order": "desc", "cursor": page["next_cursor"],
+    })
+    assert [m["net_gain"] for m in r.json()["items"]] == ["10.00", "-50.00"]
+    assert r.json()["next_cursor"] is None
+
+
+def test_matches_rejects_bad_cursor(client, user_id):
+    _buy(client, user_id, "2023-07-03", "BHP", 100, "40.00", "0.00")
+    _sell(client, user_id, "2023-08-10", "BHP", 10, "45.00", "0.00")
+    _sell(client, user_id, "2023-08-11", "BHP", 10, "45.00", "0.00")
+    url = f"/api/v1/users/{user_id}/reports/cgt/2023-24/matches"
+
+    cursor = client.get(url, params={"limit": 1}).json()["next_cursor"]
+    assert client.get(url, params={"cursor": "not-a-cursor"}).status_code == 400
+    # A cursor only continues the sort it was issued for
+    assert client.get(url, params={"cursor": cursor, "sort": "net_gain"}).status_code == 400
+    assert client.get(url, params={"sort": "price"}).status_code == 422
+
+
+def test_simulate_sell_reports_marginal_gain(client, db, user_id):
+    from app.models import CGTLotMatch
+
+    _buy(client, user_id, "2022-08-01", "BHP", 100, "40.00", "0.00")
+    _buy(client, user_id, "2023-08-01", "CBA", 100, "100.00", "0.00")
+    _sell(client, user_id, "2023-09-01", "CBA", 50, "90.00", "0.00")  # $500 loss
+    # Bring the cache up to date first; writes leave it to the next read
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    stored = db.query(CGTLotMatch).count()
+
+    r = client.post(f"/api/v1/users/{user_id}/reports/cgt/simulate", json={
+        "sells": [{"ticker": "bhp", "quantity": 60, "price": "50.00", "date": "2024-03-01"}],
+    })
+    assert r.status_code == 200
+    [year] = r.json()["financial_years"]
+    assert year["financial_year"] == "2023-24"
+    assert Decimal(year["current"]["net_capital_gain"]) == Decimal("0.00")
+    # $600 discountable gain less the $500 loss, then halved
+    assert Decimal(year["simulated"]["net_capital_gain"]) == Decimal("50.00")
+    assert Decimal(year["net_capital_gain_change"]) == Decimal("50.00")
+    [match] = year["simulated"]["lot_matches"]
+    assert match["held_over_12_months"] and match["quantity"] == 60
+
+    # Nothing hypothetical is stored
+    assert db.query(CGTLotMatch).count() == stored
+    assert _net_gain(client, user_id, "2023-24") == Decimal("0.00")
+
+
+def test_simulate_sells_share_the_fifo_queue(client, user_id):
+    _buy(client, user_id, "2023-08-01", "BHP", 50, "40.00", "0.00")
+    _buy(client, user_id, "2023-09-01", "BHP", 50, "44.00", "0.00")
+
+    r = client.post(f"/api/v1/users/{user_id}/reports/cgt/simulate", json={"sells": [
+        {"ticker": "BHP", "quantity": 40, "price": "45.00", "date": "2024-05-01"},
+        {"ticker": "BHP", "quantity": 20, "price": "45.00", "date": "2024-07-02"},
+    ]})
+    years = {y["financial_year"]: y for y in r.json()["financial_years"]}
+    assert Decimal(years["2023-24"]["simulated"]["net_capital_gain"]) == Decimal("200.00")
+    # 10 units left from the first parcel, then 10 from the second
+    assert Decimal(years["2024-25"]["simulated"]["net_capital_gain"]) == Decimal("60.00")
+
+
+def test_simulate_rejects_oversell_and_backdated_sell(client, user_id):
+    _buy(client, user_id, "2023-08-01", "BHP", 50, "40.00", "0.00")
+    url = f"/api/v1/users/{user_id}/reports/cgt/simulate"
+
+    r = client.post(url, json={"sells": [
+        {"ticker": "BHP", "quantity": 51, "price": "45.00", "date": "2024-05-01"},
+    ]})
+    assert r.status_code == 400
+    r = client.post(url, json={"sells": [
+        {"ticker": "BHP", "quantity": 10, "price": "45.00", "date": "2023-07-01"},
+    ]})
+    assert r.status_code == 400
+    assert client.post(url, json={"sells": []}).status_code == 422
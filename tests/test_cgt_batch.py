@@ -0,0 +1,64 @@
+import csv
+import io
+from contextlib import nullcontext
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app import cli  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.models import StockTransaction, User  # noqa: E402
+from app.services import cgt_batch, cgt_service  # noqa: E402
+from tests.test_cgt_fixed import _random_history  # noqa: E402
+
+
+@pytest.fixture()
+def users(db):
+    ids = []
+    for n, seed in enumerate([3, 7, 11]):
+        user = User(username=f"batch{n}")
+        db.add(user)
+        db.flush()
+        for txn in _random_history(seed, n=150):
+            db.add(StockTransaction(
+                user_id=user.id, date=txn.date, time=txn.time, action=txn.action,
+                ticker=txn.ticker if n else txn.ticker.lower(), quantity=txn.quantity,
+                price=txn.price, value=txn.price * txn.quantity, fee=txn.fee,
+            ))
+        ids.append(user.id)
+    db.commit()
+    return ids
+
+
+def test_batch_matches_fixed_engine(db, users, monkeypatch):
+    monkeypatch.setattr(settings, "cgt_engine", "fixed")
+    batch = cgt_batch.summarise_all(db)
+    assert sorted(batch) == sorted(users)
+    for user_id in users:
+        expected = cgt_service.compute_cgt_summary(db, user_id).financial_years
+        assert batch[user_id] == expected
+
+
+def test_batch_user_and_year_filter(db, users):
+    batch = cgt_batch.summarise_all(db, user_ids=users[1:2], fy="2016-17")
+    assert list(batch) == [users[1]]
+    assert [s.financial_year for s in batch[users[1]]] == ["2016-17"]
+
+
+def test_batch_no_trades(db):
+    assert cgt_batch.summarise_all(db) == {}
+
+
+def test_cli_cgt_batch(db, users, monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr(cli, "SessionLocal", lambda: nullcontext(db))
+    assert cli.main(["cgt-batch", "--users", str(users[0])]) == 0
+
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert rows and {r["user_id"] for r in rows} == {str(users[0])}
+    assert set(rows[0]) == set(cli.SUMMARY_FIELDS)
+
+    out = tmp_path / "summaries.csv"
+    assert cli.main(["cgt-batch", "--users", str(users[0]), "-o", str(out)]) == 0
+    with open(out, newline="") as f:
+        assert list(csv.DictReader(f)) == rows
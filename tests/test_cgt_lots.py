@@ -0,0 +1,111 @@
+from collections import defaultdict
+from decimal import Decimal
+from itertools import count
+
+import pytest
+
+from app.services import cgt_fixed, cgt_service
+from app.services.cgt_lots import DISCOUNT_AFTER, POOLS
+from tests.test_cgt_fixed import _random_history
+
+
+class _NaivePool:
+    """Linear-scan reference: every peek re-ranks all open lots."""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.lots = []
+        self.seq = count()
+        self.chosen = None
+
+    def append(self, lot):
+        self.lots.append((next(self.seq), lot))
+
+    def _key(self, entry, sell_date, unit_proceeds):
+        seq, lot = entry
+        if self.strategy == "fifo":
+            return (seq,)
+        if self.strategy == "lifo":
+            return (-seq,)
+        if self.strategy == "highest_cost":
+            return (-lot.unit_cost, seq)
+        gain = unit_proceeds - lot.unit_cost
+        eligible = lot.date + DISCOUNT_AFTER <= sell_date
+        if eligible and gain > 0:
+            gain /= 2
+        return (gain, not eligible, -lot.unit_cost, seq)
+
+    def peek(self, sell_date, unit_proceeds):
+        self.chosen = min(self.lots, key=lambda e: self._key(e, sell_date, unit_proceeds))
+        return self.chosen[1]
+
+    def pop(self):
+        self.lots.remove(self.chosen)
+
+    def __len__(self):
+        return len(self.lots)
+
+    def __iter__(self):
+        return (lot for _, lot in self.lots)
+
+
+def _matches(match_lots, txns, make_pool):
+    rows = []
+    queues = defaultdict(make_pool)
+    match_lots(txns, queues, defaultdict(cgt_service.YearTotals), rows)
+    return rows, cgt_service._lot_rows(queues)
+
+
+@pytest.mark.parametrize("strategy", sorted(POOLS))
+@pytest.mark.parametrize("engine", [cgt_service._match_lots, cgt_fixed.match_lots])
+@pytest.mark.parametrize("seed", [1, 4, 8])
+def test_pools_match_naive_selection(strategy, engine, seed):
+    txns = _random_history(seed, n=300)
+    assert _matches(engine, txns, POOLS[strategy]) == _matches(
+        engine, txns, lambda: _NaivePool(strategy)
+    )
+
+
+@pytest.fixture()
+def user_id(client):
+    r = client.post("/api/v1/users", json={"username": "chooser"})
+    uid = r.json()["id"]
+    for d, action, price in [
+        ("2022-08-01", "buy", "40.00"),
+        ("2023-08-01", "buy", "50.00"),
+        ("2023-10-02", "sell", "45.00"),
+    ]:
+        client.post(f"/api/v1/users/{uid}/transactions", json={
+            "date": d, "time": "10:00:00", "action": action, "ticker": "BHP",
+            "quantity": 100, "price": price, "value": str(Decimal(price) * 100), "fee": "0",
+        })
+    return uid
+
+
+@pytest.mark.parametrize(
+    ("strategy", "raw_gain"),
+    [("fifo", "500.00"), ("lifo", "-500.00"), ("highest_cost", "-500.00"), ("min_tax", "-500.00")],
+)
+def test_report_strategy(client, user_id, strategy, raw_gain):
+    r = client.get(f"/api/v1/users/{user_id}/reports/cgt/2023-24", params={"strategy": strategy})
+    assert r.status_code == 200
+    [match] = r.json()["financial_years"][0]["lot_matches"]
+    assert Decimal(match["raw_gain"]) == Decimal(raw_gain)
+
+    r = client.get(f"/api/v1/users/{user_id}/reports/cgt", params={"strategy": strategy})
+    summary = r.json()["financial_years"][0]
+    assert Decimal(summary["total_gains"]) + Decimal(summary["total_losses"]) == Decimal(raw_gain)
+
+
+def test_non_fifo_report_leaves_cache_alone(client, db, user_id):
+    from app.models import CGTLotMatch
+
+    client.get(f"/api/v1/users/{user_id}/reports/cgt")
+    stored = [m.raw_gain for m in db.query(CGTLotMatch)]
+    client.get(f"/api/v1/users/{user_id}/reports/cgt/2023-24", params={"strategy": "lifo"})
+    assert [m.raw_gain for m in db.query(CGTLotMatch)] == stored == [Decimal("500.00")]
+
+
+def test_unknown_strategy(client, user_id):
+    r = client.get(f"/api/v1/users/{user_id}/reports/cgt", params={"strategy": "random"})
+    assert r.status_code == 422
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import cli
+from app.core.config import settings
+from app.core.database import Base, create_db_engine
+from app.models import CGTLotMatch, CGTState, StockTransaction, User
+from app.services import cgt_recompute, cgt_service
+from tests.test_cgt_fixed import _random_history
+
+
+@pytest.fixture()
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'recompute.db'}"
+    engine = create_db_engine(url)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        for n, seed in enumerate([2, 5, 9, 13]):
+            user = User(username=f"recompute{n}")
+            db.add(user)
+            db.flush()
+            for txn in _random_history(seed, n=60):
+                db.add(StockTransaction(
+                    user_id=user.id, date=txn.date, time=txn.time, action=txn.action,
+                    ticker=txn.ticker, quantity=txn.quantity, price=txn.price,
+                    value=txn.price * txn.quantity, fee=txn.fee,
+                ))
+        db.commit()
+    yield url
+    engine.dispose()
+
+
+def _cached(url):
+    engine = create_db_engine(url)
+    try:
+        with sessionmaker(bind=engine)() as db:
+            states = db.scalar(select(func.count()).select_from(CGTState))
+            matches = db.scalar(select(func.count()).select_from(CGTLotMatch))
+            summaries = {
+                user_id: cgt_service.compute_cgt_summary(db, user_id)
+                for user_id in cgt_recompute.list_user_ids(db)
+            }
+        return states, matches, summaries
+    finally:
+        engine.dispose()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_recompute_all_users(database_url, workers):
+    engine = create_db_engine(database_url)
+    with sessionmaker(bind=engine)() as db:
+        user_ids = cgt_recompute.list_user_ids(db)
+        expected = {user_id: cgt_service.compute_cgt_summary(db, user_id) for user_id in user_ids}
+        # Make the caches stale so only a rebuild can restore them
+        db.query(CGTLotMatch).delete()
+        db.commit()
+    engine.dispose()
+
+    progress = []
+    done = cgt_recompute.recompute(
+        database_url, user_ids, workers=workers, shard_size=1, on_progress=progress.append
+    )
+
+    assert done == len(user_ids)
+    assert sorted(progress)[-1] == len(user_ids)
+    # A run in this process disposes of the engine it opened
+    assert cgt_recompute._engine is None
+    states, matches, summaries = _cached(database_url)
+    assert states == len(user_ids)
+    assert matches > 0
+    assert summaries == expected
+
+
+def test_cli_recompute_subset(database_url, monkeypatch, capsys):
+    monkeypatch.setattr(settings, "database_url", database_url)
+    assert cli.main(["recompute-cgt", "--users", "1,3", "--workers", "1"]) == 0
+
+    assert "Recomputed CGT for 2 users" in capsys.readouterr().err
+    engine = create_db_engine(database_url)
+    with sessionmaker(bind=engine)() as db:
+        assert set(db.scalars(select(CGTState.user_id))) == {1, 3}
+    engine.dispose()
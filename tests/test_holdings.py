@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+import pytest
+
+from app.models import OpenLot
+
+
+@pytest.fixture()
+def user_id(client):
+    r = client.post("/api/v1/users", json={"username": "holder"})
+    return r.json()["id"]
+
+
+def _trade(client, uid, date, action, ticker, qty, price, fee="9.95"):
+    r = client.post(f"/api/v1/users/{uid}/transactions", json={
+        "date": date, "time": "10:00:00", "action": action, "ticker": ticker,
+        "quantity": qty, "price": price, "value": str(Decimal(price) * qty), "fee": fee,
+    })
+    return r.json()["id"]
+
+
+def test_holdings_list_open_parcels(client, user_id):
+    first = _trade(client, user_id, "2023-01-10", "buy", "BHP", 100, "40.00")
+    second = _trade(client, user_id, "2023-06-01", "buy", "BHP", 50, "42.00", "5.00")
+    _trade(client, user_id, "2023-02-01", "buy", "cba", 10, "100.00")
+    _trade(client, user_id, "2023-03-01", "sell", "BHP", 60, "45.00")
+
+    r = client.get(f"/api/v1/users/{user_id}/holdings?discount_as_of=2024-01-10")
+    assert r.status_code == 200
+    holdings = {h["ticker"]: h for h in r.json()}
+    assert list(holdings) == ["BHP", "CBA"]
+
+    bhp = holdings["BHP"]
+    assert bhp["quantity"] == 90
+    assert [p["transaction_id"] for p in bhp["parcels"]] == [first, second]
+    assert [p["quantity"] for p in bhp["parcels"]] == [40, 50]
+    # 40 of 100 units carry 40% of the $9.95 fee
+    assert Decimal(bhp["parcels"][0]["cost_base"]) == Decimal("1603.98")
+    assert Decimal(bhp["parcels"][1]["cost_base"]) == Decimal("2105.00")
+    assert Decimal(bhp["cost_base"]) == Decimal("3708.98")
+
+    assert bhp["parcels"][0]["days_until_discount"] == 1
+    assert not bhp["parcels"][0]["discount_eligible"]
+    assert bhp["parcels"][1]["days_until_discount"] == 143
+
+
+def test_holdings_discount_threshold(client, user_id):
+    _trade(client, user_id, "2023-01-10", "buy", "BHP", 100, "40.00")
+    url = f"/api/v1/users/{user_id}/holdings"
+
+    parcel = client.get(url, params={"discount_as_of": "2024-01-11"}).json()[0]["parcels"][0]
+    assert parcel["discount_eligible"] and parcel["days_until_discount"] == 0
+
+
+def test_holdings_ticker_filter_and_sold_out(client, user_id):
+    _trade(client, user_id, "2023-01-10", "buy", "BHP", 100, "40.00")
+    _trade(client, user_id, "2023-01-10", "buy", "CBA", 10, "100.00")
+    _trade(client, user_id, "2023-03-01", "sell", "CBA", 10, "110.00")
+    url = f"/api/v1/users/{user_id}/holdings"
+
+    assert [h["ticker"] for h in client.get(url).json()] == ["BHP"]
+    assert client.get(url, params={"ticker": "cba"}).json() == []
+
+
+def test_reads_bring_open_lots_current_after_writes(client, db, user_id):
+    url = f"/api/v1/users/{user_id}/holdings"
+    buy = _trade(client, user_id, "2023-01-10", "buy", "BHP", 100, "40.00")
+    assert client.get(url).json()[0]["quantity"] == 100
+    assert [lot.remaining for lot in db.query(OpenLot)] == [100]
+
+    # A write only marks the cache stale; the next read replays it
+    _trade(client, user_id, "2023-02-10", "sell", "BHP", 30, "45.00")
+    assert [lot.remaining for lot in db.query(OpenLot)] == [100]
+    assert client.get(url).json()[0]["quantity"] == 70
+    assert [lot.remaining for lot in db.query(OpenLot)] == [70]
+
+    client.delete(f"/api/v1/users/{user_id}/transactions/{buy}")
+    assert client.get(url).json() == []
+    assert db.query(OpenLot).count() == 0
+
+
+def test_holdings_unknown_user(client):
+    assert client.get("/api/v1/users/999/holdings").status_code == 404
@@ -1,7 +1,32 @@
+import asyncio
+import csv
+import gzip
 import io
+import json
+import os
+import time
+import zipfile
 
 import pytest
+from fastapi import UploadFile
 from openpyxl import Workbook
+from python_calamine import CalamineWorkbook
+
+from app.core.config import settings
+from app.core.limiter import limiter
+from app.services import import_job_service, import_service, parse_pool, parsers
+from app.services.aio import import_service as aio_import_service
+from app.services.parsers import blocks as csv_blocks
+from app.services.parsers import columns
+from app.services.parsers import sharesight
+from app.services.parsers.blocks import CsvBlocks
+from app.services.parsers.columns import Column, RowSpec, to_decimal, to_positive_int
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limit():
+    # The import endpoint allows 10 uploads a minute per client
+    limiter.reset()
 
 
 @pytest.fixture()
@@ -139,3 +164,744 @@ def test_import_unrecognised_format(client, user_id):
     data = r.json()
     assert data["imported"] == 0
     assert any("Unrecognised" in e for e in data["errors"])
+
+
+def _parse_in_pool(*files):
+    async def run():
+        parse_pool.start()
+        try:
+            return await asyncio.gather(
+                *(parse_pool.parse_file(name, content) for name, content in files),
+                return_exceptions=True,
+            )
+        finally:
+            parse_pool.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_parse_pool_matches_inline_parse(monkeypatch):
+    monkeypatch.setattr(settings, "import_workers", 1)
+    xlsx_bytes = _make_sharesight_xlsx()
+    [result] = _parse_in_pool(("AllTradesReport.xlsx", xlsx_bytes))
+    assert result == import_service.parse_file("AllTradesReport.xlsx", xlsx_bytes)
+
+
+def test_parse_pool_rejects_when_queue_full(monkeypatch):
+    monkeypatch.setattr(settings, "import_workers", 1)
+    monkeypatch.setattr(settings, "import_queue", 1)
+    content = CSV_GOOD.encode()
+    first, queued, rejected = _parse_in_pool(*[("txns.csv", content)] * 3)
+    assert first == queued == import_service.parse_file("txns.csv", content)
+    assert isinstance(rejected, parse_pool.PoolBusy)
+
+
+def test_parse_pool_replaces_a_broken_pool(monkeypatch):
+    monkeypatch.setattr(settings, "import_workers", 1)
+    content = CSV_GOOD.encode()
+
+    async def run():
+        parse_pool.start()
+        try:
+            # A worker that dies mid-parse breaks its pool
+            with pytest.raises(parse_pool.PoolBroken):
+                await parse_pool._run(os._exit, 1)
+            return await parse_pool.parse_file("txns.csv", content)
+        finally:
+            parse_pool.shutdown()
+
+    assert asyncio.run(run()) == import_service.parse_file("txns.csv", content)
+
+
+def test_import_returns_503_when_pool_busy_or_broken(client, user_id, monkeypatch):
+    async def busy(*args, **kwargs):
+        raise parse_pool.PoolBusy
+
+    monkeypatch.setattr(parse_pool, "_run", busy)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "5"
+
+    async def broken(*args, **kwargs):
+        raise parse_pool.PoolBroken
+
+    monkeypatch.setattr(parse_pool, "_run", broken)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    assert r.status_code == 503
+
+
+def test_import_inserts_in_chunks(client, user_id, monkeypatch):
+    monkeypatch.setattr(settings, "import_chunk_size", 1)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    data = r.json()
+    assert data["imported"] == 2
+    assert data["rows_per_second"] > 0
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 2
+
+
+def test_import_is_all_or_nothing(client, db, user_id, monkeypatch):
+    transactions, _ = import_service.parse_file("txns.csv", CSV_GOOD.encode())
+
+    def fail(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(settings, "import_chunk_size", 1)
+    monkeypatch.setattr(import_service.cgt_service, "invalidate", fail)
+    with pytest.raises(RuntimeError):
+        import_service.store_transactions(db, user_id, transactions)
+    assert client.get(f"/api/v1/users/{user_id}/transactions").json() == []
+
+
+def test_csv_blocks_keep_records_whole():
+    content = (
+        b'date,ticker,contract_note\n2023-08-15,BHP,"two\nlines"\n'
+        b'2023-08-16,CBA,"say ""hi""\n"\n2023-08-17,NAB,last'
+    )
+    for size in range(1, len(content) + 1):
+        blocks = CsvBlocks()
+        out = [blocks.feed(content[i:i + size]) for i in range(0, len(content), size)]
+        out.append(blocks.close())
+        assert blocks.header == b"date,ticker,contract_note\n"
+        records = b"".join(block for block, _ in filter(None, out))
+        assert blocks.header + records == content
+        for block, _ in filter(None, out[:-1]):
+            assert block.endswith(b"\n") and block.count(b'"') % 2 == 0
+
+
+def test_import_streams_in_blocks(client, user_id, monkeypatch):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    rows = [f"2023-08-{d:02d},10:30:00,buy,BHP,10,45.50,455.00,9.95,CN{d}" for d in range(1, 29)]
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert r.json()["imported"] == 28
+    txns = client.get(f"/api/v1/users/{user_id}/transactions").json()
+    assert sorted(t["contract_note"] for t in txns) == sorted(f"CN{d}" for d in range(1, 29))
+
+    rows[20] = rows[20].replace(",10,", ",ten,")
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert r.json()["imported"] == 0
+    assert r.json()["errors"] == ["Row 22: invalid quantity 'ten'"]
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 28
+
+
+def test_import_writes_once_the_upload_is_parsed(client, user_id, monkeypatch):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    parsed = []
+    inserts = []
+    parse_block = parse_pool.parse_block
+    insert = import_service.ImportWriter.insert
+
+    async def watch_parse(*args, **kwargs):
+        batch = await parse_block(*args, **kwargs)
+        parsed.append(batch.rows)
+        return batch
+
+    def watch_insert(self, db, rows):
+        inserts.append((len(rows), sum(parsed)))
+        return insert(self, db, rows)
+
+    monkeypatch.setattr(parse_pool, "parse_block", watch_parse)
+    monkeypatch.setattr(import_service.ImportWriter, "insert", watch_insert)
+    rows = [f"2023-08-{d:02d},10:30:00,buy,BHP,10,45.50,455.00,9.95,CN{d}" for d in range(1, 29)]
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert r.json()["imported"] == 28
+    # The write transaction starts only once every block is parsed
+    assert len(parsed) > 1
+    assert inserts == [(28, 28)]
+
+
+def test_import_rejects_oversize_while_reading(client, user_id, monkeypatch):
+    monkeypatch.setattr(settings, "max_upload_mb", 0)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    assert r.status_code == 413
+
+    async def read(max_bytes):
+        upload = UploadFile(io.BytesIO(b"x" * 100))
+        return [chunk async for chunk in aio_import_service.read_upload(upload, max_bytes)]
+
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 10)
+    assert len(asyncio.run(read(100))) == 10
+    with pytest.raises(import_service.UploadTooLarge):
+        asyncio.run(read(99))
+
+
+def test_import_csv_invalid_utf8_after_header(client, user_id):
+    content = CSV_GOOD.encode() + b"2024-09-21,14:15:00,sell,BHP,5,52.00,260.00,9.95,\xff\n"
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", content, "text/csv")},
+    )
+    assert r.json()["imported"] == 0
+    assert r.json()["errors"] == ["File is not valid UTF-8"]
+
+
+def test_import_async_job(client, user_id):
+    r = client.post(
+        f"/api/v1/users/{user_id}/import?async=true",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    assert r.status_code == 202
+    job = r.json()
+    assert job["status"] == "pending"
+    assert r.headers["location"].endswith(f"/api/v1/import/jobs/{job['id']}")
+
+    # The test client runs background tasks before returning
+    job = client.get(f"/api/v1/import/jobs/{job['id']}").json()
+    assert job["status"] == "succeeded"
+    assert (job["rows_read"], job["imported"], job["errors"]) == (2, 2, [])
+    assert job["attempts"] == 1 and job["finished_at"]
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 2
+
+    r = client.post(f"/api/v1/import/jobs/{job['id']}/retry")
+    assert r.status_code == 409
+    assert client.get("/api/v1/import/jobs/999").status_code == 404
+
+
+def test_import_async_job_failure_and_retry(client, user_id, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(aio_import_service, "parse_and_import", fail)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import?async=true",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    failed = client.get(f"/api/v1/import/jobs/{r.json()['id']}").json()
+    assert failed["status"] == "failed"
+    assert failed["errors"] == ["Import failed: disk full"]
+    monkeypatch.undo()
+
+    r = client.post(f"/api/v1/import/jobs/{failed['id']}/retry")
+    assert r.status_code == 202
+    job = client.get(f"/api/v1/import/jobs/{failed['id']}").json()
+    assert (job["status"], job["imported"], job["attempts"]) == ("succeeded", 2, 2)
+
+
+def test_import_async_job_reports_errors_like_a_sync_import(client, user_id):
+    sync = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", _bad_rows(8), "text/csv")},
+    ).json()
+    r = client.post(
+        f"/api/v1/users/{user_id}/import?async=true",
+        files={"file": ("txns.csv", _bad_rows(8), "text/csv")},
+    )
+    job = client.get(r.headers["Location"]).json()
+    assert job["status"] == "failed"
+    assert (job["errors"], job["error_count"], job["error_groups"]) == (
+        sync["errors"], sync["error_count"], sync["error_groups"]
+    )
+
+
+def test_import_job_stuck_after_a_restart_can_be_retried(client, db, user_id, monkeypatch):
+    job = import_job_service.create_job(db, user_id, "txns.csv", CSV_GOOD.encode())
+    import_job_service.start_job(db, job.id)
+    # The process running it died, so it never finishes
+    db.expunge_all()
+    r = client.post(f"/api/v1/import/jobs/{job.id}/retry")
+    assert r.status_code == 409
+    assert r.json()["detail"] == "Only failed or stuck jobs can be retried; this one is running"
+
+    monkeypatch.setattr(settings, "import_job_stale_minutes", 0)
+    r = client.post(f"/api/v1/import/jobs/{job.id}/retry")
+    assert r.status_code == 202
+    read = client.get(f"/api/v1/import/jobs/{job.id}").json()
+    assert (read["status"], read["imported"], read["attempts"]) == ("succeeded", 2, 2)
+
+    # A job still pending, its background task lost
+    stuck = import_job_service.create_job(db, user_id, "txns.csv", CSV_GOOD.encode())
+    db.expunge_all()
+    assert client.post(f"/api/v1/import/jobs/{stuck.id}/retry").status_code == 202
+    assert client.get(f"/api/v1/import/jobs/{stuck.id}").json()["status"] == "succeeded"
+
+
+def test_reimport_skips_rows_already_present(client, user_id):
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    assert (r.json()["imported"], r.json()["skipped"]) == (2, 0)
+
+    overlapping = CSV_GOOD + "2024-10-01,10:00:00,buy,CBA,5,120.00,600.00,9.95,CN009\n"
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", overlapping, "text/csv")},
+    )
+    assert (r.json()["imported"], r.json()["skipped"]) == (1, 2)
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 3
+
+
+def test_reimport_keeps_identical_rows_within_a_file(client, user_id):
+    row = "2023-08-15,10:30:00,buy,BHP,100,45.50,4550.00,9.95,\n"
+    csv_text = CSV_GOOD.splitlines(keepends=True)[0] + row * 2
+    for expected in [(2, 0), (0, 2)]:
+        r = client.post(
+            f"/api/v1/users/{user_id}/import",
+            files={"file": ("txns.csv", csv_text, "text/csv")},
+        )
+        assert (r.json()["imported"], r.json()["skipped"]) == expected
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text + row, "text/csv")},
+    )
+    assert (r.json()["imported"], r.json()["skipped"]) == (1, 2)
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 3
+
+
+def test_import_skips_trades_entered_by_hand(client, user_id):
+    for _ in range(2):
+        r = client.post(f"/api/v1/users/{user_id}/transactions", json={
+            "date": "2023-08-15", "time": "10:30:00", "action": "buy", "ticker": "bhp",
+            "quantity": 100, "price": "45.5", "value": "4550.00", "fee": "9.95",
+            "contract_note": "CN001",
+        })
+        assert r.status_code == 201
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", CSV_GOOD, "text/csv")},
+    )
+    assert (r.json()["imported"], r.json()["skipped"]) == (1, 1)
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 3
+
+
+def test_detection_opens_workbook_once(monkeypatch):
+    opened = []
+
+    class CountingWorkbook:
+        @staticmethod
+        def from_filelike(f):
+            opened.append(f)
+            return CalamineWorkbook.from_filelike(f)
+
+    monkeypatch.setattr(parsers, "CalamineWorkbook", CountingWorkbook)
+    transactions, errors = import_service.parse_file(
+        "AllTradesReport.xlsx", _make_sharesight_xlsx()
+    )
+    assert (len(transactions), errors) == (2, [])
+    assert len(opened) == 1
+
+
+def test_payload_views():
+    payload = parsers.Payload("notes.xlsx", "\ufeffdate,ticker\n2023-08-15,BHP\n".encode())
+    assert payload.csv_header == ["date", "ticker"]
+    assert payload.sheet is None
+    assert payload.sheet_head(3) == []
+    assert parsers.Payload("bad.csv", b"\xffdate\n").csv_header is None
+
+
+def test_row_spec_compiles_once_per_header():
+    spec = RowSpec(
+        [Column("quantity", "Qty", to_positive_int), Column("price", "Price", to_decimal)],
+        constants={"ticker": "BHP"},
+        derive=lambda fields: fields.update(date=None, time=None, action="buy", value=0, fee=0),
+    )
+    convert = spec.compile(["Price", " Qty "])
+    assert spec.compile(["Price", " Qty "]) is convert
+    assert convert.missing == []
+    assert spec.compile(["Price"]).missing == ["Qty"]
+    for n in range(columns.MAX_COMPILED):
+        spec.compile(["Price", "Qty", f"extra{n}"])
+    assert len(spec._compiled) == columns.MAX_COMPILED
+    assert spec.compile(["Price", " Qty "]) is not convert
+
+    txn, errors = convert(["45.50", "10"], 2)
+    assert errors == []
+    assert (txn.ticker, txn.quantity, str(txn.price)) == ("BHP", 10, "45.50")
+
+    # Every bad cell in the row is reported, each in its column's words
+    txn, errors = convert(["abc", "-1"], 3)
+    assert txn is None
+    assert [str(e) for e in errors] == [
+        "Row 3: Qty must be positive", "Row 3: invalid Price 'abc'"
+    ]
+    assert [(e.code, e.column) for e in errors] == [("not_positive", "Qty"), ("invalid", "Price")]
+
+
+def test_import_reports_every_bad_field_in_a_row(client, user_id):
+    csv = CSV_GOOD.splitlines()[0] + "\n2023-13-01,10:00:00,hold,,0,x,1,1,\n"
+    r = client.post(
+        f"/api/v1/users/{user_id}/import", files={"file": ("t.csv", csv.encode(), "text/csv")}
+    )
+    assert r.json()["errors"] == [
+        "Row 2: invalid date '2023-13-01'",
+        "Row 2: action must be 'buy' or 'sell', got 'hold'",
+        "Row 2: ticker is required",
+        "Row 2: quantity must be positive",
+        "Row 2: invalid price 'x'",
+    ]
+
+
+def test_import_pearler_rejects_unknown_trade_type(client, user_id):
+    csv = PEARLER_CSV.replace(",Buy,", ",Dividend,", 1)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import", files={"file": ("p.csv", csv.encode(), "text/csv")}
+    )
+    assert r.json()["imported"] == 0
+    assert "Trade Type must be 'buy' or 'sell', got 'Dividend'" in r.json()["errors"][0]
+
+
+def test_sharesight_parses_in_batches(monkeypatch):
+    monkeypatch.setattr(sharesight, "BATCH_ROWS", 1)
+    payload = parsers.Payload("trades.xlsx", _make_sharesight_xlsx())
+    batches = sharesight.SharesightParser.iter_batches(payload)
+    first = next(batches)
+    assert (first.rows, [t.ticker for t in first.transactions]) == (1, ["VAS"])
+    assert [t.ticker for b in batches for t in b.transactions] == ["BHP"]
+
+
+def test_import_sharesight_row_cap(client, user_id, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_rows", 1)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": (
+            "trades.xlsx", _make_sharesight_xlsx(),
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )},
+    )
+    assert r.json()["imported"] == 0
+    assert r.json()["errors"] == ["File has more than 1 data rows"]
+
+
+@pytest.fixture
+def chunks_read(monkeypatch):
+    """The chunks of each upload read so far."""
+    read = []
+    upload = aio_import_service.read_upload
+
+    async def counting(file, max_bytes):
+        async for chunk in upload(file, max_bytes):
+            read.append(chunk)
+            yield chunk
+
+    monkeypatch.setattr(aio_import_service, "read_upload", counting)
+    return read
+
+
+def test_import_csv_row_cap_stops_reading(client, user_id, monkeypatch, chunks_read):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    monkeypatch.setattr(settings, "import_max_rows", 5)
+    rows = [f"2023-08-{d:02d},10:30:00,buy,BHP,10,45.50,455.00,9.95,CN{d}" for d in range(1, 29)]
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert r.json()["errors"] == ["File has more than 5 data rows"]
+    assert len(client.get(f"/api/v1/users/{user_id}/transactions").json()) == 0
+    assert sum(map(len, chunks_read)) < len(csv_text) / 2
+
+
+def test_block_rows_match_csv_reader():
+    # A blank line, a quoted newline, escaped quotes, and quotes csv reads as literal
+    content = (
+        b'name,n\na,1\n\n"b\nstill b",2\n"c ""quoted""",3\nCN"1,4\n'
+        b'"e"f"g,5\nh, "i,6\n"j\n""\n",7\nk,8'
+    )
+    records = list(csv.reader(io.StringIO(content.decode(), newline="")))[1:]
+    assert len(records) == 9
+    for size in range(1, len(content) + 1):
+        blocks = CsvBlocks()
+        out = [blocks.feed(content[i:i + size]) for i in range(0, len(content), size)]
+        out.append(blocks.close())
+        assert blocks.header == b"name,n\n"
+        rows = []
+        for block, first_row in filter(None, out):
+            assert first_row == len(rows) + 2
+            rows += csv.reader(io.StringIO(block.decode(), newline=""))
+        assert rows == records
+
+
+def test_csv_blocks_scan_past_stray_quote_in_linear_time():
+    row = b"2023-08-15,10:30:00,buy,BHP,10,45.50,455.00,9.95,CN1\n"
+    content = b"date,time,action,ticker,quantity,price,value,fee,contract_note\n"
+    content += row.replace(b"CN1", b'CN"1') + row * 100_000
+    blocks = CsvBlocks()
+    started = time.perf_counter()
+    cuts = [blocks.feed(content[i:i + 65536]) for i in range(0, len(content), 65536)]
+    assert time.perf_counter() - started < 2
+    assert blocks.close() is None
+    assert sum(1 for cut in cuts if cut) > 50
+    assert b"".join(block for block, _ in filter(None, cuts)) == content[len(blocks.header):]
+
+
+def test_import_stops_at_unclosed_quote(client, user_id, monkeypatch):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    monkeypatch.setattr(csv_blocks, "MAX_RECORD", 1000)
+    rows = [f"2023-08-{d:02d},10:30:00,buy,BHP,10,45.50,455.00,9.95,CN{d}" for d in range(1, 29)]
+    rows[2] = rows[2].replace(",10,", ",ten,")
+    rows[5] = rows[5].replace(",CN6", ',"CN6')
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    data = r.json()
+    assert data["imported"] == 0
+    assert data["errors"][0] == "Row 4: invalid quantity 'ten'"
+    assert data["errors"][-1].startswith("Row 7: record is longer than")
+    assert data["error_groups"][-1]["code"] == "record_too_long"
+
+
+def test_import_parses_blocks_in_parallel(client, user_id, monkeypatch):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    monkeypatch.setattr(settings, "import_workers", 3)
+    running = peak = 0
+
+    async def parse_block(parser_cls, header, block, first_row, reject=True):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return import_service.parse_block(parser_cls, header, block, first_row)
+
+    monkeypatch.setattr(parse_pool, "parse_block", parse_block)
+    rows = [f"2023-08-{d:02d},10:30:00,buy,BHP,10,45.50,455.00,9.95,CN{d}" for d in range(1, 29)]
+    # A blank line and a note spanning two lines still count as one row each, and a
+    # quote inside a field is a literal one
+    rows[3] = ""
+    rows[9] = rows[9].replace(",CN10", ',"CN\n10"')
+    rows[12] = rows[12].replace(",CN13", ',CN"13')
+    rows[20] = rows[20].replace(",10,", ",ten,")
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert r.json()["errors"] == ["Row 22: invalid quantity 'ten'"]
+    assert peak == 3
+
+    rows[20] = rows[20].replace(",ten,", ",10,")
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert r.json()["imported"] == 27
+    txns = client.get(f"/api/v1/users/{user_id}/transactions").json()
+    assert "CN\n10" in [t["contract_note"] for t in txns]
+    assert 'CN"13' in [t["contract_note"] for t in txns]
+
+
+@pytest.mark.parametrize("read_bytes", [16, 64, 100, 1024])
+def test_block_row_numbers_survive_quotes(client, user_id, monkeypatch, read_bytes):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", read_bytes)
+    rows = [f"2023-08-{d:02d},10:30:00,buy,BHP,10,45.50,455.00,9.95,CN{d}" for d in range(1, 29)]
+    rows[4] = rows[4].replace(",CN5", ',"CN\n5"')
+    rows[8] = rows[8].replace(",CN9", ',CN"9')
+    for i in (6, 12, 25):
+        rows[i] = rows[i].replace(",10,", ",ten,")
+    csv_text = "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    assert [e["rows"] for e in r.json()["error_groups"]] == [[8, 14, 27]]
+
+
+def _bad_rows(n: int) -> str:
+    rows = [f"2023-08-15,10:30:00,buy,BHP,ten,45.50,455.00,9.95,CN{i}" for i in range(n)]
+    rows[1] = rows[1].replace(",buy,", ",hold,")
+    return "date,time,action,ticker,quantity,price,value,fee,contract_note\n" + "\n".join(rows)
+
+
+def test_import_groups_errors_by_kind(client, user_id):
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", _bad_rows(8), "text/csv")},
+    )
+    data = r.json()
+    assert data["error_count"] == 9
+    assert len(data["errors"]) == 9
+    assert data["error_groups"] == [
+        {
+            "file": None, "code": "invalid", "column": "quantity", "count": 8,
+            "rows": [2, 3, 4, 5, 6],
+            "example": "Row 2: invalid quantity 'ten'",
+        },
+        {
+            "file": None, "code": "unknown_action", "column": "action", "count": 1, "rows": [3],
+            "example": "Row 3: action must be 'buy' or 'sell', got 'hold'",
+        },
+    ]
+
+
+def test_import_stops_at_error_cap(client, user_id, monkeypatch, chunks_read):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    monkeypatch.setattr(settings, "import_max_errors", 4)
+    csv_text = _bad_rows(500)
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.csv", csv_text, "text/csv")},
+    )
+    data = r.json()
+    assert data["error_count"] == 4
+    assert data["errors"][-1] == "Import stopped after 4 errors"
+    assert len(data["errors"]) == 5
+    assert sum(map(len, chunks_read)) < len(csv_text) / 2
+
+    # A whole-file parse stops at the first batch that reaches the cap
+    _, errors = import_service.parse_file("txns.csv", _bad_rows(5000).encode(), max_errors=4)
+    assert len(errors) == parsers.BATCH_ROWS + 1
+
+
+def _zip(files: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buf.getvalue()
+
+
+def test_import_zip_archive(client, user_id):
+    archive = _zip({
+        "2021/pearler.csv": PEARLER_CSV.encode(),
+        "sharesight.xlsx": _make_sharesight_xlsx(),
+        "__MACOSX/._pearler.csv": b"junk",
+    })
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("trades.zip", archive, "application/zip")},
+    )
+    assert r.json()["imported"] == 4
+    txns = client.get(f"/api/v1/users/{user_id}/transactions").json()
+    assert sorted(t["ticker"] for t in txns) == ["BHP", "GOLD", "VAS", "VAS"]
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("trades.zip", b"not a zip", "application/zip")},
+    )
+    assert r.json()["errors"] == ["Not a valid zip archive"]
+
+    # The upload limit applies to the unpacked size, checked before anything is read
+    with pytest.raises(import_service.UploadTooLarge):
+        import_service.unzip(_zip({"big.csv": b"x" * 1000}), 999)
+
+
+def test_import_several_files_in_one_transaction(client, user_id):
+    bad = CSV_GOOD.replace("BHP,50", "BHP,fifty")
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files=[
+            ("file", ("pearler.csv", PEARLER_CSV, "text/csv")),
+            ("file", ("mine.csv", bad, "text/csv")),
+        ],
+    )
+    data = r.json()
+    assert data["imported"] == 0
+    assert data["errors"] == ["mine.csv: Row 3: invalid quantity 'fifty'"]
+    assert data["error_groups"][0]["file"] == "mine.csv"
+    assert client.get(f"/api/v1/users/{user_id}/transactions").json() == []
+
+    # Identical rows in two files count once, as two separate imports would
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files=[
+            ("file", ("pearler.csv", PEARLER_CSV, "text/csv")),
+            ("file", ("pearler-again.csv", PEARLER_CSV, "text/csv")),
+            ("file", ("mine.csv", CSV_GOOD, "text/csv")),
+        ],
+    )
+    assert (r.json()["imported"], r.json()["skipped"]) == (4, 2)
+
+
+def test_import_several_files_async(client, user_id):
+    r = client.post(
+        f"/api/v1/users/{user_id}/import?async=true",
+        files=[
+            ("file", ("pearler.csv", PEARLER_CSV, "text/csv")),
+            ("file", ("mine.csv", CSV_GOOD, "text/csv")),
+        ],
+    )
+    assert r.status_code == 202
+    job = client.get(r.headers["Location"]).json()
+    assert (job["filename"], job["status"], job["imported"]) == ("upload.zip", "succeeded", 4)
+
+
+def test_import_zip_with_more_members_than_pool_slots(client, user_id, monkeypatch):
+    monkeypatch.setattr(settings, "import_workers", 1)
+    monkeypatch.setattr(settings, "import_queue", 1)
+    members = {
+        f"{year}.csv": CSV_GOOD.replace("2023-", f"{year}-").replace("2024-", f"{year}-")
+        for year in range(2010, 2016)
+    }
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("trades.zip", _zip(members), "application/zip")},
+    )
+    assert r.status_code == 200
+    assert r.json()["imported"] == 12
+
+
+def test_import_ndjson_streams_in_lines(client, user_id, monkeypatch):
+    monkeypatch.setattr(aio_import_service, "READ_BYTES", 64)
+    lines = [
+        json.dumps({
+            "date": f"2023-08-{d:02d}", "time": "10:30:00", "action": "buy", "ticker": "BHP",
+            "quantity": 10, "price": "45.50", "value": "455.00", "fee": "9.95",
+            "contract_note": f'"CN{d}"',
+        })
+        for d in range(1, 29)
+    ]
+    lines[3] = ""
+    lines[20] = lines[20].replace('"quantity": 10', '"quantity": "ten"')
+    lines[21] = "[1, 2]"
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.ndjson", "\n".join(lines), "application/x-ndjson")},
+    )
+    assert r.json()["errors"] == [
+        "Row 21: invalid quantity 'ten'", "Row 22: not a JSON object"
+    ]
+
+    del lines[20:22]
+    content = gzip.compress("\n".join(lines).encode())
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.ndjson.gz", content, "application/gzip")},
+    )
+    assert r.json()["imported"] == 25
+
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.ndjson.gz", content[:-10], "application/gzip")},
+    )
+    assert r.json()["errors"] == ["Not a valid gzip file"]
+
+    # The upload limit applies to the unpacked size
+    monkeypatch.setattr(settings, "max_upload_mb", 1)
+    bomb = gzip.compress(b"\n" * (2 * 1024 * 1024))
+    r = client.post(
+        f"/api/v1/users/{user_id}/import",
+        files={"file": ("txns.ndjson.gz", bomb, "application/gzip")},
+    )
+    assert r.status_code == 413
@@ -1,3 +1,15 @@
+import csv
+import gzip
+import io
+import json
+
+from sqlalchemy import select
+
+from app.models.transaction import StockTransaction
+from app.models.user import User
+from app.services import export_service
+
+
 def test_create_user(client):
     r = client.post("/api/v1/users", json={"username": "alice"})
     assert r.status_code == 201
@@ -47,3 +59,86 @@ def test_export_csv(client):
     r = client.get(f"/api/v1/users/{uid}/export?format=csv")
     assert r.status_code == 200
     assert "text/csv" in r.headers["content-type"]
+
+
+def test_export_streams_the_same_documents(client, db, monkeypatch):
+    """Batch by batch, the export still renders the documents built whole before."""
+    monkeypatch.setattr(export_service, "EXPORT_BATCH", 2)
+    uid = client.post("/api/v1/users", json={"username": "alice"}).json()["id"]
+    user = db.get(User, uid)
+    empty = {
+        "user": {
+            "id": user.id, "username": user.username, "created_at": user.created_at.isoformat()
+        },
+        "transactions": [],
+    }
+    assert client.get(f"/api/v1/users/{uid}/export").text == json.dumps(empty, indent=2)
+
+    for day, note in [(15, "CN1"), (16, None), (17, 'say "hi"'), (18, None), (19, "CN5")]:
+        client.post(f"/api/v1/users/{uid}/transactions", json={
+            "date": f"2024-01-{day}", "time": "10:30:00", "action": "buy", "ticker": "BHP",
+            "quantity": 100, "price": "45.50", "value": "4550.00", "fee": "9.95",
+            "contract_note": note,
+        })
+    txns = db.scalars(
+        select(StockTransaction).where(StockTransaction.user_id == uid)
+        .order_by(StockTransaction.date)
+    ).all()
+
+    expected = {
+        "user": empty["user"],
+        "transactions": [
+            {
+                "id": t.id, "date": t.date.isoformat(), "time": t.time.isoformat(),
+                "action": t.action.value, "ticker": t.ticker, "quantity": t.quantity,
+                "price": str(t.price), "value": str(t.value), "fee": str(t.fee),
+                "contract_note": t.contract_note,
+            }
+            for t in txns
+        ],
+    }
+    r = client.get(f"/api/v1/users/{uid}/export?format=json")
+    assert r.text == json.dumps(expected, indent=2)
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(export_service.CSV_HEADER)
+    for t in txns:
+        writer.writerow([
+            t.date.isoformat(), t.time.isoformat(), t.action.value, t.ticker,
+            t.quantity, str(t.price), str(t.value), str(t.fee), t.contract_note or "",
+        ])
+    r = client.get(f"/api/v1/users/{uid}/export?format=csv")
+    assert r.text == output.getvalue()
+    assert r.headers["content-disposition"] == "attachment; filename=alice_export.csv"
+
+
+
+def test_export_ndjson_gzip_round_trips(client):
+    uid = client.post("/api/v1/users", json={"username": "alice"}).json()["id"]
+    for day, note in [(15, "CN1"), (16, None), (17, 'say "hi"')]:
+        client.post(f"/api/v1/users/{uid}/transactions", json={
+            "date": f"2024-01-{day}", "time": "10:30:00", "action": "buy", "ticker": "BHP",
+            "quantity": 100, "price": "45.50", "value": "4550.00", "fee": "9.95",
+            "contract_note": note,
+        })
+
+    plain = client.get(f"/api/v1/users/{uid}/export?format=ndjson")
+    assert plain.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in plain.text.splitlines()]
+    assert [r["contract_note"] for r in records] == ["CN1", None, 'say "hi"']
+
+    r = client.get(f"/api/v1/users/{uid}/export?format=ndjson&gzip=true")
+    assert r.headers["content-disposition"] == "attachment; filename=alice_export.ndjson.gz"
+    assert gzip.decompress(r.content) == plain.content
+
+    other = client.post("/api/v1/users", json={"username": "bob"}).json()["id"]
+    r = client.post(
+        f"/api/v1/users/{other}/import",
+        files={"file": ("alice_export.ndjson.gz", r.content, "application/gzip")},
+    )
+    assert r.json()["imported"] == 3
+    copied = client.get(f"/api/v1/users/{other}/export?format=ndjson").text
+    assert [{**json.loads(line), "id": None} for line in copied.splitlines()] == [
+        {**record, "id": None} for record in records
+    ]